@@ -8,13 +8,15 @@ Matching Loox architecture with competitive advantages:
 - Superior UX
 """
 
-from flask import Flask, request, jsonify, session, render_template
+from flask import Flask, request, jsonify, session, render_template, Response, stream_with_context
 from flask_cors import CORS
+from jinja2 import FileSystemBytecodeCache, TemplateNotFound
 import os
 import json
 import logging
-from datetime import datetime
+from datetime import datetime, timezone
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 import re
 import time
@@ -23,6 +25,17 @@ from urllib.parse import urlparse, unquote, parse_qs
 import hashlib
 import uuid
 import hmac
+import base64
+import threading
+import bisect
+import heapq
+import math
+import sqlite3
+import zlib
+import operator
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 # Import remote config loader
 try:
@@ -50,6 +63,30 @@ class Config:
     API_VERSION = '2.0.0'
     WIDGET_SECRET = os.environ.get('WIDGET_SECRET', 'sakura-widget-secret-key')
     WIDGET_BASE_URL = os.environ.get('WIDGET_BASE_URL', 'https://sakura-reviews-sak-rev-test-srv.utztjw.easypanel.host')
+    WIDGET_PAGE_SIZE = int(os.environ.get('WIDGET_PAGE_SIZE', 20))  # Reviews per precomputed widget page
+    WIDGET_SUMMARY_MAX_PRODUCTS = int(os.environ.get('WIDGET_SUMMARY_MAX_PRODUCTS', 100))  # Per batch request
+    WIDGET_API_MAX_LIMIT = int(os.environ.get('WIDGET_API_MAX_LIMIT', 100))  # Reviews per cursor page
+    WIDGET_MAX_LIMIT = int(os.environ.get('WIDGET_MAX_LIMIT', 500))  # Reviews in one rendered widget (?limit=)
+    WIDGET_CACHE_MAX_BYTES = int(os.environ.get('WIDGET_CACHE_MAX_BYTES', 32 * 1024 * 1024))  # Rendered widget HTML
+    WIDGET_CACHE_TTL = int(os.environ.get('WIDGET_CACHE_TTL', 300))  # Safety net; imports invalidate explicitly
+    # Browser/CDN caching of widget responses (revalidated cheaply via ETag)
+    WIDGET_CACHE_CONTROL = os.environ.get('WIDGET_CACHE_CONTROL', 'public, max-age=60, stale-while-revalidate=600')
+    WIDGET_API_CACHE_CONTROL = os.environ.get('WIDGET_API_CACHE_CONTROL', 'public, max-age=30, stale-while-revalidate=300')
+    # Static widget snapshots for a CDN / object store (disabled unless a directory is set)
+    WIDGET_SNAPSHOT_DIR = os.environ.get('WIDGET_SNAPSHOT_DIR', '')
+    WIDGET_SNAPSHOT_BASE_URL = os.environ.get('WIDGET_SNAPSHOT_BASE_URL', '')  # Public URL of WIDGET_SNAPSHOT_DIR
+    # Streaming render for long review lists (header and first reviews flush before the rest is read)
+    WIDGET_STREAM_MIN_LIMIT = int(os.environ.get('WIDGET_STREAM_MIN_LIMIT', 50))  # ?limit= at which widgets stream
+    WIDGET_STREAM_CHUNK_BYTES = int(os.environ.get('WIDGET_STREAM_CHUNK_BYTES', 8192))
+    # Compiled Jinja templates persist here across restarts (empty = per-user temp directory)
+    TEMPLATE_BYTECODE_CACHE_DIR = os.environ.get('TEMPLATE_BYTECODE_CACHE_DIR', '')
+    # Billing entitlements, cached per shop so widget requests never wait on Shopify Billing
+    # Opt-in: only public apps billed through Shopify set true; otherwise every shop is entitled
+    BILLING_REQUIRED = os.environ.get('BILLING_REQUIRED', 'false').lower() == 'true'
+    ENTITLEMENT_TTL = int(os.environ.get('ENTITLEMENT_TTL', 3600))  # Shops with an active subscription
+    ENTITLEMENT_NEGATIVE_TTL = int(os.environ.get('ENTITLEMENT_NEGATIVE_TTL', 300))  # Shops without one / failed checks
+    ENTITLEMENT_RECONCILE_INTERVAL = int(os.environ.get('ENTITLEMENT_RECONCILE_INTERVAL', 3600))  # 0 disables
+    ENTITLEMENT_DEFAULT = os.environ.get('ENTITLEMENT_DEFAULT', 'true').lower() == 'true'  # Before a shop's first check
     
     # Shopify API Configuration (priority: env vars > remote config)
     # NOTE: No hardcoded defaults for security - must be set via environment or config.json
@@ -80,15 +117,517 @@ class Config:
     
     # Supported platforms (more than Loox!)
     PLATFORMS = ['aliexpress', 'amazon', 'ebay', 'walmart']
+    
+    # Server-side cache of scored review sets (one facet index per product)
+    REVIEW_CACHE_TTL = int(os.environ.get('REVIEW_CACHE_TTL', 600))
+    REVIEW_CACHE_MAX_ENTRIES = int(os.environ.get('REVIEW_CACHE_MAX_ENTRIES', 200))
+    REVIEW_CACHE_MAX_SESSIONS = int(os.environ.get('REVIEW_CACHE_MAX_SESSIONS', 5000))  # Import session bindings
+    
+    # Near-duplicate review detection (MinHash/LSH)
+    NEAR_DUP_MODE = os.environ.get('NEAR_DUP_MODE', 'flag')  # flag, collapse or off
+    NEAR_DUP_THRESHOLD = float(os.environ.get('NEAR_DUP_THRESHOLD', 0.8))
+    NEAR_DUP_NUM_PERM = int(os.environ.get('NEAR_DUP_NUM_PERM', 128))
+    
+    # Local persistence (SQLite) for data that must survive restarts
+    DATABASE_PATH = os.environ.get('REVIEWKING_DB_PATH', 'reviewking.db')
+    IMPORT_LEDGER_CAPACITY = int(os.environ.get('IMPORT_LEDGER_CAPACITY', 1000000))
+    
+    # Background bulk-import jobs
+    IMPORT_JOB_WORKERS = int(os.environ.get('IMPORT_JOB_WORKERS', 4))
+    IMPORT_CONCURRENCY = int(os.environ.get('IMPORT_CONCURRENCY', 4))  # Concurrent Shopify writes across products
+    IMPORT_JOB_LEASE = int(os.environ.get('IMPORT_JOB_LEASE', 60))  # Seconds without a heartbeat before a job counts as orphaned
+    
+    # Shopify rate limits (defaults are the standard-plan buckets; headers override them)
+    SHOPIFY_REST_BUCKET = int(os.environ.get('SHOPIFY_REST_BUCKET', 40))
+    SHOPIFY_REST_LEAK_RATE = float(os.environ.get('SHOPIFY_REST_LEAK_RATE', 2.0))
+    SHOPIFY_GRAPHQL_BUCKET = int(os.environ.get('SHOPIFY_GRAPHQL_BUCKET', 1000))
+    SHOPIFY_GRAPHQL_RESTORE_RATE = float(os.environ.get('SHOPIFY_GRAPHQL_RESTORE_RATE', 50.0))
+    SHOPIFY_RATE_LIMIT_MARGIN = float(os.environ.get('SHOPIFY_RATE_LIMIT_MARGIN', 0.1))  # Headroom kept free
+    
+    # Admin API origin override, e.g. http://127.0.0.1:8765 for shopify_simulator.py (default: https://<shop>)
+    SHOPIFY_API_BASE_URL = os.environ.get('SHOPIFY_API_BASE_URL', '')
+    
+    # Shopify HTTP transport (pooled keep-alive sessions per shop)
+    SHOPIFY_POOL_SIZE = int(os.environ.get('SHOPIFY_POOL_SIZE', 16))  # >= concurrent import writers
+    SHOPIFY_MAX_RETRIES = int(os.environ.get('SHOPIFY_MAX_RETRIES', 5))  # 429 / 5xx / connection errors
+    SHOPIFY_RETRY_BACKOFF = float(os.environ.get('SHOPIFY_RETRY_BACKOFF', 0.5))  # Base seconds, doubled per attempt
+    SHOPIFY_CONNECT_TIMEOUT = float(os.environ.get('SHOPIFY_CONNECT_TIMEOUT', 5))
+    SHOPIFY_READ_TIMEOUT = float(os.environ.get('SHOPIFY_READ_TIMEOUT', 10))
+    
+    # Multi-tenant Shopify clients (credentials in DATABASE_PATH)
+    SHOPIFY_MAX_CLIENTS = int(os.environ.get('SHOPIFY_MAX_CLIENTS', 200))  # Hottest shops kept resident
+    
+    # get_product / get_products cache of slim product records
+    PRODUCT_CACHE_TTL = int(os.environ.get('PRODUCT_CACHE_TTL', 300))  # Seconds before revalidation
+    PRODUCT_CACHE_MAX_ENTRIES = int(os.environ.get('PRODUCT_CACHE_MAX_ENTRIES', 5000))
+    
+    # Local product catalog index for /shopify/products/search
+    PRODUCT_INDEX_MAX_AGE = int(os.environ.get('PRODUCT_INDEX_MAX_AGE', 3600))  # Seconds before a background re-crawl
 
 app.config.from_object(Config)
 app.secret_key = Config.SECRET_KEY
 
+# Templates are compiled once at startup; the bytecode cache lets new workers skip compiling
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(Config.TEMPLATE_BYTECODE_CACHE_DIR or None)
+WIDGET_TEMPLATES = ('widget.html', 'widget_payment_required.html')
+for template_name in WIDGET_TEMPLATES:
+    try:
+        app.jinja_env.get_template(template_name)
+    except TemplateNotFound:
+        logger.warning(f"Template {template_name} not found; widget routes will fail until it is deployed")
+
 # In-memory storage for demo (use Redis/DB in production)
 import_sessions = {}
 analytics_events = []
 skipped_reviews = {}  # Track skipped reviews per session
 
+# ==================== REVIEW FACET INDEX ====================
+
+def rating_bucket(rating):
+    """
+    Map a rating to its star bucket (1-5)
+    Uses the bookmarklet thresholds on the 0-100 scale: 5 = >=90, 4 = 70-89, 3 = 50-69
+    """
+    rating = rating or 0
+    if rating <= 5:  # Sample/other platforms use a 1-5 scale
+        rating = rating * 20
+    if rating >= 90:
+        return 5
+    if rating >= 70:
+        return 4
+    if rating >= 50:
+        return 3
+    if rating >= 30:
+        return 2
+    return 1
+
+def quality_bucket(score):
+    """Map an AI quality score (0-10) to high / medium / low"""
+    score = score or 0
+    if score >= 8:
+        return 'high'
+    if score >= 5:
+        return 'medium'
+    return 'low'
+
+class ReviewFacetIndex:
+    """
+    Posting lists over one scored review set
+    Built once per cached product so filter combinations are answered by set
+    intersection instead of a linear scan per filter
+    """
+    
+    # Star filters used by the bookmarklet buttons
+    STAR_FILTERS = {
+        '5stars': (5,),
+        '4-5stars': (4, 5),
+        '3stars': (3,)
+    }
+    
+    def __init__(self, reviews):
+        self.reviews = reviews
+        self.all_positions = frozenset(range(len(reviews)))
+        self.by_id = {}
+        self.by_country = {}
+        self.by_rating = {}
+        self.by_quality = {}
+        self.by_quality_score = {}
+        self.with_photos = set()
+        self.ai_recommended = set()
+        self.near_duplicates = set()
+        
+        for pos, review in enumerate(reviews):
+            if review.get('id'):
+                self.by_id[str(review['id'])] = pos
+            self.by_country.setdefault(review.get('country') or 'Unknown', set()).add(pos)
+            self.by_rating.setdefault(rating_bucket(review.get('rating', 0)), set()).add(pos)
+            score = review.get('quality_score', 0) or 0
+            self.by_quality.setdefault(quality_bucket(score), set()).add(pos)
+            self.by_quality_score.setdefault(score, set()).add(pos)
+            if review.get('images'):
+                self.with_photos.add(pos)
+            if review.get('ai_recommended'):
+                self.ai_recommended.add(pos)
+            if review.get('near_duplicate_of'):
+                self.near_duplicates.add(pos)
+        
+        # Raw ratings sorted ascending for exact min-rating thresholds
+        ordered = sorted(range(len(reviews)), key=lambda p: reviews[p].get('rating', 0) or 0)
+        self._rating_positions = ordered
+        self._rating_values = [reviews[p].get('rating', 0) or 0 for p in ordered]
+    
+    @classmethod
+    def validate_filters(cls, filters):
+        """Raise ValueError with a client-facing message for malformed filter values"""
+        stars = filters.get('stars')
+        if stars and stars != 'all' and stars not in cls.STAR_FILTERS:
+            if not (str(stars).isdigit() and 1 <= int(stars) <= 5):
+                raise ValueError(f"stars must be all, {', '.join(cls.STAR_FILTERS)} or 1-5")
+        for name in ('rating', 'min_quality_score'):
+            if filters.get(name):
+                try:
+                    float(filters[name])
+                except (TypeError, ValueError):
+                    raise ValueError(f"{name} must be a number")
+    
+    def get(self, review_id):
+        """Look up a review by its source ID"""
+        pos = self.by_id.get(str(review_id))
+        return self.reviews[pos] if pos is not None else None
+    
+    def _union(self, postings, keys):
+        result = set()
+        for key in keys:
+            result |= postings.get(key, set())
+        return result
+    
+    def match(self, filters):
+        """Return the set of positions matching all filters"""
+        candidates = []
+        
+        if filters.get('country') and filters['country'] != 'all':
+            candidates.append(self.by_country.get(filters['country'], set()))
+        
+        stars = filters.get('stars')
+        if stars and stars != 'all':
+            if stars in self.STAR_FILTERS:
+                candidates.append(self._union(self.by_rating, self.STAR_FILTERS[stars]))
+            else:
+                candidates.append(self.by_rating.get(int(stars), set()))
+        
+        if filters.get('rating'):
+            # Exact threshold on the raw rating via binary search
+            start = bisect.bisect_left(self._rating_values, float(filters['rating']))
+            candidates.append(set(self._rating_positions[start:]))
+        
+        if filters.get('with_photos') == 'true':
+            candidates.append(self.with_photos)
+        elif filters.get('with_photos') == 'false':
+            candidates.append(self.all_positions - self.with_photos)
+        
+        if filters.get('ai_recommended') == 'true':
+            candidates.append(self.ai_recommended)
+        
+        if filters.get('near_duplicates') == 'false':
+            candidates.append(self.all_positions - self.near_duplicates)
+        
+        if filters.get('quality'):
+            candidates.append(self.by_quality.get(filters['quality'], set()))
+        
+        if filters.get('min_quality_score'):
+            min_score = float(filters['min_quality_score'])
+            candidates.append(self._union(self.by_quality_score, [s for s in self.by_quality_score if s >= min_score]))
+        
+        if not candidates:
+            return set(self.all_positions)
+        
+        # Intersect smallest posting list first
+        candidates.sort(key=len)
+        result = set(candidates[0])
+        for posting in candidates[1:]:
+            result &= posting
+            if not result:
+                break
+        return result
+    
+    def query(self, filters):
+        """Return matching reviews (in cached order) and facet counts for the match"""
+        positions = self.match(filters or {})
+        return [self.reviews[pos] for pos in sorted(positions)], self.facet_counts(positions)
+    
+    def facet_counts(self, positions=None):
+        """Count each facet value, optionally restricted to a set of positions"""
+        if positions is None:
+            positions = self.all_positions
+        
+        def count(postings):
+            return {key: len(posting & positions) for key, posting in postings.items() if posting & positions}
+        
+        return {
+            'total': len(positions),
+            'country': count(self.by_country),
+            'rating': {str(k): v for k, v in count(self.by_rating).items()},
+            'quality': count(self.by_quality),
+            'with_photos': len(self.with_photos & positions),
+            'ai_recommended': len(self.ai_recommended & positions),
+            'near_duplicates': len(self.near_duplicates & positions)
+        }
+
+class ReviewResultCache:
+    """
+    TTL + LRU cache of scored extraction results
+    Each entry carries the facet index for its review set; import sessions point at entries
+    """
+    
+    def __init__(self, ttl=600, max_entries=200, max_sessions=5000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_sessions = max_sessions
+        self._entries = OrderedDict()
+        self._sessions = OrderedDict()  # session_id -> (keys, bound_at), same TTL + LRU as entries
+        self._near_duplicate_history = OrderedDict()  # product key -> (OrderedDict id -> signature, created_at)
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def make_key(platform, product_id, page, per_page):
+        return f"{platform}:{product_id}:{page}:{per_page}"
+    
+    def get(self, key):
+        """Return a fresh cache entry or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry['created_at'] > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+    
+    def put(self, key, reviews):
+        """Store a scored review set and build its facet index"""
+        entry = {
+            'key': key,
+            'reviews': reviews,
+            'index': ReviewFacetIndex(reviews),
+            'created_at': time.time()
+        }
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+    
+    # Review sets (pages / per_page variants) remembered per import session
+    MAX_KEYS_PER_SESSION = 20
+    
+    def bind_session(self, session_id, key):
+        """Remember a review set an import session has looked at (most recent last)"""
+        with self._lock:
+            keys = self._sessions.pop(session_id, ([], 0))[0]
+            keys = [k for k in keys if k != key][-(self.MAX_KEYS_PER_SESSION - 1):] + [key]
+            self._sessions[session_id] = (keys, time.time())
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+    
+    def entries_for_session(self, session_id):
+        """Fresh cache entries an import session has looked at, most recent first"""
+        with self._lock:
+            binding = self._sessions.get(session_id)
+            if binding is None:
+                return []
+            if time.time() - binding[1] > self.ttl:
+                del self._sessions[session_id]
+                return []
+            self._sessions.move_to_end(session_id)
+        entries = (self.get(key) for key in reversed(binding[0]))
+        return [entry for entry in entries if entry is not None]
+    
+    def get_for_session(self, session_id):
+        """Return the cache entry an import session looked at last"""
+        entries = self.entries_for_session(session_id)
+        return entries[0] if entries else None
+    
+    # Near-duplicate signatures remembered across the pages of a product (1 KB each)
+    MAX_HISTORY_PRODUCTS = 50
+    MAX_SIGNATURES_PER_PRODUCT = 2000
+    
+    def near_duplicate_history(self, platform, product_id):
+        """
+        Signatures of the representatives already shown for a product, as a list of
+        (review ID, signature) pairs, so later pages are checked against earlier ones
+        """
+        key = f"{platform}:{product_id}"
+        with self._lock:
+            history = self._near_duplicate_history.get(key)
+            if history is None:
+                return []
+            if time.time() - history[1] > self.ttl:
+                del self._near_duplicate_history[key]
+                return []
+            self._near_duplicate_history.move_to_end(key)
+            return list(history[0].items())
+    
+    def remember_signatures(self, platform, product_id, pairs):
+        """Merge (review ID, signature) pairs into a product's history (same TTL, LRU over products)"""
+        key = f"{platform}:{product_id}"
+        with self._lock:
+            history = self._near_duplicate_history.pop(key, None)
+            if history is None or time.time() - history[1] > self.ttl:
+                history = (OrderedDict(), time.time())
+            history[0].update(pairs)
+            while len(history[0]) > self.MAX_SIGNATURES_PER_PRODUCT:
+                history[0].popitem(last=False)
+            self._near_duplicate_history[key] = history
+            while len(self._near_duplicate_history) > self.MAX_HISTORY_PRODUCTS:
+                self._near_duplicate_history.popitem(last=False)
+
+# ==================== NEAR-DUPLICATE DETECTION ====================
+
+class NearDuplicateDetector:
+    """
+    Near-duplicate review detection with MinHash signatures and LSH banding
+    Catches copy-pasted and templated texts that evaluationId dedup misses.
+    Signatures use one-permutation hashing (one hash per shingle, densified bins)
+    and banding is a single dict pass, so a harvest is processed in linear time.
+    """
+    
+    _MAX_HASH = (1 << 32) - 1
+    
+    def __init__(self, threshold=0.8, num_perm=128, shingle_size=5):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = self._optimal_bands(threshold, num_perm)
+    
+    @staticmethod
+    def _optimal_bands(threshold, num_perm):
+        """Pick (bands, rows) minimising false positive + false negative area around the threshold"""
+        def integrate(f, a, b, steps=50):
+            width = (b - a) / steps
+            return sum(f(a + (i + 0.5) * width) for i in range(steps)) * width
+        
+        best, best_error = (num_perm, 1), float('inf')
+        for bands in range(1, num_perm + 1):
+            for rows in range(1, num_perm // bands + 1):
+                false_pos = integrate(lambda s: 1 - (1 - s ** rows) ** bands, 0.0, threshold)
+                false_neg = integrate(lambda s: (1 - s ** rows) ** bands, threshold, 1.0)
+                if false_pos + false_neg < best_error:
+                    best, best_error = (bands, rows), false_pos + false_neg
+        return best
+    
+    _NON_WORD = re.compile(r'[^\w\s]')
+    
+    def _shingle_hashes(self, text):
+        """Hashes of the character shingles of the normalised text"""
+        data = ' '.join(self._NON_WORD.sub('', (text or '').lower()).split()).encode('utf-8')
+        if not data:
+            return set()
+        size = self.shingle_size
+        if len(data) <= size:
+            return {zlib.crc32(data)}
+        return set(map(zlib.crc32, [data[i:i + size] for i in range(len(data) - size + 1)]))
+    
+    def signature(self, text):
+        """MinHash signature of a text, or None if there is nothing to hash"""
+        hashes = self._shingle_hashes(text)
+        if not hashes:
+            return None
+        
+        k = self.num_perm
+        max_hash = self._MAX_HASH
+        bins = [max_hash] * k
+        for h in hashes:
+            h = (h * 0x9E3779B1) & max_hash
+            b = h % k
+            v = h // k
+            if v < bins[b]:
+                bins[b] = v
+        
+        # Densify empty bins by borrowing from the next filled bin (rotation)
+        if max_hash in bins:
+            filled = next(i for i in range(k) if bins[i] != max_hash)
+            donor, offset = bins[filled], 0
+            for step in range(k, 0, -1):
+                i = (filled + step) % k
+                if bins[i] == max_hash:
+                    offset += 1
+                    bins[i] = donor + offset * (max_hash // k)
+                else:
+                    donor, offset = bins[i], 0
+        # Compact, GC-untracked storage matters for 100k-review harvests
+        return array('Q', bins)
+    
+    def similarity(self, sig_a, sig_b):
+        """Estimated Jaccard similarity of two signatures"""
+        return sum(map(operator.eq, sig_a, sig_b)) / len(sig_a)
+    
+    def find_groups(self, texts):
+        """
+        Cluster near-duplicate texts
+        Returns {index: representative_index} for every non-representative member;
+        the representative is always the earliest index in its group
+        """
+        return self._group_signatures([self.signature(t) for t in texts])
+    
+    def _group_signatures(self, signatures):
+        """find_groups over precomputed signatures (None entries never match)"""
+        parent = list(range(len(signatures)))
+        
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+        
+        rows = self.rows
+        for band in range(self.bands):
+            buckets = {}
+            start = band * rows
+            for idx, sig in enumerate(signatures):
+                if sig is not None:
+                    buckets.setdefault(sig[start:start + rows].tobytes(), []).append(idx)
+            
+            for members in buckets.values():
+                if len(members) < 2:
+                    continue
+                # Verify against the group roots, not just the first member of the bucket
+                roots = []
+                for member in members:
+                    root = find(member)
+                    for other in roots:
+                        other = find(other)
+                        if other != root and self.similarity(signatures[other], signatures[root]) >= self.threshold:
+                            parent[max(other, root)] = min(other, root)
+                            root = min(other, root)
+                            break
+                    if root not in roots:
+                        roots.append(root)
+        
+        return {i: find(i) for i in range(len(signatures)) if find(i) != i}
+    
+    def process(self, reviews, mode='flag', history=None):
+        """
+        Flag or collapse near-duplicate reviews (order preserved)
+        flag: duplicates get near_duplicate_of = representative review ID
+        collapse: duplicates are dropped, representative gets near_duplicate_count
+        history: list of (review ID, signature) for representatives already shown for this
+        product (earlier pages); it is matched against and extended with this page's representatives
+        Returns (reviews, number of near-duplicates found)
+        """
+        if mode == 'off' or not reviews or (history is None and len(reviews) < 2):
+            return reviews, 0
+        
+        started = time.time()
+        ids = {r.get('id') for r in reviews}
+        known = [(review_id, sig) for review_id, sig in (history or ()) if review_id not in ids]
+        offset = len(known)
+        signatures = [self.signature(r.get('text') or r.get('translation') or '') for r in reviews]
+        groups = self._group_signatures([sig for _, sig in known] + signatures)
+        
+        found = 0
+        for idx, rep in groups.items():
+            if idx < offset:
+                continue  # Earlier pages were flagged when they were scraped
+            found += 1
+            if rep < offset:
+                reviews[idx - offset]['near_duplicate_of'] = known[rep][0]
+                continue
+            reviews[rep - offset]['near_duplicate_count'] = reviews[rep - offset].get('near_duplicate_count', 0) + 1
+            reviews[idx - offset]['near_duplicate_of'] = reviews[rep - offset].get('id')
+        
+        if history is not None:
+            for idx, review in enumerate(reviews):
+                if offset + idx not in groups and review.get('id') and signatures[idx] is not None:
+                    history.append((review['id'], signatures[idx]))
+        
+        if mode == 'collapse':
+            reviews = [r for i, r in enumerate(reviews) if offset + i not in groups]
+        
+        logger.info(f"Near-duplicate detection: {found} found in {(time.time() - started) * 1000:.1f}ms (mode={mode})")
+        return reviews, found
+
 class EnhancedReviewExtractor:
     """Enhanced scraper with multi-platform support"""
     
@@ -97,6 +636,15 @@ class EnhancedReviewExtractor:
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
+        self.result_cache = ReviewResultCache(
+            ttl=Config.REVIEW_CACHE_TTL,
+            max_entries=Config.REVIEW_CACHE_MAX_ENTRIES,
+            max_sessions=Config.REVIEW_CACHE_MAX_SESSIONS
+        )
+        self.near_duplicates = NearDuplicateDetector(
+            threshold=Config.NEAR_DUP_THRESHOLD,
+            num_perm=Config.NEAR_DUP_NUM_PERM
+        )
     
     def extract_reviews_paginated(self, product_data, page=1, per_page=10, filters=None):
         """Extract reviews with pagination - matches Loox /admin/reviews/import/url"""
@@ -107,45 +655,61 @@ class EnhancedReviewExtractor:
             return self._error_response("Product ID required")
         
         try:
-            if 'aliexpress' in platform:
-                reviews = self._scrape_aliexpress(product_id, page, per_page)
-            elif 'amazon' in platform:
-                reviews = self._scrape_amazon(product_id, page, per_page)
-            elif 'ebay' in platform:
-                reviews = self._scrape_ebay(product_id, page, per_page)
-            elif 'walmart' in platform:
-                reviews = self._scrape_walmart(product_id, page, per_page)
-            else:
-                return self._error_response(f"Platform {platform} not supported")
-            
-            # Check if all scraping methods failed
-            if reviews is None:
-                return {
-                    'success': False,
-                    'error': 'service_unavailable',
-                    'message': 'Oops! Something went wrong while fetching reviews. Our team is working on it. Please try again in a few minutes.',
-                    'reviews': [],
-                    'stats': {
-                        'with_photos': 0,
-                        'ai_recommended': 0,
-                        'average_rating': 0,
-                        'average_quality': 0
+            cache_key = self.result_cache.make_key(platform, product_id, page, per_page)
+            cached = self.result_cache.get(cache_key)
+            
+            if cached is None:
+                if 'aliexpress' in platform:
+                    reviews = self._scrape_aliexpress(product_id, page, per_page)
+                elif 'amazon' in platform:
+                    reviews = self._scrape_amazon(product_id, page, per_page)
+                elif 'ebay' in platform:
+                    reviews = self._scrape_ebay(product_id, page, per_page)
+                elif 'walmart' in platform:
+                    reviews = self._scrape_walmart(product_id, page, per_page)
+                else:
+                    return self._error_response(f"Platform {platform} not supported")
+                
+                # Check if all scraping methods failed
+                if reviews is None:
+                    return {
+                        'success': False,
+                        'error': 'service_unavailable',
+                        'message': 'Oops! Something went wrong while fetching reviews. Our team is working on it. Please try again in a few minutes.',
+                        'reviews': [],
+                        'stats': {
+                            'with_photos': 0,
+                            'ai_recommended': 0,
+                            'average_rating': 0,
+                            'average_quality': 0
+                        }
                     }
-                }
-            
-            # Apply filters
-            if filters:
-                reviews = self._apply_filters(reviews, filters)
-            
-            # Calculate AI scores for all reviews
-            for review in reviews:
-                review['quality_score'] = self._calculate_quality_score(review)
-                # AI recommends only high-quality AND positive reviews (4+ stars = rating >= 80)
-                review['ai_recommended'] = (review['quality_score'] >= 8 and review.get('rating', 0) >= 80)
-                review['sentiment_score'] = self._calculate_sentiment(review.get('text', ''))
+                
+                # Calculate AI scores for all reviews
+                for review in reviews:
+                    review['quality_score'] = self._calculate_quality_score(review)
+                    # AI recommends only high-quality AND positive reviews (4+ stars = rating >= 80)
+                    review['ai_recommended'] = (review['quality_score'] >= 8 and review.get('rating', 0) >= 80)
+                    review['sentiment_score'] = self._calculate_sentiment(review.get('text', ''))
+                
+                # Sort by quality score (competitive advantage!)
+                reviews.sort(key=lambda x: x.get('quality_score', 0), reverse=True)
+                
+                # Flag/collapse copy-pasted and templated texts (best-scored copy is kept),
+                # including copies of reviews already shown on earlier pages of this product
+                history = self.result_cache.near_duplicate_history(platform, product_id)
+                seen = len(history)
+                reviews, near_duplicates = self.near_duplicates.process(reviews, Config.NEAR_DUP_MODE, history)
+                self.result_cache.remember_signatures(platform, product_id, history[seen:])
+                
+                # Cache the scored set with its facet index so filter switches skip the scrape
+                cached = self.result_cache.put(cache_key, reviews)
+                cached['near_duplicates'] = near_duplicates
+            else:
+                logger.info(f"Review cache hit: {cache_key}")
             
-            # Sort by quality score (competitive advantage!)
-            reviews.sort(key=lambda x: x.get('quality_score', 0), reverse=True)
+            # Apply filters (set intersection over the facet index)
+            reviews, facets = self._apply_filters(cached, filters or {})
             
             total_reviews = 150  # Simulated
             has_next = (page * per_page) < total_reviews
@@ -162,12 +726,15 @@ class EnhancedReviewExtractor:
                     'total_pages': (total_reviews + per_page - 1) // per_page
                 },
                 'stats': {
-                    'with_photos': len([r for r in reviews if r.get('images', [])]),
-                    'ai_recommended': len([r for r in reviews if r.get('ai_recommended', False)]),
+                    'with_photos': facets['with_photos'],
+                    'ai_recommended': facets['ai_recommended'],
                     'average_rating': sum(r.get('rating', 0) for r in reviews) / len(reviews) if reviews else 0,
-                    'average_quality': sum(r.get('quality_score', 0) for r in reviews) / len(reviews) if reviews else 0
+                    'average_quality': sum(r.get('quality_score', 0) for r in reviews) / len(reviews) if reviews else 0,
+                    'near_duplicates': cached.get('near_duplicates', 0)
                 },
+                'facets': facets,
                 'filters_applied': filters or {},
+                'cache_key': cached['key'],
                 'api_version': Config.API_VERSION
             }
             
@@ -636,205 +1203,2466 @@ class EnhancedReviewExtractor:
         
         return (pos_count - neg_count + (pos_count + neg_count)) / (2 * (pos_count + neg_count))
     
-    def _apply_filters(self, reviews, filters):
-        """Apply filters to reviews"""
-        filtered = reviews
-        
-        if filters.get('rating'):
-            min_rating = int(filters['rating'])
-            filtered = [r for r in filtered if r.get('rating', 0) >= min_rating]
-        
-        if filters.get('country'):
-            filtered = [r for r in filtered if r.get('country') == filters['country']]
-        
-        if filters.get('with_photos') == 'true':
-            filtered = [r for r in filtered if r.get('images', [])]
-        
-        if filters.get('min_quality_score'):
-            min_score = float(filters['min_quality_score'])
-            filtered = [r for r in filtered if r.get('quality_score', 0) >= min_score]
-        
-        return filtered
+    def _apply_filters(self, cached, filters):
+        """Apply filters using the cached facet index; returns (reviews, facet counts)"""
+        return cached['index'].query(filters)
+    
+    def _error_response(self, message):
+        """Error response"""
+        return {
+            'success': False,
+            'error': message,
+            'reviews': [],
+            'pagination': None
+        }
+
+# Initialize extractor
+extractor = EnhancedReviewExtractor()
+
+# ==================== SHOPIFY RATE LIMITER ====================
+
+class ShopifyRateLimiter:
+    """
+    Per-shop leaky-bucket client for Shopify API limits
+    Tracks the REST bucket (X-Shopify-Shop-Api-Call-Limit), the GraphQL cost bucket
+    (extensions.cost.throttleStatus) and 429 Retry-After, and makes callers wait
+    just long enough to stay under the limit instead of tripping 429s
+    """
+    
+    def __init__(self, rest_capacity=40, rest_leak_rate=2.0, graphql_capacity=1000,
+                 graphql_restore_rate=50.0, margin=0.1):
+        self.defaults = {
+            'rest_capacity': rest_capacity,
+            'rest_leak_rate': rest_leak_rate,
+            'graphql_capacity': graphql_capacity,
+            'graphql_restore_rate': graphql_restore_rate
+        }
+        self.margin = margin
+        self._shops = {}
+        self._lock = threading.Lock()
+    
+    def _state(self, shop):
+        state = self._shops.get(shop)
+        if state is None:
+            now = time.time()
+            state = dict(self.defaults)
+            state.update({
+                'rest_used': 0.0,
+                'rest_updated': now,
+                'graphql_available': float(self.defaults['graphql_capacity']),
+                'graphql_updated': now,
+                'blocked_until': 0.0,
+                'metrics': {'requests': 0, 'throttled': 0, 'waits': 0, 'wait_seconds': 0.0}
+            })
+            self._shops[shop] = state
+        return state
+    
+    def _refill(self, state, now):
+        state['rest_used'] = max(0.0, state['rest_used'] - (now - state['rest_updated']) * state['rest_leak_rate'])
+        state['rest_updated'] = now
+        state['graphql_available'] = min(
+            float(state['graphql_capacity']),
+            state['graphql_available'] + (now - state['graphql_updated']) * state['graphql_restore_rate']
+        )
+        state['graphql_updated'] = now
+    
+    def acquire(self, shop, kind='rest', cost=1):
+        """Block until the shop's bucket has room for a call of the given cost, then reserve it"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                state = self._state(shop)
+                now = time.time()
+                self._refill(state, now)
+                
+                if now < state['blocked_until']:
+                    delay = state['blocked_until'] - now
+                elif kind == 'graphql':
+                    floor = state['graphql_capacity'] * self.margin
+                    cost = min(cost, state['graphql_capacity'] - floor)
+                    shortfall = cost - (state['graphql_available'] - floor)
+                    delay = shortfall / state['graphql_restore_rate'] if shortfall > 0 else 0
+                    if not delay:
+                        state['graphql_available'] -= cost
+                else:
+                    limit = max(1.0, state['rest_capacity'] * (1 - self.margin))
+                    overflow = state['rest_used'] + cost - limit
+                    delay = overflow / state['rest_leak_rate'] if overflow > 0 else 0
+                    if not delay:
+                        state['rest_used'] += cost
+                
+                if not delay:
+                    state['metrics']['requests'] += 1
+                    if waited:
+                        state['metrics']['waits'] += 1
+                        state['metrics']['wait_seconds'] += waited
+                    return waited
+            
+            delay = min(delay, 5.0)
+            time.sleep(delay)
+            waited += delay
+    
+    def update_from_response(self, shop, response):
+        """Sync the REST bucket from headers and honour 429 Retry-After"""
+        with self._lock:
+            state = self._state(shop)
+            now = time.time()
+            
+            call_limit = response.headers.get('X-Shopify-Shop-Api-Call-Limit')
+            if call_limit and '/' in call_limit:
+                used, capacity = call_limit.split('/', 1)
+                try:
+                    state['rest_used'] = float(used)
+                    state['rest_capacity'] = int(capacity)
+                    state['rest_updated'] = now
+                except ValueError:
+                    pass
+            
+            if response.status_code == 429:
+                try:
+                    retry_after = float(response.headers.get('Retry-After', 2.0))
+                except ValueError:
+                    retry_after = 2.0
+                state['blocked_until'] = max(state['blocked_until'], now + retry_after)
+                state['metrics']['throttled'] += 1
+    
+    def update_from_graphql(self, shop, data):
+        """Sync the GraphQL cost bucket from a response's extensions.cost"""
+        throttle = ((data or {}).get('extensions') or {}).get('cost', {}).get('throttleStatus')
+        if not throttle:
+            return
+        with self._lock:
+            state = self._state(shop)
+            state['graphql_capacity'] = throttle.get('maximumAvailable', state['graphql_capacity'])
+            state['graphql_available'] = float(throttle.get('currentlyAvailable', state['graphql_available']))
+            state['graphql_restore_rate'] = throttle.get('restoreRate', state['graphql_restore_rate'])
+            state['graphql_updated'] = time.time()
+            if any((e.get('extensions') or {}).get('code') == 'THROTTLED' for e in data.get('errors') or []):
+                state['metrics']['throttled'] += 1
+    
+    def forget(self, shop):
+        """Drop a shop's bucket state (its client was evicted; rebuilt on next call)"""
+        with self._lock:
+            self._shops.pop(shop, None)
+    
+    def metrics(self, shop=None):
+        """Current budget and counters per shop"""
+        with self._lock:
+            now = time.time()
+            result = {}
+            for name, state in self._shops.items():
+                if shop and name != shop:
+                    continue
+                self._refill(state, now)
+                result[name] = {
+                    'rest': {
+                        'used': round(state['rest_used'], 2),
+                        'capacity': state['rest_capacity'],
+                        'leak_rate': state['rest_leak_rate']
+                    },
+                    'graphql': {
+                        'available': round(state['graphql_available'], 2),
+                        'capacity': state['graphql_capacity'],
+                        'restore_rate': state['graphql_restore_rate']
+                    },
+                    'blocked_for': round(max(0.0, state['blocked_until'] - now), 2),
+                    **state['metrics']
+                }
+            return result
+
+# Initialize rate limiter (shared by all Shopify clients)
+shopify_rate_limiter = ShopifyRateLimiter(
+    rest_capacity=Config.SHOPIFY_REST_BUCKET,
+    rest_leak_rate=Config.SHOPIFY_REST_LEAK_RATE,
+    graphql_capacity=Config.SHOPIFY_GRAPHQL_BUCKET,
+    graphql_restore_rate=Config.SHOPIFY_GRAPHQL_RESTORE_RATE,
+    margin=Config.SHOPIFY_RATE_LIMIT_MARGIN
+)
+
+# ==================== SHOPIFY TRANSPORT ====================
+
+def shopify_admin_url(shop_domain, api_version):
+    """Admin REST/GraphQL base url for a shop (honours SHOPIFY_API_BASE_URL for local simulators)"""
+    origin = Config.SHOPIFY_API_BASE_URL.rstrip('/') or f"https://{shop_domain}"
+    return f"{origin}/admin/api/{api_version}"
+
+class ShopifyTransport:
+    """
+    Pooled keep-alive HTTP transport for Shopify Admin API calls
+    One requests.Session per shop so TCP/TLS connections to *.myshopify.com are reused;
+    every call goes through the shop's rate limiter and 429 / 5xx / connection errors
+    are retried with jittered exponential backoff
+    """
+    
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+    IDEMPOTENT_METHODS = {'GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'}
+    
+    def __init__(self, rate_limiter, pool_size=16, max_retries=5, backoff=0.5,
+                 connect_timeout=5, read_timeout=10):
+        self.rate_limiter = rate_limiter
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = (connect_timeout, read_timeout)
+        self._sessions = {}
+        self._lock = threading.Lock()
+    
+    def session(self, shop):
+        """Keep-alive session for one shop (created on first use)"""
+        with self._lock:
+            session = self._sessions.get(shop)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, pool_block=True)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers.update({'Accept-Encoding': 'gzip, deflate', 'Accept': 'application/json'})
+                self._sessions[shop] = session
+            return session
+    
+    def close(self, shop):
+        """Drop a shop's session and its pooled connections"""
+        with self._lock:
+            session = self._sessions.pop(shop, None)
+        if session is not None:
+            session.close()
+    
+    def _backoff_delay(self, attempt):
+        """Full-jitter exponential backoff so concurrent workers don't retry in lockstep"""
+        return random.uniform(0, self.backoff * (2 ** attempt))
+    
+    def request(self, shop, method, url, kind='rest', cost=1, idempotent=None, timeout=None, **kwargs):
+        """
+        Send one Shopify call, retrying 429s always and 5xx / connection errors when the
+        call is safe to repeat (idempotent methods, or idempotent=True for GraphQL queries)
+        """
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in self.IDEMPOTENT_METHODS
+        if timeout is None:
+            timeout = self.timeout
+        elif not isinstance(timeout, tuple):
+            timeout = (self.timeout[0], timeout)
+        session = self.session(shop)
+        
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire(shop, kind, cost)
+            try:
+                response = session.request(method, url, timeout=timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if not idempotent or attempt == self.max_retries:
+                    raise
+                delay = self._backoff_delay(attempt)
+                logger.warning(f"Shopify {method} {shop} failed ({e.__class__.__name__}), retrying in {delay:.2f}s")
+                time.sleep(delay)
+                continue
+            
+            self.rate_limiter.update_from_response(shop, response)
+            status = response.status_code
+            if (status not in self.RETRY_STATUSES or attempt == self.max_retries
+                    or (status != 429 and not idempotent)):
+                return response
+            
+            # 429: the limiter already holds the shop until Retry-After; 5xx: back off
+            delay = 0 if status == 429 else self._backoff_delay(attempt)
+            logger.warning(f"Shopify {status} for {shop}, retrying (attempt {attempt + 1})")
+            if delay:
+                time.sleep(delay)
+
+# Initialize transport (shared by all Shopify clients)
+shopify_transport = ShopifyTransport(
+    shopify_rate_limiter,
+    pool_size=Config.SHOPIFY_POOL_SIZE,
+    max_retries=Config.SHOPIFY_MAX_RETRIES,
+    backoff=Config.SHOPIFY_RETRY_BACKOFF,
+    connect_timeout=Config.SHOPIFY_CONNECT_TIMEOUT,
+    read_timeout=Config.SHOPIFY_READ_TIMEOUT
+)
+
+# ==================== PRODUCT CATALOG INDEX ====================
+
+class ProductCatalogIndex:
+    """
+    In-memory inverted + prefix index over a shop's whole product catalog
+    Indexes title, handle, SKU and vendor; queries are answered by posting-list
+    intersection and ranked by field weights, in milliseconds for 50k+ products
+    """
+    
+    FIELD_WEIGHTS = {'sku': 8, 'title': 4, 'handle': 2, 'vendor': 1}
+    MIN_PREFIX = 2  # Shorter query tokens must match exactly
+    
+    def __init__(self):
+        self.products = {}
+        self._fields = {}  # product id -> {field: set(tokens)}
+        self._postings = {}  # token -> set(product ids)
+        self._vocabulary = []  # sorted tokens for prefix lookup
+        self._vocabulary_dirty = False
+        self._by_handle = {}
+        self._by_sku = {}  # whole SKU (lowercase) -> set(product ids)
+        self._lock = threading.Lock()
+        self.synced_at = None
+    
+    @staticmethod
+    def tokenize(text):
+        return [t for t in re.split(r'[^0-9a-z]+', (text or '').lower()) if t]
+    
+    def _field_tokens(self, product):
+        skus = set()
+        for sku in product.get('skus', []):
+            skus.update(self.tokenize(sku))
+        return {
+            'title': set(self.tokenize(product.get('title'))),
+            'handle': set(self.tokenize(product.get('handle'))),
+            'vendor': set(self.tokenize(product.get('vendor'))),
+            'sku': skus
+        }
+    
+    def _remove_locked(self, product_id):
+        fields = self._fields.pop(product_id, None)
+        product = self.products.pop(product_id, None)
+        if product and self._by_handle.get(product['handle']) == product_id:
+            del self._by_handle[product['handle']]
+        for sku in (product or {}).get('skus', []):
+            owners = self._by_sku.get(sku.lower())
+            if owners is not None:
+                owners.discard(product_id)
+                if not owners:
+                    del self._by_sku[sku.lower()]
+        if not fields:
+            return
+        for token in set().union(*fields.values()):
+            posting = self._postings.get(token)
+            if posting is not None:
+                posting.discard(product_id)
+                if not posting:
+                    del self._postings[token]
+                    self._vocabulary_dirty = True
+    
+    def upsert(self, product):
+        """Add or replace one slim product record"""
+        product_id = product['id']
+        fields = self._field_tokens(product)
+        with self._lock:
+            self._remove_locked(product_id)
+            self.products[product_id] = product
+            self._fields[product_id] = fields
+            self._by_handle[product['handle']] = product_id
+            for sku in product.get('skus', []):
+                self._by_sku.setdefault(sku.lower(), set()).add(product_id)
+            for token in set().union(*fields.values()):
+                posting = self._postings.get(token)
+                if posting is None:
+                    self._postings[token] = posting = set()
+                    self._vocabulary_dirty = True
+                posting.add(product_id)
+    
+    def remove(self, product_id):
+        """Drop a product from the index"""
+        with self._lock:
+            self._remove_locked(str(product_id))
+    
+    def get_by_handle(self, handle):
+        with self._lock:
+            product_id = self._by_handle.get(handle)
+            return self.products.get(product_id) if product_id else None
+    
+    def _matching_tokens(self, token, prefix):
+        """Vocabulary tokens equal to (or, for prefixes, starting with) token"""
+        if not prefix or len(token) < self.MIN_PREFIX:
+            return [token] if token in self._postings else []
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(self._postings)
+            self._vocabulary_dirty = False
+        start = bisect.bisect_left(self._vocabulary, token)
+        end = bisect.bisect_left(self._vocabulary, token + '\uffff')
+        return self._vocabulary[start:end]
+    
+    def search(self, query, limit=20):
+        """Ranked products matching every query token (the last one as a prefix)"""
+        tokens = self.tokenize(query)
+        if not tokens:
+            return []
+        
+        with self._lock:
+            # A full SKU is the most specific query there is
+            sku_hits = self._by_sku.get(query.strip().lower())
+            if sku_hits:
+                return [self.products[product_id] for product_id in sorted(sku_hits)[:limit]]
+            
+            expansions = []
+            token_postings = []
+            for token in tokens:
+                # Every token may be a prefix (instant search), exact matches rank higher
+                matches = self._matching_tokens(token, prefix=True)
+                if not matches:
+                    return []
+                expansions.append((token, set(matches)))
+                if len(matches) == 1:
+                    token_postings.append(self._postings[matches[0]])
+                else:
+                    token_postings.append(set().union(*(self._postings[m] for m in matches)))
+            
+            # Intersect the most selective posting list first
+            token_postings.sort(key=len)
+            candidates = token_postings[0].intersection(*token_postings[1:])
+            if not candidates:
+                return []
+            
+            weights = list(self.FIELD_WEIGHTS.items())
+            scored = []
+            for product_id in candidates:
+                fields = self._fields[product_id]
+                score = 0
+                for token, matches in expansions:
+                    for field, weight in weights:
+                        field_tokens = fields[field]
+                        if token in field_tokens:
+                            score += weight * 2
+                        elif not matches.isdisjoint(field_tokens):
+                            score += weight
+                title = self.products[product_id]['title']
+                scored.append((-score, len(title), title, product_id))
+            
+            return [self.products[product_id] for _, _, _, product_id in heapq.nsmallest(limit, scored)]
+    
+    def replace_all(self, products):
+        """Swap in a freshly crawled catalog"""
+        fresh = ProductCatalogIndex()
+        for product in products:
+            fresh.upsert(product)
+        with self._lock:
+            self.products = fresh.products
+            self._fields = fresh._fields
+            self._postings = fresh._postings
+            self._by_handle = fresh._by_handle
+            self._by_sku = fresh._by_sku
+            self._vocabulary = []
+            self._vocabulary_dirty = True
+            self.synced_at = time.time()
+    
+    def __len__(self):
+        return len(self.products)
+
+# ==================== SHOPIFY API HELPER ====================
+
+class ShopifyAPIHelper:
+    """Helper class for Shopify API interactions"""
+    
+    # Shopify accepts at most 25 metafields per metafieldsSet call
+    METAFIELDS_SET_LIMIT = 25
+    
+    # Estimated cost of a full metafieldsSet batch (reconciled from extensions.cost)
+    METAFIELDS_SET_COST = 10
+    
+    # Aggregated review storage: reviewking.reviews_page_<n> chunks + reviewking.summary
+    REVIEW_PAGE_SIZE = 50
+    REVIEW_PAGE_MAX_BYTES = 60000
+    REVIEW_BATCH_SIZE = 250  # Reviews appended per read-modify-write cycle
+    MAX_STALE_RETRIES = 3
+    
+    REVIEW_DOCUMENT_QUERY = """
+        query reviewDocument($id: ID!, $pageKey: String!) {
+            product(id: $id) {
+                summary: metafield(namespace: "reviewking", key: "summary") { value compareDigest }
+                page: metafield(namespace: "reviewking", key: $pageKey) { value }
+            }
+        }
+    """
+    
+    # How often a throttled (429 / THROTTLED) call is retried
+    MAX_THROTTLE_RETRIES = 5
+    
+    METAFIELDS_SET_MUTATION = """
+        mutation metafieldsSet($metafields: [MetafieldsSetInput!]!) {
+            metafieldsSet(metafields: $metafields) {
+                metafields { id namespace key }
+                userErrors { field message code }
+            }
+        }
+    """
+    
+    PRODUCT_WEBHOOK_TOPICS = ('products/create', 'products/update', 'products/delete')
+    BILLING_WEBHOOK_TOPICS = ('app_subscriptions/update', 'app/uninstalled')
+    
+    # Only the fields _slim_product needs (skips the full images array)
+    PRODUCT_FIELDS = 'id,title,handle,vendor,image,variants,updated_at'
+    
+    PRODUCT_UPDATED_AT_QUERY = """
+        query productUpdatedAt($id: ID!) {
+            product(id: $id) { updatedAt }
+        }
+    """
+    
+    PRODUCTS_BY_ID_QUERY = """
+        query productsById($ids: [ID!]!) {
+            nodes(ids: $ids) {
+                ... on Product {
+                    id title handle vendor updatedAt
+                    featuredImage { url }
+                    variants(first: 10) { nodes { sku } }
+                }
+            }
+        }
+    """
+    NODES_CHUNK_SIZE = 50  # Keeps each nodes query well under the 1000-point query cost cap
+    
+    # Bulk export of everything we wrote under the reviewking namespace
+    REVIEW_EXPORT_BULK_QUERY = """
+        {
+            products {
+                edges {
+                    node {
+                        id
+                        metafields(namespace: "reviewking") {
+                            edges { node { key value } }
+                        }
+                    }
+                }
+            }
+        }
+    """
+    
+    BULK_OPERATION_RUN_MUTATION = """
+        mutation bulkOperationRunQuery($query: String!) {
+            bulkOperationRunQuery(query: $query) {
+                bulkOperation { id status }
+                userErrors { field message }
+            }
+        }
+    """
+    
+    BULK_OPERATION_STATUS_QUERY = """
+        query bulkOperationStatus($id: ID!) {
+            node(id: $id) {
+                ... on BulkOperation { id status errorCode objectCount url createdAt completedAt }
+            }
+        }
+    """
+    
+    # Shopify Billing: only ACTIVE subscriptions are returned
+    APP_SUBSCRIPTIONS_QUERY = """
+        query appSubscriptions {
+            currentAppInstallation {
+                activeSubscriptions { id name status test currentPeriodEnd }
+            }
+            shop { plan { partnerDevelopment } }
+        }
+    """
+    
+    def __init__(self, shop_domain=None, access_token=None, api_version=None):
+        self.shop_domain = shop_domain or Config.SHOPIFY_SHOP_DOMAIN
+        self.access_token = access_token or Config.SHOPIFY_ACCESS_TOKEN
+        self.api_version = api_version or Config.SHOPIFY_API_VERSION
+        
+        # Last known page count per product (lets appends read summary + last page in one query)
+        self._page_hints = {}
+        self._product_locks = {}
+        self._product_locks_guard = threading.Lock()
+        
+        # Full-catalog search index (filled by cursor-paginated crawls)
+        self.catalog = ProductCatalogIndex()
+        self.catalog_status = {'state': 'empty', 'product_count': 0, 'last_synced_at': None,
+                               'duration_ms': None, 'error': None}
+        self._catalog_sync_lock = threading.Lock()
+        
+        # Slim product records for get_product(s): TTL + ETag/updated_at revalidation,
+        # invalidated by product webhooks
+        self._product_cache = OrderedDict()
+        self._product_cache_lock = threading.Lock()
+        self.product_cache_stats = {'hits': 0, 'revalidated': 0, 'misses': 0}
+        # Last applied webhook updated_at per product, so late retries can't roll back newer data
+        self._product_versions = {}
+        self._deleted_products = set()
+        self._webhook_lock = threading.Lock()
+        self._sync_webhooks = None  # Product ids touched by webhooks while a crawl runs
+        
+        # Debug logging
+        logger.info(f"ShopifyAPIHelper init - Domain: {self.shop_domain}, Token: {self.access_token[:20] if self.access_token else 'None'}...")
+        
+        if self.shop_domain and self.access_token:
+            self.base_url = shopify_admin_url(self.shop_domain, self.api_version)
+            self.headers = {
+                'X-Shopify-Access-Token': self.access_token,
+                'Content-Type': 'application/json'
+            }
+            logger.info(f"✅ Shopify API configured: {self.base_url}")
+        else:
+            self.base_url = None
+            self.headers = None
+            logger.warning(f"❌ Shopify API NOT configured - Domain: {bool(self.shop_domain)}, Token: {bool(self.access_token)}")
+    
+    def is_configured(self):
+        """Check if Shopify API is configured"""
+        return bool(self.base_url and self.headers)
+    
+    def _request(self, method, url, **kwargs):
+        """REST call through the shop's pooled transport (rate-limited, retried)"""
+        kwargs.setdefault('headers', self.headers)
+        return shopify_transport.request(self.shop_domain, method, url, **kwargs)
+    
+    def _slim_product(self, p):
+        """Reduce a Shopify product to the fields we search and display"""
+        image = p.get('image') or (p['images'][0] if p.get('images') else None)
+        return {
+            'id': str(p['id']),
+            'title': p['title'],
+            'handle': p['handle'],
+            'image': image['src'] if image else None,
+            'url': f"https://{self.shop_domain}/products/{p['handle']}",
+            'vendor': p.get('vendor', ''),
+            'skus': [v['sku'] for v in p.get('variants', []) if v.get('sku')]
+        }
+    
+    def sync_catalog(self):
+        """
+        Crawl the whole catalog with cursor pagination (page_info via the Link header)
+        and swap the result into the search index
+        """
+        if not self._catalog_sync_lock.acquire(blocking=False):
+            return self.catalog_status  # A crawl is already running
+        
+        started = time.time()
+        try:
+            self.catalog_status['state'] = 'syncing'
+            with self._webhook_lock:
+                self._sync_webhooks = set()
+            url = f"{self.base_url}/products.json?limit=250&fields={self.PRODUCT_FIELDS}"
+            crawled = {}  # product id -> (slim product, updated_at)
+            while url:
+                response = self._request('GET', url, timeout=30)
+                response.raise_for_status()
+                for p in response.json().get('products', []):
+                    updated_at = p.get('updated_at')
+                    crawled[str(p['id'])] = (self._slim_product(p), datetime.fromisoformat(updated_at) if updated_at else None)
+                url = response.links.get('next', {}).get('url')
+            
+            with self._webhook_lock:
+                products = self._reconcile_crawl_locked(crawled)
+                self.catalog.replace_all(products)
+            self.catalog_status.update({
+                'state': 'ready',
+                'product_count': len(products),
+                'last_synced_at': datetime.now().isoformat(),
+                'duration_ms': int((time.time() - started) * 1000),
+                'error': None
+            })
+            logger.info(f"Product index synced for {self.shop_domain}: {len(products)} products in {time.time() - started:.1f}s")
+        except Exception as e:
+            logger.error(f"Product index sync error: {str(e)}")
+            self.catalog_status.update({'state': 'ready' if self.catalog.synced_at else 'error', 'error': str(e)})
+        finally:
+            with self._webhook_lock:
+                self._sync_webhooks = None
+            self._catalog_sync_lock.release()
+        return self.catalog_status
+    
+    def _reconcile_crawl_locked(self, crawled):
+        """
+        Merge webhooks applied during a crawl into its result (caller holds _webhook_lock)
+        A page fetched before a webhook is older than the index: deletes win, and a newer
+        webhook version (or a product created after its page was crawled) is kept.
+        The crawl then becomes the baseline, so the version/delete bookkeeping only
+        keeps what this sync saw instead of growing with every webhook ever applied.
+        """
+        touched = self._sync_webhooks or set()
+        versions = {}
+        for product_id in touched:
+            if product_id in self._deleted_products:
+                crawled.pop(product_id, None)
+                continue
+            current = self.catalog.products.get(product_id)
+            newer = self._product_versions.get(product_id)
+            crawled_at = crawled[product_id][1] if product_id in crawled else None
+            if current and (product_id not in crawled or (newer and crawled_at and newer > crawled_at)):
+                crawled[product_id] = (current, newer)
+        
+        for product_id, (_, updated_at) in crawled.items():
+            if updated_at:
+                versions[product_id] = updated_at
+        self._product_versions = versions
+        self._deleted_products = self._deleted_products & touched
+        return [product for product, _ in crawled.values()]
+    
+    def sync_catalog_async(self):
+        """Start a background crawl unless one is already running"""
+        if self.is_configured() and not self._catalog_sync_lock.locked():
+            threading.Thread(target=self.sync_catalog, name='catalog-sync', daemon=True).start()
+    
+    def _catalog_ready(self):
+        """True if the index can serve searches; schedules a refresh when missing or stale"""
+        synced_at = self.catalog.synced_at
+        if synced_at is None or time.time() - synced_at > Config.PRODUCT_INDEX_MAX_AGE:
+            self.sync_catalog_async()
+        return synced_at is not None
+    
+    def search_products(self, query):
+        """
+        Search for products by name or URL
+        Returns list of matching products
+        Served from the local catalog index once it has been crawled
+        """
+        if not self.is_configured():
+            return {'success': False, 'error': 'Shopify API not configured'}
+        
+        try:
+            # If query is a URL, extract product ID
+            if 'products/' in query:
+                # Extract product ID from URL
+                match = re.search(r'/products/([^/?]+)', query)
+                if match:
+                    product_handle = match.group(1)
+                    if self._catalog_ready():
+                        product = self.catalog.get_by_handle(product_handle)
+                        return {'success': True, 'source': 'index', 'products': [product] if product else []}
+                    # Get product by handle
+                    url = f"{self.base_url}/products.json?handle={product_handle}"
+                else:
+                    return {'success': False, 'error': 'Invalid product URL'}
+            else:
+                if self._catalog_ready():
+                    return {'success': True, 'source': 'index', 'products': self.catalog.search(query, limit=50)}
+                # Index still building: get first products and filter by title
+                url = f"{self.base_url}/products.json?limit=50"
+            
+            response = self._request('GET', url)
+            response.raise_for_status()
+            
+            data = response.json()
+            all_products = data.get('products', [])
+            
+            # Filter products by query if it's a text search
+            if 'products/' not in query:
+                query_lower = query.lower()
+                products = [p for p in all_products if query_lower in p['title'].lower()]
+            else:
+                products = all_products
+            
+            return {
+                'success': True,
+                'source': 'live',
+                'products': [self._slim_product(p) for p in products]
+            }
+            
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Shopify API error: {str(e)}")
+            return {'success': False, 'error': 'Failed to connect to Shopify'}
+        except Exception as e:
+            logger.error(f"Product search error: {str(e)}")
+            return {'success': False, 'error': str(e)}
+    
+    @staticmethod
+    def _parse_timestamp(value):
+        """REST (offset) and GraphQL (Z) timestamps as comparable datetimes"""
+        return datetime.fromisoformat(value.replace('Z', '+00:00')) if value else None
+    
+    def _cached_product(self, product_id):
+        with self._product_cache_lock:
+            entry = self._product_cache.get(product_id)
+            if entry is not None:
+                self._product_cache.move_to_end(product_id)
+            return entry
+    
+    def _cache_product(self, product, etag=None, updated_at=None):
+        with self._product_cache_lock:
+            self._product_cache[product['id']] = {
+                'product': product,
+                'etag': etag,
+                'updated_at': self._parse_timestamp(updated_at),
+                'fetched_at': time.time()
+            }
+            self._product_cache.move_to_end(product['id'])
+            while len(self._product_cache) > Config.PRODUCT_CACHE_MAX_ENTRIES:
+                self._product_cache.popitem(last=False)
+    
+    def _slim_graphql_product(self, node):
+        """_slim_product for a GraphQL Product node"""
+        return {
+            'id': node['id'].rsplit('/', 1)[-1],
+            'title': node['title'],
+            'handle': node['handle'],
+            'image': (node.get('featuredImage') or {}).get('url'),
+            'url': f"https://{self.shop_domain}/products/{node['handle']}",
+            'vendor': node.get('vendor', ''),
+            'skus': [v['sku'] for v in node['variants']['nodes'] if v.get('sku')]
+        }
+    
+    def _still_current(self, product_id, entry):
+        """Cheap revalidation of a stale entry: conditional GET by ETag, else compare updatedAt"""
+        if entry['etag']:
+            response = self._request('GET', f"{self.base_url}/products/{product_id}.json",
+                                     params={'fields': self.PRODUCT_FIELDS},
+                                     headers=dict(self.headers, **{'If-None-Match': entry['etag']}))
+            if response.status_code == 304:
+                return True
+            response.raise_for_status()
+            product = response.json()['product']
+            self._cache_product(self._slim_product(product), response.headers.get('ETag'), product.get('updated_at'))
+            return True  # Refreshed in place
+        
+        if entry['updated_at'] is None:
+            return False
+        data = self.graphql(self.PRODUCT_UPDATED_AT_QUERY, {'id': f"gid://shopify/Product/{product_id}"})
+        product = (data.get('data') or {}).get('product')
+        return bool(product) and self._parse_timestamp(product['updatedAt']) == entry['updated_at']
+    
+    def get_product(self, product_id):
+        """
+        Get a single product by ID
+        Slim record cached for PRODUCT_CACHE_TTL, then revalidated instead of re-downloaded
+        """
+        if not self.is_configured():
+            return {'success': False, 'error': 'Shopify API not configured'}
+        
+        product_id = str(product_id)
+        try:
+            entry = self._cached_product(product_id)
+            if entry and time.time() - entry['fetched_at'] < Config.PRODUCT_CACHE_TTL:
+                self.product_cache_stats['hits'] += 1
+                return {'success': True, 'product': entry['product']}
+            
+            if entry and self._still_current(product_id, entry):
+                entry = self._cached_product(product_id) or entry
+                entry['fetched_at'] = time.time()
+                self.product_cache_stats['revalidated'] += 1
+                return {'success': True, 'product': entry['product']}
+            
+            self.product_cache_stats['misses'] += 1
+            url = f"{self.base_url}/products/{product_id}.json"
+            response = self._request('GET', url, params={'fields': self.PRODUCT_FIELDS})
+            response.raise_for_status()
+            
+            raw = response.json()['product']
+            product = self._slim_product(raw)
+            self._cache_product(product, response.headers.get('ETag'), raw.get('updated_at'))
+            
+            return {
+                'success': True,
+                'product': product
+            }
+        except Exception as e:
+            logger.error(f"Get product error: {str(e)}")
+            return {'success': False, 'error': str(e)}
+    
+    def get_products(self, product_ids):
+        """
+        Get many products by ID: fresh cache entries are served locally and the rest are
+        fetched with one GraphQL nodes query per NODES_CHUNK_SIZE ids
+        Returns {'success', 'products': {id: product}, 'missing': [ids]}
+        """
+        if not self.is_configured():
+            return {'success': False, 'error': 'Shopify API not configured'}
+        
+        products = {}
+        to_fetch = []
+        now = time.time()
+        for product_id in dict.fromkeys(str(pid) for pid in product_ids):
+            entry = self._cached_product(product_id)
+            if entry and now - entry['fetched_at'] < Config.PRODUCT_CACHE_TTL:
+                products[product_id] = entry['product']
+                self.product_cache_stats['hits'] += 1
+            else:
+                to_fetch.append(product_id)
+        
+        try:
+            for start in range(0, len(to_fetch), self.NODES_CHUNK_SIZE):
+                chunk = to_fetch[start:start + self.NODES_CHUNK_SIZE]
+                data = self.graphql(self.PRODUCTS_BY_ID_QUERY,
+                                    {'ids': [f"gid://shopify/Product/{pid}" for pid in chunk]},
+                                    cost=len(chunk) * 13)
+                if data.get('errors') and not data.get('data'):
+                    raise Exception(data['errors'][0].get('message', 'GraphQL error'))
+                for node in (data.get('data') or {}).get('nodes') or []:
+                    if node:  # Deleted / unknown ids come back as null
+                        product = self._slim_graphql_product(node)
+                        self._cache_product(product, updated_at=node.get('updatedAt'))
+                        products[product['id']] = product
+                self.product_cache_stats['misses'] += len(chunk)
+        except Exception as e:
+            logger.error(f"Get products error: {str(e)}")
+            return {'success': False, 'error': str(e)}
+        
+        return {
+            'success': True,
+            'products': products,
+            'missing': [pid for pid in to_fetch if pid not in products]
+        }
+    
+    def invalidate_product(self, product_id):
+        """Drop a cached get_product result"""
+        with self._product_cache_lock:
+            self._product_cache.pop(str(product_id), None)
+    
+    def apply_product_webhook(self, topic, payload):
+        """
+        Apply a products/create|update|delete webhook to the catalog index and product cache
+        Returns 'applied' or 'ignored' (stale retry or delivery for a deleted product)
+        """
+        product_id = str(payload['id'])
+        with self._webhook_lock:
+            if self._sync_webhooks is not None:
+                self._sync_webhooks.add(product_id)
+            if topic == 'products/delete':
+                self._deleted_products.add(product_id)
+                self._product_versions.pop(product_id, None)
+                self.catalog.remove(product_id)
+                self.invalidate_product(product_id)
+                return 'applied'
+            
+            if product_id in self._deleted_products:
+                return 'ignored'
+            updated_at = payload.get('updated_at')
+            if updated_at:
+                updated_at = datetime.fromisoformat(updated_at)
+                previous = self._product_versions.get(product_id)
+                if previous and updated_at < previous:
+                    return 'ignored'
+                self._product_versions[product_id] = updated_at
+            
+            self.catalog.upsert(self._slim_product(payload))
+            self.invalidate_product(product_id)
+            return 'applied'
+    
+    def register_product_webhooks(self, address):
+        """Subscribe the shop's product create/update/delete events to our webhook endpoint"""
+        return self.register_webhooks(self.PRODUCT_WEBHOOK_TOPICS, address)
+    
+    def register_webhooks(self, topics, address):
+        """Subscribe the shop's events for the given topics to one webhook endpoint"""
+        if not self.is_configured():
+            return {'success': False, 'error': 'Shopify API not configured'}
+        
+        results = {}
+        for topic in topics:
+            try:
+                response = self._request('POST', f"{self.base_url}/webhooks.json", json={
+                    'webhook': {'topic': topic, 'address': address, 'format': 'json'}
+                })
+                # 422 means the subscription already exists
+                results[topic] = 'registered' if response.status_code in (200, 201) else (
+                    'exists' if response.status_code == 422 else f"error {response.status_code}")
+            except Exception as e:
+                logger.error(f"Webhook registration error ({topic}): {str(e)}")
+                results[topic] = f"error {str(e)}"
+        
+        return {
+            'success': all(r in ('registered', 'exists') for r in results.values()),
+            'webhooks': results
+        }
+    
+    def _review_metafield_value(self, review_data):
+        """Review payload stored in the reviewking metafield"""
+        return {
+            'rating': review_data.get('rating', 5),
+            'title': review_data.get('title', ''),
+            'text': review_data.get('text', ''),
+            'reviewer_name': review_data.get('reviewer_name', 'Anonymous'),
+            'date': review_data.get('date', datetime.now().strftime('%Y-%m-%d')),
+            'country': review_data.get('country', ''),
+            'verified': review_data.get('verified', False),
+            'images': review_data.get('images', []),
+            'quality_score': review_data.get('quality_score', 0),
+            'ai_recommended': review_data.get('ai_recommended', False),
+            'platform': review_data.get('platform', 'unknown'),
+            'imported_at': datetime.now().isoformat()
+        }
+    
+    def add_review_to_product(self, product_id, review_data):
+        """
+        Add a review to a product using metafields
+        Shopify doesn't have native review API, so we use metafields
+        (appended to the product's aggregated review document)
+        """
+        result = self.add_reviews_to_product(product_id, [review_data])
+        if result['imported']:
+            return {'success': True, 'review_id': result['imported'][0]['review_id']}
+        return {'success': False, 'error': result['failed'][0]['error'] if result['failed'] else result.get('error')}
+    
+    def graphql(self, query, variables=None, cost=1):
+        """
+        Run an Admin GraphQL query/mutation and return the decoded response
+        Reserves the estimated cost from the shop's GraphQL bucket and retries THROTTLED errors
+        """
+        for attempt in range(self.MAX_THROTTLE_RETRIES + 1):
+            response = shopify_transport.request(
+                self.shop_domain, 'POST', f"{self.base_url}/graphql.json",
+                kind='graphql', cost=cost,
+                idempotent=not query.lstrip().startswith('mutation'),
+                json={'query': query, 'variables': variables or {}},
+                headers=self.headers,
+                timeout=30
+            )
+            response.raise_for_status()
+            
+            data = response.json()
+            shopify_rate_limiter.update_from_graphql(self.shop_domain, data)
+            throttled = any((e.get('extensions') or {}).get('code') == 'THROTTLED' for e in data.get('errors') or [])
+            if not throttled or attempt == self.MAX_THROTTLE_RETRIES:
+                return data
+            logger.warning(f"Shopify GraphQL throttled for {self.shop_domain}, retrying (attempt {attempt + 1})")
+    
+    def _product_lock(self, product_id):
+        """Serialise read-modify-write cycles on one product's review document"""
+        with self._product_locks_guard:
+            return self._product_locks.setdefault(str(product_id), threading.Lock())
+    
+    @staticmethod
+    def _empty_summary():
+        return {
+            'count': 0,
+            'rating_sum': 0,
+            'average': 0,
+            'histogram': {str(star): 0 for star in range(1, 6)},
+            'pages': 0,
+            'updated_at': None
+        }
+    
+    def _read_review_document(self, product_id, page):
+        """Summary (with compareDigest) and one review page in a single GraphQL read"""
+        data = self.graphql(self.REVIEW_DOCUMENT_QUERY, {
+            'id': f"gid://shopify/Product/{product_id}",
+            'pageKey': f"reviews_page_{page}"
+        })
+        if data.get('errors'):
+            raise Exception('; '.join(e.get('message', str(e)) for e in data['errors']))
+        
+        product = (data.get('data') or {}).get('product') or {}
+        summary_field = product.get('summary')
+        summary = json.loads(summary_field['value']) if summary_field else self._empty_summary()
+        digest = summary_field.get('compareDigest') if summary_field else None
+        page_field = product.get('page')
+        reviews = json.loads(page_field['value']).get('reviews', []) if page_field else []
+        return summary, digest, reviews
+    
+    def get_review_page(self, product_id, page=1):
+        """
+        Read one page of a product's aggregated reviews plus its summary
+        The widget renders from this single read
+        """
+        if not self.is_configured():
+            return {'success': False, 'error': 'Shopify API not configured'}
+        
+        try:
+            summary, _, reviews = self._read_review_document(product_id, page)
+            return {'success': True, 'summary': summary, 'reviews': reviews, 'page': page}
+        except Exception as e:
+            logger.error(f"Get review page error: {str(e)}")
+            return {'success': False, 'error': str(e)}
+    
+    def start_review_export(self):
+        """Launch a Shopify bulk operation over all reviewking metafields"""
+        if not self.is_configured():
+            return {'success': False, 'error': 'Shopify API not configured'}
+        
+        try:
+            data = self.graphql(self.BULK_OPERATION_RUN_MUTATION, {'query': self.REVIEW_EXPORT_BULK_QUERY}, cost=10)
+            result = (data.get('data') or {}).get('bulkOperationRunQuery') or {}
+            errors = result.get('userErrors') or data.get('errors')
+            if errors:
+                return {'success': False, 'error': errors[0].get('message', 'Bulk operation rejected')}
+            return {'success': True, 'operation': result['bulkOperation']}
+        except Exception as e:
+            logger.error(f"Review export start error: {str(e)}")
+            return {'success': False, 'error': str(e)}
+    
+    def get_bulk_operation(self, operation_id):
+        """Status of a bulk operation (status, objectCount and the result url once COMPLETED)"""
+        if not self.is_configured():
+            return {'success': False, 'error': 'Shopify API not configured'}
+        
+        try:
+            data = self.graphql(self.BULK_OPERATION_STATUS_QUERY, {'id': operation_id})
+            operation = (data.get('data') or {}).get('node')
+            if not operation:
+                return {'success': False, 'error': 'Bulk operation not found'}
+            return {'success': True, 'operation': operation}
+        except Exception as e:
+            logger.error(f"Bulk operation status error: {str(e)}")
+            return {'success': False, 'error': str(e)}
+    
+    def get_app_subscriptions(self):
+        """The shop's active app subscriptions (Shopify Billing) and whether it is a partner development store"""
+        if not self.is_configured():
+            return {'success': False, 'error': 'Shopify API not configured'}
+        
+        try:
+            data = self.graphql(self.APP_SUBSCRIPTIONS_QUERY)
+            if data.get('errors'):
+                return {'success': False, 'error': str(data['errors'])}
+            installation = (data.get('data') or {}).get('currentAppInstallation') or {}
+            plan = ((data.get('data') or {}).get('shop') or {}).get('plan') or {}
+            return {'success': True, 'subscriptions': installation.get('activeSubscriptions') or [],
+                    'development': bool(plan.get('partnerDevelopment'))}
+        except Exception as e:
+            logger.error(f"App subscriptions error: {str(e)}")
+            return {'success': False, 'error': str(e)}
+    
+    @staticmethod
+    def iter_bulk_lines(url):
+        """
+        Stream a bulk operation result line by line (never holds the whole file)
+        Only https download urls are fetched; offline runs read files in export_reviews.py
+        """
+        if urlparse(url or '').scheme != 'https':
+            raise ValueError("Bulk operation results are only downloaded over https")
+        
+        # Signed storage url: no shop credentials, not counted against the API limit
+        with requests.get(url, stream=True, timeout=(10, 60)) as response:
+            response.raise_for_status()
+            for line in response.iter_lines(chunk_size=65536):
+                if line:
+                    yield json.loads(line)
+    
+    @staticmethod
+    def iter_exported_reviews(lines):
+        """
+        Turn bulk JSONL rows into review records, one at a time
+        Metafield rows carry __parentId (the product gid); reviews_page_<n> values hold
+        {'page': n, 'reviews': [...]} (bare lists from early exports are still read) and
+        legacy review_<id> values hold one review
+        """
+        for row in lines:
+            key = row.get('key')
+            parent = row.get('__parentId')
+            if not key or not parent or key == 'summary':
+                continue
+            try:
+                value = json.loads(row.get('value') or 'null')
+            except ValueError:
+                logger.warning(f"Skipping unreadable metafield {key} on {parent}")
+                continue
+            
+            if key.startswith('reviews_page_'):
+                reviews = value if isinstance(value, list) else (value or {}).get('reviews', [])
+            elif key.startswith('review_'):
+                reviews = [dict(value, id=value.get('id') or key[len('review_'):])] if value else []
+            else:
+                continue
+            
+            product_id = parent.rsplit('/', 1)[-1]
+            for review in reviews:
+                yield dict(review, shopify_product_id=product_id)
+    
+    def add_reviews_to_product(self, product_id, reviews):
+        """
+        Batch version of add_review_to_product
+        Appends reviews to the product's aggregated review document: only the touched
+        reviews_page_<n> chunks and the summary are rewritten, in one metafieldsSet call
+        per REVIEW_BATCH_SIZE reviews. Per-item userErrors are mapped back to review IDs.
+        
+        Returns {'success': bool, 'imported': [{'id', 'review_id'}], 'failed': [{'id', 'error'}]}
+        """
+        if not self.is_configured():
+            return {'success': False, 'error': 'Shopify API not configured', 'imported': [],
+                    'failed': [{'id': r.get('id'), 'error': 'Shopify API not configured'} for r in reviews]}
+        
+        imported = []
+        failed = []
+        
+        with self._product_lock(product_id):
+            remaining = list(reviews)
+            stale_retries = 0
+            while remaining:
+                chunk = remaining[:self.REVIEW_BATCH_SIZE]
+                try:
+                    chunk_imported, chunk_failed, stale, consumed = self._append_reviews(product_id, chunk)
+                except Exception as e:
+                    logger.error(f"Batch add reviews error: {str(e)}")
+                    chunk_imported, chunk_failed, stale, consumed = [], [{'id': r.get('id'), 'error': str(e)} for r in chunk], False, len(chunk)
+                
+                if stale:
+                    # Someone else wrote the document since we read it - re-read and retry
+                    self._page_hints.pop(str(product_id), None)
+                    if stale_retries < self.MAX_STALE_RETRIES:
+                        stale_retries += 1
+                        logger.warning(f"Review document for product {product_id} changed concurrently, retrying")
+                        continue
+                    chunk_failed = [{'id': r.get('id'), 'error': 'Review document changed concurrently'} for r in chunk]
+                    consumed = len(chunk)
+                
+                stale_retries = 0
+                imported.extend(chunk_imported)
+                failed.extend(chunk_failed)
+                remaining = remaining[consumed:]
+        
+        return {'success': not failed, 'imported': imported, 'failed': failed}
+    
+    def _append_reviews(self, product_id, reviews):
+        """
+        One read-modify-write cycle; returns (imported, failed, stale, consumed)
+        Stops early if the touched pages + summary would exceed one metafieldsSet call
+        """
+        product_key = str(product_id)
+        hint = self._page_hints.get(product_key, 1)
+        summary, digest, last_page = self._read_review_document(product_id, hint)
+        if summary['pages'] and summary['pages'] != hint:
+            _, _, last_page = self._read_review_document(product_id, summary['pages'])
+        
+        page_no = summary['pages'] or 1
+        page_reviews = list(last_page)
+        page_bytes = len(json.dumps(page_reviews))
+        touched = OrderedDict()
+        placement = []
+        review_ids = []
+        
+        for review in reviews:
+            review_id = review.get('id') or str(uuid.uuid4())
+            entry = dict(self._review_metafield_value(review), id=review_id)
+            entry_bytes = len(json.dumps(entry)) + 2
+            if page_reviews and (len(page_reviews) >= self.REVIEW_PAGE_SIZE
+                                 or page_bytes + entry_bytes > self.REVIEW_PAGE_MAX_BYTES):
+                if len(touched) >= self.METAFIELDS_SET_LIMIT - 1:
+                    break  # Leave room for the summary; the rest goes in the next cycle
+                page_no += 1
+                page_reviews, page_bytes = [], 2
+            page_reviews.append(entry)
+            page_bytes += entry_bytes
+            touched[page_no] = page_reviews
+            placement.append(page_no)
+            review_ids.append(review_id)
+            
+            star = rating_bucket(entry['rating'])
+            summary['count'] += 1
+            summary['rating_sum'] += star
+            summary['histogram'][str(star)] = summary['histogram'].get(str(star), 0) + 1
+        
+        reviews = reviews[:len(placement)]
+        summary['pages'] = page_no
+        summary['average'] = round(summary['rating_sum'] / summary['count'], 2) if summary['count'] else 0
+        summary['updated_at'] = datetime.now().isoformat()
+        
+        owner_id = f"gid://shopify/Product/{product_id}"
+        metafields = [{
+            'ownerId': owner_id,
+            'namespace': 'reviewking',
+            'key': f'reviews_page_{n}',
+            'type': 'json',
+            'value': json.dumps({'page': n, 'reviews': page})
+        } for n, page in touched.items()]
+        summary_field = {
+            'ownerId': owner_id,
+            'namespace': 'reviewking',
+            'key': 'summary',
+            'type': 'json',
+            'value': json.dumps(summary)
+        }
+        # compareDigest makes the summary write fail if another writer got there first
+        summary_field['compareDigest'] = digest
+        metafields.append(summary_field)
+        
+        data = self.graphql(self.METAFIELDS_SET_MUTATION, {'metafields': metafields},
+                            cost=self.METAFIELDS_SET_COST)
+        if data.get('errors'):
+            raise Exception('; '.join(e.get('message', str(e)) for e in data['errors']))
+        
+        user_errors = data['data']['metafieldsSet']['userErrors']
+        if any(e.get('code') == 'STALE_OBJECT' for e in user_errors):
+            return [], [], True, 0
+        
+        if user_errors:
+            # metafieldsSet is atomic: map errors to the pages they hit, the rest of the batch was rejected
+            page_numbers = list(touched.keys())
+            page_errors = {}
+            for error in user_errors:
+                field = error.get('field') or []
+                idx = int(field[1]) if len(field) >= 2 and str(field[1]).isdigit() else None
+                if idx is not None and idx < len(page_numbers):
+                    page_errors.setdefault(page_numbers[idx], error['message'])
+                else:
+                    page_errors.setdefault(None, error['message'])
+            fallback = page_errors.get(None) or 'Batch rejected: ' + '; '.join(page_errors.values())
+            failed = [{'id': review.get('id'), 'error': page_errors.get(n, fallback)}
+                      for review, n in zip(reviews, placement)]
+            return [], failed, False, len(reviews)
+        
+        self._page_hints[product_key] = page_no
+        imported = [{'id': review.get('id'), 'review_id': review_id} for review, review_id in zip(reviews, review_ids)]
+        return imported, [], False, len(reviews)
+
+# Initialize Shopify helper
+shopify_helper = ShopifyAPIHelper()
+
+# ==================== IMPORTED REVIEW LEDGER ====================
+
+def connect_db(db_path):
+    """Open a SQLite connection shared across request/worker threads (callers hold a lock)"""
+    conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+class BloomFilter:
+    """
+    Compact probabilistic membership set
+    No false negatives, so a miss proves a key was never added
+    """
+    
+    def __init__(self, capacity=1000000, error_rate=0.001):
+        self.size = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.hash_count = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+    
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+    
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+    
+    def __contains__(self, key):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+class ImportedReviewLedger:
+    """
+    Persistent record of which source reviews were already pushed to which Shopify product
+    Keyed by (shop, shopify_product_id, review_id); a Bloom filter answers most lookups
+    in memory and SQLite confirms the (rare) positives
+    """
+    
+    def __init__(self, db_path, capacity=1000000):
+        self._lock = threading.Lock()
+        self._conn = connect_db(db_path)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS imported_reviews (
+                shop TEXT NOT NULL,
+                shopify_product_id TEXT NOT NULL,
+                review_id TEXT NOT NULL,
+                imported_at TEXT NOT NULL,
+                PRIMARY KEY (shop, shopify_product_id, review_id)
+            ) WITHOUT ROWID
+        """)
+        self._conn.commit()
+        
+        self._filter = BloomFilter(capacity=capacity)
+        for shop, product_id, review_id in self._conn.execute(
+                "SELECT shop, shopify_product_id, review_id FROM imported_reviews"):
+            self._filter.add(self._key(shop, product_id, review_id))
+    
+    @staticmethod
+    def _key(shop, product_id, review_id):
+        return f"{shop}|{product_id}|{review_id}"
+    
+    def contains(self, shop, product_id, review_id):
+        """Check whether a review was already imported to a product"""
+        return bool(self.already_imported(shop, product_id, [review_id]))
+    
+    def already_imported(self, shop, product_id, review_ids):
+        """Return the subset of review_ids already imported to a product"""
+        product_id = str(product_id)
+        candidates = [str(rid) for rid in review_ids
+                      if rid is not None and self._key(shop, product_id, rid) in self._filter]
+        if not candidates:
+            return set()
+        
+        found = set()
+        with self._lock:
+            for i in range(0, len(candidates), 500):
+                chunk = candidates[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT review_id FROM imported_reviews WHERE shop = ? AND shopify_product_id = ? "
+                    f"AND review_id IN ({placeholders})",
+                    [shop, product_id] + chunk
+                )
+                found.update(row[0] for row in rows)
+        return found
+    
+    def record(self, shop, product_id, review_ids):
+        """Remember that reviews were imported to a product"""
+        product_id = str(product_id)
+        now = datetime.now().isoformat()
+        rows = [(shop, product_id, str(rid), now) for rid in review_ids if rid is not None]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO imported_reviews (shop, shopify_product_id, review_id, imported_at) "
+                "VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+            for shop_, product_id_, review_id, _ in rows:
+                self._filter.add(self._key(shop_, product_id_, review_id))
+
+# Initialize import ledger
+import_ledger = ImportedReviewLedger(Config.DATABASE_PATH, capacity=Config.IMPORT_LEDGER_CAPACITY)
+
+# ==================== SHOP CLIENT REGISTRY ====================
+
+class ShopCredentialStore:
+    """
+    Per-shop Admin API credentials, saved at install time
+    """
+    
+    def __init__(self, db_path):
+        self._lock = threading.Lock()
+        self._conn = connect_db(db_path)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS shop_credentials (
+                shop TEXT PRIMARY KEY,
+                access_token TEXT NOT NULL,
+                api_version TEXT,
+                installed_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        """)
+        self._conn.commit()
+    
+    def get(self, shop):
+        """Credentials dict for a shop, or None if it never installed"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT access_token, api_version FROM shop_credentials WHERE shop = ?", (shop,)
+            ).fetchone()
+        if row:
+            return {'shop': shop, 'access_token': row[0], 'api_version': row[1]}
+        # The shop configured through env/config.json needs no stored row
+        if shop == Config.SHOPIFY_SHOP_DOMAIN and Config.SHOPIFY_ACCESS_TOKEN:
+            return {'shop': shop, 'access_token': Config.SHOPIFY_ACCESS_TOKEN, 'api_version': Config.SHOPIFY_API_VERSION}
+        return None
+    
+    def save(self, shop, access_token, api_version=None):
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._conn.execute("""
+                INSERT INTO shop_credentials (shop, access_token, api_version, installed_at, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(shop) DO UPDATE SET
+                    access_token = excluded.access_token,
+                    api_version = excluded.api_version,
+                    updated_at = excluded.updated_at
+            """, (shop, access_token, api_version or Config.SHOPIFY_API_VERSION, now, now))
+            self._conn.commit()
+    
+    def delete(self, shop):
+        with self._lock:
+            self._conn.execute("DELETE FROM shop_credentials WHERE shop = ?", (shop,))
+            self._conn.commit()
+
+class ShopifyClientRegistry:
+    """
+    Shop-keyed ShopifyAPIHelper instances, built lazily from stored credentials
+    Only the hottest max_clients shops stay resident (LRU); evicting a shop drops its
+    catalog index, caches, pooled connections and rate-limit state, and it is rebuilt on next use
+    """
+    
+    def __init__(self, credential_store, max_clients=200):
+        self.credentials = credential_store
+        self.max_clients = max_clients
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+    
+    def get(self, shop):
+        """Client for a shop, or None if the shop has no credentials"""
+        if not shop:
+            return None
+        with self._lock:
+            client = self._clients.get(shop)
+            if client is not None:
+                self._clients.move_to_end(shop)
+                self.stats['hits'] += 1
+                return client
+        
+        creds = self.credentials.get(shop)
+        if not creds:
+            return None
+        client = ShopifyAPIHelper(shop, creds['access_token'], creds['api_version'])
+        
+        evicted = []
+        with self._lock:
+            existing = self._clients.get(shop)
+            if existing is not None:  # Another thread built it first
+                self._clients.move_to_end(shop)
+                return existing
+            self._clients[shop] = client
+            self.stats['misses'] += 1
+            while len(self._clients) > self.max_clients:
+                evicted.append(self._clients.popitem(last=False)[0])
+                self.stats['evictions'] += 1
+        for old_shop in evicted:
+            shopify_transport.close(old_shop)
+            shopify_rate_limiter.forget(old_shop)
+        return client
+    
+    def register(self, shop, access_token, api_version=None):
+        """Store new credentials (install / token rotation) and drop any stale client"""
+        self.credentials.save(shop, access_token, api_version)
+        self.evict(shop)
+    
+    def evict(self, shop):
+        with self._lock:
+            self._clients.pop(shop, None)
+        shopify_transport.close(shop)
+        shopify_rate_limiter.forget(shop)
+    
+    def status(self):
+        with self._lock:
+            return dict(self.stats, resident=len(self._clients), max_clients=self.max_clients)
+
+# Initialize client registry (the configured default shop keeps using shopify_helper)
+shop_credentials = ShopCredentialStore(Config.DATABASE_PATH)
+shopify_clients = ShopifyClientRegistry(shop_credentials, max_clients=Config.SHOPIFY_MAX_CLIENTS)
+
+class UnknownShopError(LookupError):
+    """A request named a shop that has no credentials here (never installed or uninstalled)"""
+    
+    def __init__(self, shop):
+        super().__init__(f"Unknown shop: {shop}")
+        self.shop = shop
+
+def shopify_client_for(shop=None):
+    """
+    Client for a shop domain; only a request that names no shop gets the default one
+    A shop without credentials raises UnknownShopError instead of borrowing another
+    tenant's data, except in local demo setups where no Shopify shop is configured at all
+    """
+    if not shop or shop == shopify_helper.shop_domain:
+        return shopify_helper
+    client = shopify_clients.get(shop)
+    if client is not None:
+        return client
+    if not shopify_helper.is_configured():
+        return shopify_helper
+    raise UnknownShopError(shop)
+
+def request_shop():
+    """Shop domain the current request is for (?shop=, JSON body or Shopify header)"""
+    body = request.get_json(silent=True) if request.is_json else None
+    return (request.args.get('shop')
+            or (body.get('shop') if isinstance(body, dict) else None)
+            or request.headers.get('X-Shopify-Shop-Domain'))
+
+# ==================== WIDGET READ MODEL ====================
+
+def widget_review(review):
+    """Imported review (metafield format) -> the shape the storefront widget renders"""
+    return {
+        'id': review.get('id'),
+        'rating': rating_bucket(review.get('rating', 5)),
+        'text': review.get('text', ''),
+        'author': review.get('reviewer_name', 'Customer'),
+        'date': review.get('date'),
+        'verified': review.get('verified', False),
+        'images': review.get('images', []),
+        'ai_score': review.get('quality_score', 0)
+    }
+
+class WidgetReadModel:
+    """
+    Storefront read model for imported reviews
+    Every (shop, product) keeps its reviews pre-ranked by quality and pre-serialised
+    into fixed-size pages, rebuilt on import; a widget hit is one primary-key lookup.
+    Cursor pages are keyset reads: the cursor holds the sort key of the last review
+    served, so imports and removals never shift or repeat what a reader sees next, and
+    each sort order has an index to seek on. Rating aggregates (count, sum, histogram,
+    photos) are kept in review_summaries and updated by deltas on every write
+    """
+    
+    DATE_KEY = "COALESCE(review_date, '')"  # Undated reviews sort last under DESC
+    # sort name -> (column, direction) key; the last column makes every key unique
+    SORT_KEYS = OrderedDict([
+        ('quality', (('quality_score', 'DESC'), ('has_photos', 'DESC'), (DATE_KEY, 'DESC'), ('review_id', 'ASC'))),
+        ('newest', ((DATE_KEY, 'DESC'), ('quality_score', 'DESC'), ('review_id', 'ASC'))),
+        ('photos', (('has_photos', 'DESC'), ('quality_score', 'DESC'), (DATE_KEY, 'DESC'), ('review_id', 'ASC'))),
+    ])
+    SORT_ORDERS = OrderedDict((sort, ', '.join(f"{column} {direction}" for column, direction in key))
+                              for sort, key in SORT_KEYS.items())
+    
+    def __init__(self, db_path, page_size=20):
+        self.page_size = page_size
+        self._lock = threading.Lock()
+        self._conn = connect_db(db_path)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS widget_reviews (
+                shop TEXT NOT NULL,
+                product_id TEXT NOT NULL,
+                review_id TEXT NOT NULL,
+                rating INTEGER NOT NULL,
+                quality_score REAL NOT NULL,
+                has_photos INTEGER NOT NULL,
+                review_date TEXT,
+                review_json TEXT NOT NULL,
+                PRIMARY KEY (shop, product_id, review_id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS widget_pages (
+                shop TEXT NOT NULL,
+                product_id TEXT NOT NULL,
+                page INTEGER NOT NULL,
+                reviews_json TEXT NOT NULL,
+                PRIMARY KEY (shop, product_id, page)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS widget_products (
+                shop TEXT NOT NULL,
+                product_id TEXT NOT NULL,
+                total INTEGER NOT NULL,
+                pages INTEGER NOT NULL,
+                summary_json TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                revision INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (shop, product_id)
+            ) WITHOUT ROWID;
+        """)
+        has_summaries = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'review_summaries'").fetchone()
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS review_summaries (
+                shop TEXT NOT NULL,
+                product_id TEXT NOT NULL,
+                review_count INTEGER NOT NULL DEFAULT 0,
+                rating_sum INTEGER NOT NULL DEFAULT 0,
+                stars_1 INTEGER NOT NULL DEFAULT 0,
+                stars_2 INTEGER NOT NULL DEFAULT 0,
+                stars_3 INTEGER NOT NULL DEFAULT 0,
+                stars_4 INTEGER NOT NULL DEFAULT 0,
+                stars_5 INTEGER NOT NULL DEFAULT 0,
+                photo_count INTEGER NOT NULL DEFAULT 0,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (shop, product_id)
+            ) WITHOUT ROWID
+        """)
+        if not has_summaries:
+            # Seed aggregates for reviews stored before review_summaries existed
+            self._recount_locked()
+        
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(widget_products)")}
+        if 'revision' not in columns:
+            self._conn.execute("ALTER TABLE widget_products ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+        
+        for sort in self.SORT_ORDERS:
+            # Absolute rank columns of older databases are left in place but no longer read
+            self._conn.execute(f"DROP INDEX IF EXISTS idx_widget_reviews_rank_{sort}")
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_widget_reviews_sort_{sort} "
+                               f"ON widget_reviews (shop, product_id, {self.SORT_ORDERS[sort]})")
+        self._conn.commit()
+    
+    def _stored_ratings_locked(self, shop, product_id, review_ids):
+        """{review_id: (rating, has_photos)} of the given reviews already stored"""
+        stored = {}
+        for start in range(0, len(review_ids), 500):
+            chunk = review_ids[start:start + 500]
+            for review_id, rating, has_photos in self._conn.execute(
+                    f"SELECT review_id, rating, has_photos FROM widget_reviews "
+                    f"WHERE shop = ? AND product_id = ? AND review_id IN ({','.join('?' * len(chunk))})",
+                    [shop, product_id] + chunk):
+                stored[review_id] = (rating, has_photos)
+        return stored
+    
+    def _apply_summary_delta_locked(self, shop, product_id, added, removed):
+        """Fold (rating, has_photos) pairs entering / leaving a product into its aggregates"""
+        stars = [0] * 5
+        for rating, _ in added:
+            stars[rating - 1] += 1
+        for rating, _ in removed:
+            stars[rating - 1] -= 1
+        count = len(added) - len(removed)
+        rating_sum = sum(r for r, _ in added) - sum(r for r, _ in removed)
+        photos = sum(p for _, p in added) - sum(p for _, p in removed)
+        self._conn.execute("""
+            INSERT INTO review_summaries (shop, product_id, review_count, rating_sum,
+                stars_1, stars_2, stars_3, stars_4, stars_5, photo_count, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(shop, product_id) DO UPDATE SET
+                review_count = review_count + excluded.review_count,
+                rating_sum = rating_sum + excluded.rating_sum,
+                stars_1 = stars_1 + excluded.stars_1,
+                stars_2 = stars_2 + excluded.stars_2,
+                stars_3 = stars_3 + excluded.stars_3,
+                stars_4 = stars_4 + excluded.stars_4,
+                stars_5 = stars_5 + excluded.stars_5,
+                photo_count = photo_count + excluded.photo_count,
+                updated_at = excluded.updated_at
+        """, (shop, product_id, count, rating_sum, *stars, photos, datetime.now().isoformat()))
+    
+    def _recount_locked(self, shop=None, product_id=None):
+        """
+        Recompute aggregates from the stored reviews (repair / first run)
+        Returns the (shop, product_id) pairs whose stored aggregates were wrong
+        """
+        where, params = [], []
+        if shop is not None:
+            where.append("shop = ?")
+            params.append(shop)
+        if product_id is not None:
+            where.append("product_id = ?")
+            params.append(str(product_id))
+        clause = f"WHERE {' AND '.join(where)}" if where else ''
+        
+        actual = {}
+        for row in self._conn.execute(f"""
+                SELECT shop, product_id, COUNT(*), SUM(rating),
+                    SUM(rating = 1), SUM(rating = 2), SUM(rating = 3), SUM(rating = 4), SUM(rating = 5),
+                    SUM(has_photos)
+                FROM widget_reviews {clause} GROUP BY shop, product_id""", params):
+            actual[row[:2]] = tuple(row[2:])
+        stored = {}
+        for row in self._conn.execute(f"""
+                SELECT shop, product_id, review_count, rating_sum,
+                    stars_1, stars_2, stars_3, stars_4, stars_5, photo_count
+                FROM review_summaries {clause}""", params):
+            stored[row[:2]] = tuple(row[2:])
+        
+        now = datetime.now().isoformat()
+        drifted = []
+        for key in set(actual) | set(stored):
+            counts = actual.get(key, (0,) * 8)
+            if stored.get(key) == counts:
+                continue
+            drifted.append(key)
+            self._conn.execute("""
+                INSERT OR REPLACE INTO review_summaries (shop, product_id, review_count, rating_sum,
+                    stars_1, stars_2, stars_3, stars_4, stars_5, photo_count, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (*key, *counts, now))
+        return drifted
+    
+    def _summary_locked(self, shop, product_id):
+        """Aggregates of one product (primary-key lookup); None if it never had reviews"""
+        row = self._conn.execute("""
+            SELECT review_count, rating_sum, stars_1, stars_2, stars_3, stars_4, stars_5, photo_count, updated_at
+            FROM review_summaries WHERE shop = ? AND product_id = ?
+        """, (shop, product_id)).fetchone()
+        if not row:
+            return None
+        count, rating_sum = row[0], row[1]
+        return {
+            'count': count,
+            'rating_sum': rating_sum,
+            'average': round(rating_sum / count, 2) if count else 0,
+            'histogram': {str(star): row[1 + star] for star in range(1, 6)},
+            'photo_count': row[7],
+            'updated_at': row[8]
+        }
+    
+    def add_reviews(self, shop, product_id, reviews, rerank=True):
+        """
+        Store imported reviews, update the product's aggregates and re-rank its pages
+        Bulk writers pass rerank=False for every batch and call rerank() once at the end,
+        so an N-review import ranks the product once instead of once per batch
+        """
+        if not reviews:
+            return
+        product_id = str(product_id)
+        rows = {}
+        for review in reviews:
+            entry = widget_review(review)
+            entry['id'] = str(entry['id'] or uuid.uuid4())
+            rows[entry['id']] = (shop, product_id, entry['id'], entry['rating'], float(entry['ai_score'] or 0),
+                                 1 if entry['images'] else 0, entry['date'], json.dumps(entry))
+        rows = list(rows.values())
+        with self._lock:
+            # Re-imports replace a stored review, so only the difference enters the aggregates
+            replaced = self._stored_ratings_locked(shop, product_id, [row[2] for row in rows])
+            self._apply_summary_delta_locked(shop, product_id, [(row[3], row[5]) for row in rows],
+                                             list(replaced.values()))
+            self._conn.executemany("""
+                INSERT OR REPLACE INTO widget_reviews
+                    (shop, product_id, review_id, rating, quality_score, has_photos, review_date, review_json)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            if rerank:
+                self._rebuild_locked(shop, product_id)
+            self._conn.commit()
+    
+    def rerank(self, shop, product_id):
+        """Rebuild one product's ranks and pages (after add_reviews(..., rerank=False))"""
+        with self._lock:
+            self._rebuild_locked(shop, str(product_id))
+            self._conn.commit()
+    
+    def remove_reviews(self, shop, product_id, review_ids):
+        """Take reviews off the storefront (moderation); returns how many were removed"""
+        product_id = str(product_id)
+        review_ids = list(dict.fromkeys(str(rid) for rid in review_ids))
+        with self._lock:
+            stored = self._stored_ratings_locked(shop, product_id, review_ids)
+            if stored:
+                self._conn.executemany(
+                    "DELETE FROM widget_reviews WHERE shop = ? AND product_id = ? AND review_id = ?",
+                    [(shop, product_id, rid) for rid in stored]
+                )
+                self._apply_summary_delta_locked(shop, product_id, [], list(stored.values()))
+                self._rebuild_locked(shop, product_id)
+            self._conn.commit()
+        return len(stored)
+    
+    def _rebuild_locked(self, shop, product_id):
+        """Recompute the ranked pages and summary of one product (review JSON is spliced, never re-parsed)"""
+        ranked = [row[0] for row in self._conn.execute(
+            f"SELECT review_json FROM widget_reviews WHERE shop = ? AND product_id = ? "
+            f"ORDER BY {self.SORT_ORDERS['quality']}",
+            (shop, product_id)
+        )]
+        pages = [(shop, product_id, n + 1, '[' + ','.join(ranked[i:i + self.page_size]) + ']')
+                 for n, i in enumerate(range(0, len(ranked), self.page_size))]
+        
+        summary = self._summary_locked(shop, product_id) or {
+            'count': 0, 'rating_sum': 0, 'average': 0,
+            'histogram': {str(star): 0 for star in range(1, 6)}, 'photo_count': 0
+        }
+        summary['pages'] = len(pages)
+        summary['updated_at'] = datetime.now().isoformat()
+        
+        self._conn.execute("DELETE FROM widget_pages WHERE shop = ? AND product_id = ?", (shop, product_id))
+        self._conn.executemany(
+            "INSERT INTO widget_pages (shop, product_id, page, reviews_json) VALUES (?, ?, ?, ?)", pages)
+        # Every rebuild bumps the revision that widget ETags are derived from
+        self._conn.execute("""
+            INSERT INTO widget_products (shop, product_id, total, pages, summary_json, updated_at, revision)
+            VALUES (?, ?, ?, ?, ?, ?, 1)
+            ON CONFLICT(shop, product_id) DO UPDATE SET
+                total = excluded.total,
+                pages = excluded.pages,
+                summary_json = excluded.summary_json,
+                updated_at = excluded.updated_at,
+                revision = revision + 1
+        """, (shop, product_id, len(ranked), len(pages), json.dumps(summary), summary['updated_at']))
+    
+    def get_summary(self, shop, product_id):
+        """Rating aggregates of one product: count, average, histogram, photo_count, updated_at"""
+        with self._lock:
+            return self._summary_locked(shop, str(product_id))
+    
+    def rebuild_summaries(self, shop=None, product_id=None):
+        """
+        Repair: recount aggregates from the stored reviews (optionally one shop / product)
+        Returns the (shop, product_id) pairs that had drifted; their pages are refreshed
+        """
+        with self._lock:
+            drifted = self._recount_locked(shop, product_id)
+            for key in drifted:
+                self._rebuild_locked(*key)
+            self._conn.commit()
+        return drifted
+    
+    def get_revision(self, shop, product_id):
+        """(revision, updated_at) of a product's reviews; (0, None) before its first import"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT revision, updated_at FROM widget_products WHERE shop = ? AND product_id = ?",
+                (shop, str(product_id))
+            ).fetchone()
+        return (row[0], row[1]) if row else (0, None)
+    
+    def get_reviews(self, shop, product_id, sort='quality', after=None, limit=20):
+        """
+        Cursor read: the next `limit` reviews in a sort order after the sort key `after`
+        (None = from the start). Returns [(key, review_json)]; one seek + range scan on
+        the sort's index, whatever was imported or removed since `after` was handed out
+        """
+        if sort not in self.SORT_KEYS:
+            raise ValueError(f"Unknown sort: {sort}")
+        key = self.SORT_KEYS[sort]
+        columns = ', '.join(column for column, _ in key)
+        where, params = '', [shop, str(product_id)]
+        if after is not None:
+            if len(after) != len(key):
+                raise ValueError('Cursor key does not match the sort order')
+            # (k1, k2, ...) after (v1, v2, ...): k1 past v1, or k1 = v1 and k2 past v2, ...
+            terms = []
+            for i, (column, direction) in enumerate(key):
+                equal = [f"{c} = ?" for c, _ in key[:i]]
+                terms.append('(' + ' AND '.join(equal + [f"{column} {'<' if direction == 'DESC' else '>'} ?"]) + ')')
+                params.extend(after[:i + 1])
+            first_column, first_direction = key[0]
+            where = f" AND {first_column} {'<=' if first_direction == 'DESC' else '>='} ? AND ({' OR '.join(terms)})"
+            params.insert(2, after[0])  # The redundant bound on the first column lets the index seek
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {columns}, review_json FROM widget_reviews WHERE shop = ? AND product_id = ?{where} "
+                f"ORDER BY {self.SORT_ORDERS[sort]} LIMIT ?",
+                params + [limit]
+            ).fetchall()
+        return [(list(row[:-1]), row[-1]) for row in rows]
     
-    def _error_response(self, message):
-        """Error response"""
+    def get_summaries(self, shop, product_ids):
+        """{product_id: (summary, revision)} for many products in one indexed query"""
+        product_ids = [str(pid) for pid in product_ids]
+        result = {}
+        with self._lock:
+            for start in range(0, len(product_ids), 500):
+                chunk = product_ids[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT product_id, summary_json, revision FROM widget_products "
+                    f"WHERE shop = ? AND product_id IN ({','.join('?' * len(chunk))})",
+                    [shop] + chunk
+                ).fetchall()
+                for product_id, summary_json, revision in rows:
+                    result[product_id] = (json.loads(summary_json), revision)
+        return result
+    
+    def get_page(self, shop, product_id, page=1):
+        """
+        One precomputed page: {'reviews', 'summary', 'page', 'pages'}
+        Returns None when the product has no reviews in the read model
+        """
+        with self._lock:
+            row = self._conn.execute("""
+                SELECT p.reviews_json, m.summary_json, m.pages
+                FROM widget_products m
+                LEFT JOIN widget_pages p ON p.shop = m.shop AND p.product_id = m.product_id AND p.page = ?
+                WHERE m.shop = ? AND m.product_id = ?
+            """, (page, shop, str(product_id))).fetchone()
+        if not row or not row[2]:
+            return None
         return {
-            'success': False,
-            'error': message,
-            'reviews': [],
-            'pagination': None
+            'reviews': json.loads(row[0]) if row[0] else [],
+            'summary': json.loads(row[1]),
+            'page': page,
+            'pages': row[2]
         }
 
-# Initialize extractor
-extractor = EnhancedReviewExtractor()
+# Initialize widget read model
+widget_read_model = WidgetReadModel(Config.DATABASE_PATH, page_size=Config.WIDGET_PAGE_SIZE)
 
-# ==================== SHOPIFY API HELPER ====================
+def shop_key(shop=None):
+    """Storage key for a shop (same resolution as shopify_client_for)"""
+    return shopify_client_for(shop).shop_domain or 'default'
 
-class ShopifyAPIHelper:
-    """Helper class for Shopify API interactions"""
+class ReadModelBackfill:
+    """
+    Fills the widget read model from the review documents stored in Shopify
+    (reviews imported before the read model existed, or a lost local database).
+    Runs on one background worker so storefront requests never wait on the Admin API;
+    each product is attempted at most once per retry_after seconds
+    """
     
-    def __init__(self):
-        self.shop_domain = Config.SHOPIFY_SHOP_DOMAIN
-        self.access_token = Config.SHOPIFY_ACCESS_TOKEN
-        self.api_version = Config.SHOPIFY_API_VERSION
-        
-        # Debug logging
-        logger.info(f"ShopifyAPIHelper init - Domain: {self.shop_domain}, Token: {self.access_token[:20] if self.access_token else 'None'}...")
-        
-        if self.shop_domain and self.access_token:
-            self.base_url = f"https://{self.shop_domain}/admin/api/{self.api_version}"
-            self.headers = {
-                'X-Shopify-Access-Token': self.access_token,
-                'Content-Type': 'application/json'
-            }
-            logger.info(f"✅ Shopify API configured: {self.base_url}")
-        else:
-            self.base_url = None
-            self.headers = None
-            logger.warning(f"❌ Shopify API NOT configured - Domain: {bool(self.shop_domain)}, Token: {bool(self.access_token)}")
+    def __init__(self, read_model, retry_after=600, max_tracked=10000):
+        self.read_model = read_model
+        self.retry_after = retry_after
+        self.max_tracked = max_tracked
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='widget-backfill')
+        self._pending = set()
+        self._attempted = OrderedDict()  # (shop, product_id) -> time of the last attempt
+        self._lock = threading.Lock()
+        self.stats = {'scheduled': 0, 'filled': 0, 'empty': 0, 'errors': 0}
     
-    def is_configured(self):
-        """Check if Shopify API is configured"""
-        return bool(self.base_url and self.headers)
+    def schedule(self, shop, product_id):
+        """Queue a backfill for a product missing from the read model; False if recently tried"""
+        key = (shop, str(product_id))
+        now = time.time()
+        with self._lock:
+            if key in self._pending or now - self._attempted.get(key, 0) < self.retry_after:
+                return False
+            self._pending.add(key)
+            self._attempted[key] = now
+            self._attempted.move_to_end(key)
+            while len(self._attempted) > self.max_tracked:
+                self._attempted.popitem(last=False)
+            self.stats['scheduled'] += 1
+        self._executor.submit(self._run, key)
+        return True
     
-    def search_products(self, query):
-        """
-        Search for products by name or URL
-        Returns list of matching products
-        """
-        if not self.is_configured():
-            return {'success': False, 'error': 'Shopify API not configured'}
-        
+    def _run(self, key):
         try:
-            # If query is a URL, extract product ID
-            if 'products/' in query:
-                # Extract product ID from URL
-                match = re.search(r'/products/([^/?]+)', query)
-                if match:
-                    product_handle = match.group(1)
-                    # Get product by handle
-                    url = f"{self.base_url}/products.json?handle={product_handle}"
-                else:
-                    return {'success': False, 'error': 'Invalid product URL'}
-            else:
-                # Get all products and filter by title (Shopify doesn't support title search parameter)
-                url = f"{self.base_url}/products.json?limit=50"
-            
-            response = requests.get(url, headers=self.headers, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            all_products = data.get('products', [])
-            
-            # Filter products by query if it's a text search
-            if 'products/' not in query:
-                query_lower = query.lower()
-                products = [p for p in all_products if query_lower in p['title'].lower()]
-            else:
-                products = all_products
-            
-            return {
-                'success': True,
-                'products': [{
-                    'id': str(p['id']),
-                    'title': p['title'],
-                    'handle': p['handle'],
-                    'image': p['images'][0]['src'] if p.get('images') else None,
-                    'url': f"https://{self.shop_domain}/products/{p['handle']}"
-                } for p in products]
-            }
-            
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Shopify API error: {str(e)}")
-            return {'success': False, 'error': 'Failed to connect to Shopify'}
+            self.backfill(*key)
         except Exception as e:
-            logger.error(f"Product search error: {str(e)}")
-            return {'success': False, 'error': str(e)}
+            self.stats['errors'] += 1
+            logger.error(f"Widget backfill error for {key}: {str(e)}")
+        finally:
+            with self._lock:
+                self._pending.discard(key)
     
-    def get_product(self, product_id):
-        """Get a single product by ID"""
-        if not self.is_configured():
-            return {'success': False, 'error': 'Shopify API not configured'}
-        
+    def backfill(self, shop, product_id):
+        """Copy every review page of the product's Shopify document into the read model"""
+        client = shopify_client_for(shop)
+        if not client.is_configured() or self.read_model.get_revision(shop, product_id)[0]:
+            return 0
+        
+        reviews, page, pages = [], 1, 1
+        while page <= pages:
+            result = client.get_review_page(product_id, page)
+            if not result['success']:
+                raise Exception(result['error'])
+            pages = result['summary'].get('pages', 0)
+            reviews.extend(result['reviews'])
+            page += 1
+        
+        # Only products the read model never had (moderation is local and must not be undone)
+        if not reviews or self.read_model.get_revision(shop, product_id)[0]:
+            self.stats['empty'] += 1
+            return 0
+        self.read_model.add_reviews(shop, product_id, reviews)
+        widget_system.widget_cache.invalidate(shop, product_id)
+        widget_snapshots.schedule(shop, product_id)
+        self.stats['filled'] += 1
+        logger.info(f"Widget read model backfilled {len(reviews)} reviews for {shop}/{product_id}")
+        return len(reviews)
+
+# Initialize read model backfill
+widget_backfill = ReadModelBackfill(widget_read_model)
+
+# ==================== BILLING ENTITLEMENTS ====================
+
+class EntitlementCache:
+    """
+    Per-shop billing entitlement answered from memory
+    Expired entries keep answering (stale) while one background worker re-checks
+    Shopify Billing, so a widget request never waits on it. Billing webhooks push
+    changes as they happen and a reconcile loop re-checks every known shop
+    """
+    
+    def __init__(self, db_path, ttl=3600, negative_ttl=300, reconcile_interval=3600, default=True):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.default = default
+        self._lock = threading.Lock()
+        self._conn = connect_db(db_path)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS shop_entitlements (
+                shop TEXT PRIMARY KEY,
+                active INTEGER NOT NULL,
+                plan TEXT,
+                source TEXT NOT NULL,
+                checked_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+        # Warm start: answers survive restarts and keep their original expiry
+        self._entries = {}
+        for shop, active, plan, source, checked_at in self._conn.execute(
+                "SELECT shop, active, plan, source, checked_at FROM shop_entitlements"):
+            self._entries[shop] = self._entry(bool(active), plan, source, checked_at,
+                                              ttl=self.negative_ttl if source == 'error' else None)
+        
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='entitlement-check')
+        self._pending = set()
+        self.stats = {'hits': 0, 'stale': 0, 'misses': 0, 'checks': 0, 'errors': 0, 'webhooks': 0}
+        if reconcile_interval > 0:
+            threading.Thread(target=self._reconcile_loop, args=(reconcile_interval,),
+                             name='entitlement-reconcile', daemon=True).start()
+    
+    def _entry(self, active, plan, source, checked_at, ttl=None):
+        if ttl is None:
+            ttl = self.ttl if active else self.negative_ttl
+        return {'active': active, 'plan': plan, 'source': source,
+                'checked_at': checked_at, 'expires_at': checked_at + ttl}
+    
+    def is_entitled(self, shop):
+        """Hot path: in-process answer; schedules a re-check when missing or expired"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(shop)
+            if entry is None:
+                self.stats['misses'] += 1
+            elif entry['expires_at'] <= now:
+                self.stats['stale'] += 1
+            else:
+                self.stats['hits'] += 1
+                return entry['active']
+        self.schedule(shop)
+        return entry['active'] if entry else self.default
+    
+    def schedule(self, shop):
+        """Queue a billing check; concurrent requests for one shop coalesce"""
+        with self._lock:
+            if shop in self._pending:
+                return
+            self._pending.add(shop)
+        self._executor.submit(self._run, shop)
+    
+    def _run(self, shop):
         try:
-            url = f"{self.base_url}/products/{product_id}.json"
-            response = requests.get(url, headers=self.headers, timeout=10)
-            response.raise_for_status()
-            
-            product = response.json()['product']
-            
-            return {
-                'success': True,
-                'product': {
-                    'id': str(product['id']),
-                    'title': product['title'],
-                    'handle': product['handle'],
-                    'image': product['images'][0]['src'] if product.get('images') else None,
-                    'url': f"https://{self.shop_domain}/products/{product['handle']}"
-                }
-            }
+            self.refresh(shop)
         except Exception as e:
-            logger.error(f"Get product error: {str(e)}")
-            return {'success': False, 'error': str(e)}
+            self.stats['errors'] += 1
+            logger.error(f"Entitlement check error for {shop}: {str(e)}")
+            self._backoff(shop)
+        finally:
+            with self._lock:
+                self._pending.discard(shop)  # Requests during the check were answered stale
     
-    def add_review_to_product(self, product_id, review_data):
+    def _backoff(self, shop):
+        """Failed check: keep the last answer (or the default) and retry after the negative TTL"""
+        with self._lock:
+            entry = self._entries.get(shop)
+            active = entry['active'] if entry else self.default
+            self._store_locked(shop, active, entry['plan'] if entry else None, 'error', ttl=self.negative_ttl)
+    
+    def _store(self, shop, active, plan, source):
+        with self._lock:
+            self._store_locked(shop, active, plan, source)
+        return self.get(shop)
+    
+    def _store_locked(self, shop, active, plan, source, ttl=None):
+        """Cache and persist an answer (warm starts reload it with its original expiry)"""
+        checked_at = time.time()
+        self._entries[shop] = self._entry(active, plan, source, checked_at, ttl=ttl)
+        self._conn.execute("""
+            INSERT OR REPLACE INTO shop_entitlements (shop, active, plan, source, checked_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, (shop, 1 if active else 0, plan, source, checked_at))
+        self._conn.commit()
+    
+    def refresh(self, shop):
+        """Ask Shopify Billing now (background worker / admin); returns the stored entry"""
+        self.stats['checks'] += 1
+        client = shopify_client_for(shop)
+        if not client.is_configured() or (client.shop_domain or 'default') != shop:
+            # No Admin API access for this shop (local/dev setups): nothing to check against
+            return self._store(shop, self.default, None, 'unconfigured')
+        
+        result = client.get_app_subscriptions()
+        if not result['success']:
+            self.stats['errors'] += 1
+            logger.warning(f"Entitlement check failed for {shop}: {result['error']}")
+            self._backoff(shop)
+            return self.get(shop)
+        
+        if result.get('development'):
+            # Partner development stores cannot be charged; they get the app for free
+            return self._store(shop, True, 'development', 'billing')
+        plans = [sub.get('name') for sub in result['subscriptions'] if sub.get('status') == 'ACTIVE']
+        return self._store(shop, bool(plans), ', '.join(plans) or None, 'billing')
+    
+    def apply_webhook(self, shop, topic, payload):
         """
-        Add a review to a product using metafields
-        Shopify doesn't have native review API, so we use metafields
+        app_subscriptions/update and app/uninstalled webhooks
+        A new ACTIVE subscription is trusted at once; any other status only marks the shop
+        stale, since a plan switch cancels one subscription while another stays active
         """
-        if not self.is_configured():
-            return {'success': False, 'error': 'Shopify API not configured'}
-        
+        self.stats['webhooks'] += 1
+        if topic == 'app/uninstalled':
+            self._store(shop, False, None, 'webhook')
+            return 'revoked'
+        
+        subscription = payload.get('app_subscription') or {}
+        if subscription.get('status') == 'ACTIVE':
+            self._store(shop, True, subscription.get('name'), 'webhook')
+            return 'granted'
+        with self._lock:
+            if shop in self._entries:
+                self._entries[shop]['expires_at'] = 0
+        self.schedule(shop)
+        return 'recheck'
+    
+    def reconcile(self):
+        """Re-check every known shop (catches missed or reordered webhooks)"""
+        with self._lock:
+            shops = list(self._entries)
+        for shop in shops:
+            self.schedule(shop)
+        return len(shops)
+    
+    def _reconcile_loop(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.reconcile()
+            except Exception as e:
+                logger.error(f"Entitlement reconcile error: {str(e)}")
+    
+    def get(self, shop):
+        with self._lock:
+            entry = self._entries.get(shop)
+            return dict(entry, shop=shop) if entry else None
+    
+    def status(self):
+        with self._lock:
+            active = sum(1 for entry in self._entries.values() if entry['active'])
+            return dict(self.stats, shops=len(self._entries), active=active, pending=len(self._pending))
+
+# Initialize entitlement cache
+entitlements = EntitlementCache(
+    Config.DATABASE_PATH,
+    ttl=Config.ENTITLEMENT_TTL,
+    negative_ttl=Config.ENTITLEMENT_NEGATIVE_TTL,
+    reconcile_interval=Config.ENTITLEMENT_RECONCILE_INTERVAL,
+    default=Config.ENTITLEMENT_DEFAULT
+)
+
+# ==================== BACKGROUND IMPORT JOBS ====================
+
+class ImportJobManager:
+    """
+    Background bulk-import jobs
+    A job is accepted at once and processed by worker threads; every review's
+    status is persisted so progress survives restarts and jobs can be resumed.
+    Each process heartbeats the jobs it owns; only jobs whose owner stopped
+    heartbeating are marked interrupted, so sibling workers never kill each other's jobs
+    """
+    
+    FINAL_STATUSES = ('completed', 'cancelled')
+    
+    def __init__(self, db_path, workers=4, concurrency=4, lease=60):
+        self._lock = threading.Lock()
+        self._conn = connect_db(db_path)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS import_jobs (
+                job_id TEXT PRIMARY KEY,
+                shop TEXT NOT NULL,
+                shopify_product_id TEXT NOT NULL,
+                session_id TEXT,
+                status TEXT NOT NULL,
+                total INTEGER NOT NULL,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS import_job_items (
+                job_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                review_id TEXT,
+                review_json TEXT NOT NULL,
+                status TEXT NOT NULL,
+                error TEXT,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (job_id, position)
+            );
+        """)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(import_jobs)")}
+        if 'owner' not in columns:
+            self._conn.execute("ALTER TABLE import_jobs ADD COLUMN owner TEXT")
+            self._conn.execute("ALTER TABLE import_jobs ADD COLUMN heartbeat_at REAL NOT NULL DEFAULT 0")
+        self._conn.commit()
+        
+        self.owner = uuid.uuid4().hex
+        self.lease = lease
+        # Jobs whose process stopped (lease expired) can be resumed
+        self.recover_orphaned()
+        threading.Thread(target=self._heartbeat_loop, name='import-job-heartbeat', daemon=True).start()
+        
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='import-job')
+        # Every batch rewrites its product's review summary, so one product has one writer:
+        # a job's batches run in order, while jobs for different products write in parallel
+        # (bounded here; the rate limiter keeps them under Shopify's budget)
+        self.concurrency = concurrency
+        self._write_slots = threading.BoundedSemaphore(concurrency)
+        self._cancel_requested = set()
+    
+    def create_job(self, shop, shopify_product_id, session_id, reviews):
+        """Persist a job with all its reviews and queue it; returns the job ID"""
+        job_id = uuid.uuid4().hex
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO import_jobs (job_id, shop, shopify_product_id, session_id, status, total, created_at, updated_at, "
+                "owner, heartbeat_at) VALUES (?, ?, ?, ?, 'queued', ?, ?, ?, ?, ?)",
+                (job_id, shop, str(shopify_product_id), session_id, len(reviews), now, now, self.owner, time.time())
+            )
+            self._conn.executemany(
+                "INSERT INTO import_job_items (job_id, position, review_id, review_json, status, updated_at) "
+                "VALUES (?, ?, ?, ?, 'pending', ?)",
+                [(job_id, pos, str(r.get('id')), json.dumps(r), now) for pos, r in enumerate(reviews)]
+            )
+            self._conn.commit()
+        
+        self._executor.submit(self._run, job_id)
+        logger.info(f"Import job {job_id} queued: {len(reviews)} reviews -> product {shopify_product_id}")
+        return job_id
+    
+    def recover_orphaned(self):
+        """Mark queued/running jobs whose owner stopped heartbeating as interrupted"""
+        with self._lock:
+            recovered = self._conn.execute(
+                "UPDATE import_jobs SET status = 'interrupted', updated_at = ? "
+                "WHERE status IN ('queued', 'running') AND heartbeat_at < ?",
+                (datetime.now().isoformat(), time.time() - self.lease)
+            ).rowcount
+            self._conn.commit()
+        if recovered:
+            logger.warning(f"{recovered} orphaned import job(s) marked interrupted")
+        return recovered
+    
+    def _heartbeat_loop(self):
+        while True:
+            time.sleep(max(1, self.lease / 3))
+            try:
+                with self._lock:
+                    self._conn.execute(
+                        "UPDATE import_jobs SET heartbeat_at = ? WHERE owner = ? AND status IN ('queued', 'running')",
+                        (time.time(), self.owner)
+                    )
+                    self._conn.commit()
+                self.recover_orphaned()  # Also picks up jobs of sibling processes that died
+            except Exception as e:
+                logger.error(f"Import job heartbeat error: {str(e)}")
+    
+    def _set_job_status(self, job_id, status):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE import_jobs SET status = ?, updated_at = ? WHERE job_id = ?",
+                (status, datetime.now().isoformat(), job_id)
+            )
+            self._conn.commit()
+    
+    def _get_job(self, job_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT job_id, shop, shopify_product_id, session_id, status, total, created_at, updated_at "
+                "FROM import_jobs WHERE job_id = ?",
+                (job_id,)
+            ).fetchone()
+        if not row:
+            return None
+        keys = ('job_id', 'shop', 'shopify_product_id', 'session_id', 'status', 'total', 'created_at', 'updated_at')
+        return dict(zip(keys, row))
+    
+    def _run(self, job_id):
+        """Worker: import every pending/failed review of a job"""
         try:
-            # Create a unique review ID
-            review_id = review_data.get('id', str(uuid.uuid4()))
-            
-            # Prepare metafield data
-            metafield_value = {
-                'rating': review_data.get('rating', 5),
-                'title': review_data.get('title', ''),
-                'text': review_data.get('text', ''),
-                'reviewer_name': review_data.get('reviewer_name', 'Anonymous'),
-                'date': review_data.get('date', datetime.now().strftime('%Y-%m-%d')),
-                'country': review_data.get('country', ''),
-                'verified': review_data.get('verified', False),
-                'images': review_data.get('images', []),
-                'quality_score': review_data.get('quality_score', 0),
-                'ai_recommended': review_data.get('ai_recommended', False),
-                'platform': review_data.get('platform', 'unknown'),
-                'imported_at': datetime.now().isoformat()
-            }
-            
-            # Create metafield
-            url = f"{self.base_url}/products/{product_id}/metafields.json"
-            
-            payload = {
-                'metafield': {
-                    'namespace': 'reviewking',
-                    'key': f'review_{review_id}',
-                    'value': json.dumps(metafield_value),
-                    'type': 'json'
-                }
-            }
-            
-            response = requests.post(url, json=payload, headers=self.headers, timeout=10)
-            response.raise_for_status()
-            
-            return {
-                'success': True,
-                'review_id': review_id,
-                'metafield': response.json()['metafield']
-            }
+            job = self._get_job(job_id)
+            if not job or job['status'] in self.FINAL_STATUSES:
+                return
+            self._set_job_status(job_id, 'running')
+            
+            with self._lock:
+                items = self._conn.execute(
+                    "SELECT position, review_json FROM import_job_items "
+                    "WHERE job_id = ? AND status IN ('pending', 'failed') ORDER BY position",
+                    (job_id,)
+                ).fetchall()
+            
+            imported_count = 0
+            cancelled = False
+            batch_size = ShopifyAPIHelper.REVIEW_BATCH_SIZE
+            try:
+                for start in range(0, len(items), batch_size):
+                    if job_id in self._cancel_requested:
+                        cancelled = True
+                        break
+                    
+                    batch = items[start:start + batch_size]
+                    reviews = [json.loads(review_json) for _, review_json in batch]
+                    with self._write_slots:
+                        imported_count += self._import_batch(job, batch, reviews)
+            finally:
+                # Whatever landed goes live, even if the job stops early; items imported by a
+                # run that died before publishing are picked up when the job is resumed
+                if imported_count or self._has_imported_items(job_id):
+                    self._publish(job)
+            
+            if cancelled:
+                self._cancel_requested.discard(job_id)
+                self._set_job_status(job_id, 'cancelled')
+                logger.info(f"Import job {job_id} cancelled after {imported_count} imported")
+                return
+            
+            session_id = job['session_id']
+            if session_id and session_id in import_sessions:
+                import_sessions[session_id]['imported_count'] += imported_count
+            
+            self._set_job_status(job_id, 'completed')
+            logger.info(f"Import job {job_id} completed: {imported_count} imported")
             
         except Exception as e:
-            logger.error(f"Add review error: {str(e)}")
-            return {'success': False, 'error': str(e)}
+            logger.error(f"Import job {job_id} error: {str(e)}")
+            self._set_job_status(job_id, 'failed')
+        finally:
+            self._cancel_requested.discard(job_id)  # A cancel that arrived after the last batch
+    
+    def _has_imported_items(self, job_id):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM import_job_items WHERE job_id = ? AND status = 'imported' LIMIT 1",
+                (job_id,)
+            ).fetchone() is not None
+    
+    def _publish(self, job):
+        """Re-rank the product once for the whole job and refresh what the storefront serves"""
+        try:
+            widget_read_model.rerank(job['shop'], job['shopify_product_id'])
+            widget_system.widget_cache.invalidate(job['shop'], job['shopify_product_id'])
+            widget_snapshots.schedule(job['shop'], job['shopify_product_id'])
+        except Exception as e:
+            logger.error(f"Import job {job['job_id']} publish error: {str(e)}")
+    
+    def _import_batch(self, job, batch, reviews):
+        """Write one batch through the metafieldsSet path and persist per-review status"""
+        try:
+            result = shopify_client_for(job['shop']).add_reviews_to_product(job['shopify_product_id'], reviews)
+        except Exception as e:
+            result = {'imported': [], 'failed': [{'id': r.get('id'), 'error': str(e)} for r in reviews]}
+        
+        errors = {str(f['id']): f['error'] for f in result['failed']}
+        imported_ids = [r.get('id') for r in reviews if str(r.get('id')) not in errors]
+        import_ledger.record(job['shop'], job['shopify_product_id'], imported_ids)
+        # Ranked pages are rebuilt once when the job ends (_publish), not per batch
+        widget_read_model.add_reviews(job['shop'], job['shopify_product_id'],
+                                      [r for r in reviews if str(r.get('id')) not in errors], rerank=False)
+        
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE import_job_items SET status = ?, error = ?, updated_at = ? WHERE job_id = ? AND position = ?",
+                [('failed' if str(r.get('id')) in errors else 'imported', errors.get(str(r.get('id'))),
+                  now, job['job_id'], position)
+                 for (position, _), r in zip(batch, reviews)]
+            )
+            self._conn.commit()
+        return len(imported_ids)
+    
+    def get_progress(self, job_id):
+        """Job status with per-status counts and failed reviews"""
+        job = self._get_job(job_id)
+        if not job:
+            return None
+        
+        with self._lock:
+            counts = dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM import_job_items WHERE job_id = ? GROUP BY status",
+                (job_id,)
+            ).fetchall())
+            failed = self._conn.execute(
+                "SELECT review_id, error FROM import_job_items WHERE job_id = ? AND status = 'failed' "
+                "ORDER BY position LIMIT 50",
+                (job_id,)
+            ).fetchall()
+        
+        processed = counts.get('imported', 0) + counts.get('failed', 0)
+        job.update({
+            'imported': counts.get('imported', 0),
+            'failed': counts.get('failed', 0),
+            'pending': counts.get('pending', 0),
+            'processed': processed,
+            'percent': round(100.0 * processed / job['total'], 1) if job['total'] else 100.0,
+            'failed_reviews': [{'id': rid, 'error': err} for rid, err in failed]
+        })
+        return job
+    
+    def cancel(self, job_id):
+        """Stop a job after the review currently being imported"""
+        job = self._get_job(job_id)
+        if not job:
+            return None
+        if job['status'] in ('queued', 'running'):
+            self._cancel_requested.add(job_id)
+        elif job['status'] == 'interrupted':
+            self._set_job_status(job_id, 'cancelled')
+        return self.get_progress(job_id)
+    
+    def resume(self, job_id):
+        """Re-queue a cancelled/interrupted/failed job; pending and failed reviews are retried"""
+        job = self._get_job(job_id)
+        if not job:
+            return None
+        if job['status'] not in ('queued', 'running'):
+            self._cancel_requested.discard(job_id)
+            with self._lock:
+                self._conn.execute(
+                    "UPDATE import_jobs SET status = 'queued', owner = ?, heartbeat_at = ?, updated_at = ? WHERE job_id = ?",
+                    (self.owner, time.time(), datetime.now().isoformat(), job_id)
+                )
+                self._conn.commit()
+            self._executor.submit(self._run, job_id)
+            logger.info(f"Import job {job_id} resumed")
+        return self.get_progress(job_id)
 
-# Initialize Shopify helper
-shopify_helper = ShopifyAPIHelper()
+# Initialize import job manager
+import_jobs = ImportJobManager(
+    Config.DATABASE_PATH,
+    workers=Config.IMPORT_JOB_WORKERS,
+    concurrency=Config.IMPORT_CONCURRENCY,
+    lease=Config.IMPORT_JOB_LEASE
+)
 
 # ==================== API ROUTES (Matching Loox Structure) ====================
 
+@app.errorhandler(UnknownShopError)
+def unknown_shop(error):
+    """A shop with no credentials here gets a 404, never the default shop's data"""
+    return jsonify({'success': False, 'error': str(error)}), 404
+
 @app.route('/')
 def index():
     """Beautiful Sakura Reviews welcome page"""
@@ -1366,9 +4194,17 @@ def import_url():
     - platform: aliexpress, amazon, ebay, walmart
     - page: Page number
     - rating: Min rating filter
+    - stars: Star bucket filter (5stars, 4-5stars, 3stars or 1-5)
     - country: Country filter
     - with_photos: Photos only (true/false)
+    - ai_recommended: AI recommended only (true)
+    - quality: Quality bucket (high, medium, low)
+    - min_quality_score: Min AI quality score
+    - near_duplicates: 'false' hides reviews flagged as near-duplicates
     - translate: Language (optional)
+    
+    Filters are answered from the cached facet index, so switching filters
+    for the same product does not re-scrape; facet counts are returned in 'facets'
     """
     try:
         # Get query parameters
@@ -1380,8 +4216,13 @@ def import_url():
         # Filters
         filters = {
             'rating': request.args.get('rating'),
+            'stars': request.args.get('stars'),
             'country': request.args.get('country'),
             'with_photos': request.args.get('with_photos'),
+            'ai_recommended': request.args.get('ai_recommended'),
+            'quality': request.args.get('quality'),
+            'min_quality_score': request.args.get('min_quality_score'),
+            'near_duplicates': request.args.get('near_duplicates'),
             'translate': request.args.get('translate')
         }
         
@@ -1394,6 +4235,11 @@ def import_url():
                 'error': 'productId parameter required'
             }), 400
         
+        try:
+            ReviewFacetIndex.validate_filters(filters)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
         # Extract reviews
         product_data = {
             'productId': product_id,
@@ -1417,6 +4263,8 @@ def import_url():
             'started_at': datetime.now().isoformat(),
             'imported_count': 0
         }
+        if result.get('cache_key'):
+            extractor.result_cache.bind_session(session_id, result['cache_key'])
         
         result['session_id'] = session_id
         
@@ -1458,6 +4306,16 @@ def import_single():
         review = data['review']
         shopify_product_id = data.get('shopify_product_id')
         session_id = data.get('session_id')
+        shop = shop_key(request_shop())
+        
+        # Never push the same review to the same product twice
+        if shopify_product_id and import_ledger.contains(shop, shopify_product_id, review.get('id')):
+            logger.info(f"Review already imported: {review.get('id')} -> product {shopify_product_id}")
+            return jsonify({
+                'success': True,
+                'already_imported': True,
+                'message': 'Review was already imported to this product'
+            })
         
         # Simulate import (in production, save to database)
         imported_review = {
@@ -1469,6 +4327,12 @@ def import_single():
             'platform': review.get('platform', 'unknown')
         }
         
+        if shopify_product_id:
+            import_ledger.record(shop, shopify_product_id, [review.get('id')])
+            widget_read_model.add_reviews(shop, shopify_product_id, [review])
+            widget_system.widget_cache.invalidate(shop, shopify_product_id)
+            widget_snapshots.schedule(shop, shopify_product_id)
+        
         # Track in session
         if session_id and session_id in import_sessions:
             import_sessions[session_id]['imported_count'] += 1
@@ -1481,6 +4345,8 @@ def import_single():
             'message': 'Review imported successfully'
         })
         
+    except UnknownShopError:
+        raise  # 404 from the app-level handler
     except Exception as e:
         logger.error(f"Import single error: {str(e)}")
         return jsonify({
@@ -1505,9 +4371,11 @@ def search_shopify_products():
                 'error': 'Search query required'
             }), 400
         
-        result = shopify_helper.search_products(query)
+        result = shopify_client_for(request_shop()).search_products(query)
         return jsonify(result)
         
+    except UnknownShopError:
+        raise  # 404 from the app-level handler
     except Exception as e:
         logger.error(f"Product search error: {str(e)}")
         return jsonify({
@@ -1515,6 +4383,199 @@ def search_shopify_products():
             'error': 'Search failed'
         }), 500
 
+@app.route('/shopify/products', methods=['GET'])
+def get_shopify_products():
+    """
+    Resolve several Shopify products by ID in one call (import targets)
+    
+    Query params:
+    - ids: Comma-separated product IDs
+    """
+    ids = [pid.strip() for pid in request.args.get('ids', '').split(',') if pid.strip()]
+    if not ids:
+        return jsonify({'success': False, 'error': 'ids required'}), 400
+    
+    result = shopify_client_for(request_shop()).get_products(ids)
+    return jsonify(result), 200 if result['success'] else 502
+
+@app.route('/admin/reviews/export', methods=['POST'])
+def start_review_export():
+    """
+    Start a Shopify bulk operation exporting every review we have written
+    Poll the status_url, then stream the result from download_url
+    """
+    result = shopify_client_for(request_shop()).start_review_export()
+    if not result['success']:
+        return jsonify(result), 502
+    
+    operation_id = result['operation']['id']
+    return jsonify({
+        'success': True,
+        'operation_id': operation_id,
+        'status': result['operation']['status'],
+        'status_url': f"/admin/reviews/export/status?id={operation_id}",
+        'download_url': f"/admin/reviews/export/download?id={operation_id}"
+    }), 202
+
+@app.route('/admin/reviews/export/status', methods=['GET'])
+def review_export_status():
+    """
+    Bulk export status
+    
+    Query params:
+    - id: Bulk operation ID
+    """
+    operation_id = request.args.get('id')
+    if not operation_id:
+        return jsonify({'success': False, 'error': 'id required'}), 400
+    result = shopify_client_for(request_shop()).get_bulk_operation(operation_id)
+    return jsonify(result), 200 if result['success'] else 404
+
+@app.route('/admin/reviews/export/download', methods=['GET'])
+def review_export_download():
+    """
+    Stream a completed bulk export as newline-delimited review JSON (constant memory)
+    
+    Query params:
+    - id: Bulk operation ID
+    """
+    operation_id = request.args.get('id')
+    if not operation_id:
+        return jsonify({'success': False, 'error': 'id required'}), 400
+    
+    client = shopify_client_for(request_shop())
+    result = client.get_bulk_operation(operation_id)
+    if not result['success']:
+        return jsonify(result), 404
+    operation = result['operation']
+    if operation['status'] != 'COMPLETED':
+        return jsonify({'success': False, 'error': f"Export is {operation['status']}", 'operation': operation}), 409
+    
+    def generate():
+        if not operation.get('url'):  # Nothing matched: Shopify returns no file
+            return
+        for review in client.iter_exported_reviews(client.iter_bulk_lines(operation['url'])):
+            yield json.dumps(review) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson', headers={
+        'Content-Disposition': 'attachment; filename=reviewking-reviews.jsonl'
+    })
+
+@app.route('/shopify/products/sync', methods=['POST'])
+def sync_shopify_products():
+    """
+    Re-crawl the full product catalog into the local search index (runs in the background)
+    """
+    client = shopify_client_for(request_shop())
+    if not client.is_configured():
+        return jsonify({'success': False, 'error': 'Shopify API not configured'}), 400
+    
+    client.sync_catalog_async()
+    return jsonify({'success': True, 'index': client.catalog_status}), 202
+
+@app.route('/shopify/products/index', methods=['GET'])
+def shopify_product_index_status():
+    """
+    Product search index status
+    """
+    return jsonify({'success': True, 'index': shopify_client_for(request_shop()).catalog_status})
+
+def verify_shopify_webhook(raw_body, hmac_header):
+    """Check X-Shopify-Hmac-Sha256: base64 HMAC-SHA256 of the raw body keyed with the app secret"""
+    if not Config.SHOPIFY_API_SECRET or not hmac_header:
+        return False
+    digest = hmac.new(Config.SHOPIFY_API_SECRET.encode(), raw_body, hashlib.sha256).digest()
+    return hmac.compare_digest(base64.b64encode(digest).decode(), hmac_header)
+
+@app.route('/shopify/webhooks/products', methods=['POST'])
+def shopify_product_webhook():
+    """
+    Shopify products/create, products/update and products/delete webhooks
+    Keeps the product search index and get_product cache fresh without re-crawling
+    """
+    raw_body = request.get_data()
+    if not verify_shopify_webhook(raw_body, request.headers.get('X-Shopify-Hmac-Sha256')):
+        logger.warning("Rejected product webhook with invalid HMAC")
+        return jsonify({'success': False, 'error': 'Invalid webhook signature'}), 401
+    
+    topic = request.headers.get('X-Shopify-Topic', '')
+    if topic not in ShopifyAPIHelper.PRODUCT_WEBHOOK_TOPICS:
+        return jsonify({'success': False, 'error': f'Unsupported topic: {topic}'}), 400
+    
+    shop = request.headers.get('X-Shopify-Shop-Domain')
+    try:
+        client = shopify_client_for(shop)
+    except UnknownShopError:
+        return jsonify({'success': True, 'result': 'ignored'})  # Shop not installed here
+    
+    try:
+        result = client.apply_product_webhook(topic, json.loads(raw_body))
+        logger.info(f"Product webhook {topic}: {result}")
+        return jsonify({'success': True, 'result': result})
+    except Exception as e:
+        logger.error(f"Product webhook error: {str(e)}")
+        return jsonify({'success': False, 'error': 'Webhook processing failed'}), 500
+
+@app.route('/shopify/webhooks/billing', methods=['POST'])
+def shopify_billing_webhook():
+    """
+    Shopify app_subscriptions/update and app/uninstalled webhooks
+    Updates the shop's cached entitlement as soon as billing changes
+    """
+    raw_body = request.get_data()
+    if not verify_shopify_webhook(raw_body, request.headers.get('X-Shopify-Hmac-Sha256')):
+        logger.warning("Rejected billing webhook with invalid HMAC")
+        return jsonify({'success': False, 'error': 'Invalid webhook signature'}), 401
+    
+    topic = request.headers.get('X-Shopify-Topic', '')
+    if topic not in ShopifyAPIHelper.BILLING_WEBHOOK_TOPICS:
+        return jsonify({'success': False, 'error': f'Unsupported topic: {topic}'}), 400
+    
+    shop = request.headers.get('X-Shopify-Shop-Domain')
+    if not shop:
+        return jsonify({'success': False, 'error': 'X-Shopify-Shop-Domain required'}), 400
+    
+    try:
+        result = entitlements.apply_webhook(shop, topic, json.loads(raw_body))
+        logger.info(f"Billing webhook {topic} for {shop}: {result}")
+        return jsonify({'success': True, 'result': result})
+    except Exception as e:
+        logger.error(f"Billing webhook error: {str(e)}")
+        return jsonify({'success': False, 'error': 'Webhook processing failed'}), 500
+
+@app.route('/shopify/webhooks/register', methods=['POST'])
+def register_shopify_webhooks():
+    """
+    Subscribe this app to the shop's product and billing webhooks
+    """
+    base_url = (Config.SHOPIFY_APP_URL or request.host_url).rstrip('/')
+    client = shopify_client_for(request_shop())
+    result = client.register_product_webhooks(f"{base_url}/shopify/webhooks/products")
+    if result['success']:
+        billing = client.register_webhooks(ShopifyAPIHelper.BILLING_WEBHOOK_TOPICS, f"{base_url}/shopify/webhooks/billing")
+        result = {'success': billing['success'], 'webhooks': dict(result['webhooks'], **billing['webhooks'])}
+    return jsonify(result), 200 if result['success'] else 502
+
+@app.route('/admin/billing/entitlements', methods=['GET', 'POST'])
+def billing_entitlements():
+    """
+    Entitlement cache: GET for status (?shop= for one shop), POST to re-check a shop now
+    
+    Body (POST): {
+        "shop": "store.myshopify.com"   // omit to reconcile every known shop in the background
+    }
+    """
+    if request.method == 'GET':
+        shop = request.args.get('shop')
+        if shop:
+            return jsonify({'success': True, 'entitlement': entitlements.get(shop_key(shop))})
+        return jsonify({'success': True, 'entitlements': entitlements.status()})
+    
+    data = request.get_json(silent=True) or {}
+    if data.get('shop'):
+        return jsonify({'success': True, 'entitlement': entitlements.refresh(shop_key(data['shop']))})
+    return jsonify({'success': True, 'scheduled': entitlements.reconcile()}), 202
+
 @app.route('/admin/reviews/skip', methods=['POST'])
 def skip_review():
     """
@@ -1564,23 +4625,51 @@ def import_bulk():
     Import multiple reviews at once, excluding skipped ones
     
     Body: {
-        "reviews": [{...}, {...}],
+        "review_ids": ["id1", "id2"],
+        "cache_key": "aliexpress:123:1:150",  (optional, defaults to the session's review set)
         "shopify_product_id": "123",
         "session_id": "abc",
         "filters": {"min_quality_score": 7}
     }
+    
+    Reviews are resolved by ID from the server-side result cache, so the client
+    never uploads review bodies. Legacy clients may still send "reviews": [{...}].
     """
     try:
         data = request.json
         reviews = data.get('reviews', [])
+        review_ids = data.get('review_ids')
         shopify_product_id = data.get('shopify_product_id')
         session_id = data.get('session_id')
         filters = data.get('filters', {})
         
+        unresolved = []
+        if review_ids is not None:
+            if data.get('cache_key'):
+                cached = extractor.result_cache.get(data['cache_key'])
+                entries = [cached] if cached else []
+            else:
+                # Any page the session loaded (ids may come from several pages)
+                entries = extractor.result_cache.entries_for_session(session_id)
+            if not entries:
+                return jsonify({
+                    'success': False,
+                    'error': 'Review set expired, please reload reviews'
+                }), 410
+            
+            reviews = []
+            for rid in review_ids:
+                review = next((r for r in (entry['index'].get(rid) for entry in entries) if r is not None), None)
+                if review is None:
+                    unresolved.append(rid)
+                else:
+                    reviews.append(review)
+        
         if not reviews:
             return jsonify({
                 'success': False,
-                'error': 'No reviews provided'
+                'error': 'No reviews provided',
+                'unresolved_ids': unresolved
             }), 400
         
         if not shopify_product_id:
@@ -1599,49 +4688,42 @@ def import_bulk():
         min_quality = filters.get('min_quality_score', 0)
         filtered_reviews = [r for r in non_skipped_reviews if r.get('quality_score', 0) >= min_quality]
         
-        # Bulk import to Shopify
-        imported = []
-        failed = []
-        
-        for review in filtered_reviews[:50]:  # Limit to 50 at once
-            try:
-                result = shopify_helper.add_review_to_product(shopify_product_id, review)
-                
-                if result['success']:
-                    imported.append({
-                        'id': review.get('id'),
-                        'imported_at': datetime.now().isoformat(),
-                        'quality_score': review.get('quality_score'),
-                        'shopify_product_id': shopify_product_id,
-                        'review_id': result['review_id']
-                    })
-                else:
-                    failed.append({
-                        'id': review.get('id'),
-                        'error': result['error']
-                    })
-            except Exception as e:
-                failed.append({
-                    'id': review.get('id'),
-                    'error': str(e)
-                })
+        # Drop reviews already pushed to this product in any earlier session
+        shop = shop_key(request_shop())
+        already_imported = import_ledger.already_imported(
+            shop, shopify_product_id, [r.get('id') for r in filtered_reviews]
+        )
+        filtered_reviews = [r for r in filtered_reviews if str(r.get('id')) not in already_imported]
+        if not filtered_reviews:
+            return jsonify({
+                'success': True,
+                'job_id': None,
+                'queued_count': 0,
+                'skipped_count': len(session_skipped),
+                'already_imported_count': len(already_imported),
+                'unresolved_ids': unresolved,
+                'message': 'Nothing to import: every review was skipped, filtered out or already imported'
+            })
         
-        # Update session stats
-        if session_id and session_id in import_sessions:
-            import_sessions[session_id]['imported_count'] += len(imported)
+        # Hand the whole import to a background job (no size cap, no request timeout)
+        job_id = import_jobs.create_job(shop, shopify_product_id, session_id, filtered_reviews)
         
-        logger.info(f"Bulk import to Shopify: {len(imported)} successful, {len(failed)} failed, {len(session_skipped)} skipped")
+        logger.info(f"Bulk import job {job_id}: {len(filtered_reviews)} queued, {len(session_skipped)} skipped, {len(already_imported)} already imported")
         
         return jsonify({
             'success': True,
-            'imported_count': len(imported),
-            'failed_count': len(failed),
+            'job_id': job_id,
+            'status_url': f"/admin/reviews/import/jobs/{job_id}",
+            'queued_count': len(filtered_reviews),
             'skipped_count': len(session_skipped),
-            'imported_reviews': imported,
-            'failed_reviews': failed,
-            'message': f'Bulk import completed: {len(imported)} imported, {len(failed)} failed, {len(session_skipped)} skipped'
-        })
-        
+            'already_imported_count': len(already_imported),
+            'unresolved_ids': unresolved,  # Not found in any review set the session loaded (expired or unknown)
+            'message': f'Bulk import started: {len(filtered_reviews)} queued, {len(session_skipped)} skipped, {len(already_imported)} already imported'
+                       + (f', {len(unresolved)} not found' if unresolved else '')
+        }), 202
+        
+    except UnknownShopError:
+        raise  # 404 from the app-level handler
     except Exception as e:
         logger.error(f"Bulk import error: {str(e)}")
         return jsonify({
@@ -1649,6 +4731,145 @@ def import_bulk():
             'error': 'Bulk import failed'
         }), 500
 
+@app.route('/admin/reviews/hide', methods=['POST'])
+def hide_reviews():
+    """
+    Moderation: remove imported reviews from the storefront widget
+    
+    Body: {
+        "shopify_product_id": "123",
+        "review_ids": ["r1", "r2"]
+    }
+    """
+    data = request.get_json(silent=True) or {}
+    shopify_product_id = data.get('shopify_product_id')
+    review_ids = data.get('review_ids') or []
+    if not shopify_product_id or not review_ids:
+        return jsonify({'success': False, 'error': 'shopify_product_id and review_ids required'}), 400
+    
+    shop = shop_key(request_shop())
+    removed = widget_read_model.remove_reviews(shop, shopify_product_id, review_ids)
+    widget_system.widget_cache.invalidate(shop, shopify_product_id)
+    widget_snapshots.schedule(shop, shopify_product_id)
+    return jsonify({'success': True, 'hidden_count': removed})
+
+@app.route('/admin/reviews/summary')
+def review_summary():
+    """
+    Stored rating aggregates of a product
+    
+    Query params:
+    - product_id: Shopify product ID
+    """
+    product_id = request.args.get('product_id')
+    if not product_id:
+        return jsonify({'success': False, 'error': 'product_id required'}), 400
+    
+    summary = widget_read_model.get_summary(shop_key(request_shop()), product_id)
+    if not summary:
+        return jsonify({'success': False, 'error': 'No reviews imported for this product'}), 404
+    return jsonify({'success': True, 'product_id': str(product_id), 'summary': summary})
+
+@app.route('/admin/reviews/summary/rebuild', methods=['POST'])
+def rebuild_review_summaries():
+    """
+    Repair: recount rating aggregates from the stored reviews
+    
+    Body (optional): {
+        "shopify_product_id": "123"   // omit to check every product of the shop
+    }
+    """
+    data = request.get_json(silent=True) or {}
+    shop = shop_key(request_shop())
+    drifted = widget_read_model.rebuild_summaries(shop, data.get('shopify_product_id'))
+    for _, product_id in drifted:
+        widget_system.widget_cache.invalidate(shop, product_id)
+        widget_snapshots.schedule(shop, product_id)
+    return jsonify({'success': True, 'repaired': [product_id for _, product_id in drifted]})
+
+@app.route('/admin/widget/snapshots', methods=['GET', 'POST'])
+def widget_snapshot_admin():
+    """
+    Static widget snapshots: GET for status, POST to (re)publish products now
+    
+    Body (POST): {"shopify_product_ids": ["123", "456"]}
+    """
+    if request.method == 'GET':
+        return jsonify({'success': True, 'snapshots': widget_snapshots.status()})
+    
+    if not widget_snapshots.enabled:
+        return jsonify({'success': False, 'error': 'WIDGET_SNAPSHOT_DIR not configured'}), 400
+    product_ids = (request.get_json(silent=True) or {}).get('shopify_product_ids') or []
+    if not product_ids:
+        return jsonify({'success': False, 'error': 'shopify_product_ids required'}), 400
+    
+    shop = shop_key(request_shop())
+    manifests = {}
+    for product_id in product_ids:
+        try:
+            manifests[str(product_id)] = widget_snapshots.publish(shop, product_id)
+        except Exception as e:
+            logger.error(f"Widget snapshot error for {product_id}: {str(e)}")
+            manifests[str(product_id)] = {'error': str(e)}
+    return jsonify({'success': True, 'manifests': manifests})
+
+@app.route('/admin/widget/cache', methods=['GET'])
+def widget_cache_status():
+    """
+    Rendered widget cache size and hit ratio
+    """
+    return jsonify({'success': True, 'cache': widget_system.widget_cache.status()})
+
+@app.route('/admin/reviews/import/jobs/<job_id>', methods=['GET'])
+def import_job_status(job_id):
+    """
+    Bulk import job progress (polled by the bookmarklet)
+    """
+    progress = import_jobs.get_progress(job_id)
+    if not progress:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify({'success': True, **progress})
+
+@app.route('/admin/reviews/import/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_import_job(job_id):
+    """
+    Cancel a running bulk import job (already imported reviews stay imported)
+    """
+    progress = import_jobs.cancel(job_id)
+    if not progress:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify({'success': True, **progress})
+
+@app.route('/admin/reviews/import/jobs/<job_id>/resume', methods=['POST'])
+def resume_import_job(job_id):
+    """
+    Resume a cancelled or interrupted bulk import job
+    """
+    progress = import_jobs.resume(job_id)
+    if not progress:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify({'success': True, **progress})
+
+@app.route('/admin/shopify/rate-limit', methods=['GET'])
+def shopify_rate_limit_metrics():
+    """
+    Shopify call budget and throttling metrics per shop
+    
+    Query params:
+    - shop: Limit to one shop domain (optional)
+    """
+    return jsonify({
+        'success': True,
+        'shops': shopify_rate_limiter.metrics(request.args.get('shop'))
+    })
+
+@app.route('/admin/shopify/clients', methods=['GET'])
+def shopify_client_registry_status():
+    """
+    Resident per-shop Shopify clients and LRU hit/eviction counts
+    """
+    return jsonify({'success': True, 'clients': shopify_clients.status()})
+
 @app.route('/e', methods=['GET', 'POST'])
 @app.route('/analytics/track', methods=['GET', 'POST'])
 def analytics():
@@ -1743,6 +4964,7 @@ def bookmarklet():
             this.currentIndex = 0;  // Initialize current review index
             this.pagination = {{ has_next: false, page: 1 }};  // Initialize pagination
             this.stats = {{ with_photos: 0, ai_recommended: 0 }};  // Initialize stats
+            this.cacheKey = null;  // Server-side review set handle (bulk import by ID)
             this.init();
         }}
         
@@ -2278,6 +5500,7 @@ def bookmarklet():
                     this.currentIndex = 0;
                     this.pagination = result.pagination;
                     this.stats = result.stats;
+                    this.cacheKey = result.cache_key;  // Server-side handle for import-by-reference
                     console.log('All reviews loaded:', this.allReviews.length);
                     this.applyFilter();  // Apply current filter and display
                 }} else {{
@@ -2710,7 +5933,10 @@ def bookmarklet():
                 
                 const result = await response.json();
                 
-                if (result.success) {{
+                if (result.success && result.already_imported) {{
+                    alert(`This review was already imported to "${{this.selectedProduct.title}}".`);
+                    this.nextReview();
+                }} else if (result.success) {{
                     // Track analytics
                     fetch(`${{API_URL}}/e?cat=Import+by+URL&a=Post+imported&c=${{this.sessionId}}`, 
                           {{ method: 'GET' }});
@@ -2766,7 +5992,8 @@ def bookmarklet():
                     method: 'POST',
                     headers: {{ 'Content-Type': 'application/json' }},
                     body: JSON.stringify({{
-                        reviews: this.reviews,
+                        review_ids: this.reviews.map(r => r.id),
+                        cache_key: this.cacheKey,
                         shopify_product_id: this.selectedProduct.id,
                         session_id: this.sessionId,
                         filters: {{
@@ -2782,10 +6009,13 @@ def bookmarklet():
                     fetch(`${{API_URL}}/e?cat=Import+by+URL&a=Bulk+imported&c=${{this.sessionId}}`, 
                           {{ method: 'GET' }});
                     
-                    alert(`🎉 Bulk import completed!\\n\\n` +
-                          `✅ Imported: ${{result.imported_count}}\\n` +
-                          `❌ Failed: ${{result.failed_count}}\\n` +
-                          `⏭️ Skipped: ${{result.skipped_count}}`);
+                    const job = await this.waitForImportJob(result.job_id);
+                    
+                    alert(`🎉 Bulk import ${{job.status}}!\\n\\n` +
+                          `✅ Imported: ${{job.imported}}\\n` +
+                          `❌ Failed: ${{job.failed}}\\n` +
+                          `⏭️ Skipped: ${{result.skipped_count}}\\n` +
+                          `🔁 Already imported: ${{result.already_imported_count || 0}}`);
                 }} else {{
                     alert('Bulk import failed: ' + result.error);
                 }}
@@ -2811,7 +6041,8 @@ def bookmarklet():
                     method: 'POST',
                     headers: {{ 'Content-Type': 'application/json' }},
                     body: JSON.stringify({{
-                        reviews: reviewsWithPhotos,
+                        review_ids: reviewsWithPhotos.map(r => r.id),
+                        cache_key: this.cacheKey,
                         shopify_product_id: this.selectedProduct.id,
                         session_id: this.sessionId
                     }})
@@ -2820,7 +6051,8 @@ def bookmarklet():
                 const result = await response.json();
                 
                 if (result.success) {{
-                    alert(`✅ Imported ${{result.imported_count}} reviews with photos!`);
+                    const job = await this.waitForImportJob(result.job_id);
+                    alert(`✅ Imported ${{job.imported}} reviews with photos!`);
                 }} else {{
                     alert('Import failed: ' + result.error);
                 }}
@@ -2846,7 +6078,8 @@ def bookmarklet():
                     method: 'POST',
                     headers: {{ 'Content-Type': 'application/json' }},
                     body: JSON.stringify({{
-                        reviews: reviewsWithoutPhotos,
+                        review_ids: reviewsWithoutPhotos.map(r => r.id),
+                        cache_key: this.cacheKey,
                         shopify_product_id: this.selectedProduct.id,
                         session_id: this.sessionId
                     }})
@@ -2855,7 +6088,8 @@ def bookmarklet():
                 const result = await response.json();
                 
                 if (result.success) {{
-                    alert(`✅ Imported ${{result.imported_count}} reviews without photos!`);
+                    const job = await this.waitForImportJob(result.job_id);
+                    alert(`✅ Imported ${{job.imported}} reviews without photos!`);
                 }} else {{
                     alert('Import failed: ' + result.error);
                 }}
@@ -2864,6 +6098,26 @@ def bookmarklet():
             }}
         }}
         
+        async waitForImportJob(jobId) {{
+            // Bulk imports run as background jobs - poll until the job settles
+            if (!jobId) {{
+                return {{ status: 'completed', imported: 0, processed: 0, total: 0 }};  // Nothing was queued
+            }}
+            const statusUrl = `${{API_URL}}/admin/reviews/import/jobs/${{jobId}}`;
+            while (true) {{
+                const response = await fetch(statusUrl);
+                const job = await response.json();
+                if (!job.success) {{
+                    throw new Error(job.error || 'Import job not found');
+                }}
+                console.log(`[Import] Job ${{jobId}}: ${{job.status}} ${{job.processed}}/${{job.total}} (${{job.percent}}%)`);
+                if (['completed', 'cancelled', 'failed', 'interrupted'].includes(job.status)) {{
+                    return job;
+                }}
+                await new Promise(resolve => setTimeout(resolve, 1000));
+            }}
+        }}
+        
         nextReview() {{
             if (this.currentIndex < this.reviews.length - 1) {{
                 this.currentIndex++;
@@ -3006,13 +6260,88 @@ def health():
 # SAKURA WIDGET SYSTEM - Superior to Loox
 # =============================================================================
 
+class RenderedWidgetCache:
+    """
+    Rendered widget HTML keyed by (shop, product, theme, limit, version)
+    Bounded by total bytes with LRU eviction; all variants of a product are dropped
+    together when its reviews change
+    """
+    
+    def __init__(self, max_bytes=32 * 1024 * 1024, ttl=300):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (utf-8 html, created_at)
+        self._by_product = {}  # (shop, product_id) -> set(keys)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+    
+    @staticmethod
+    def make_key(shop, product_id, shop_id, theme, limit, version):
+        """
+        shop is the storage key (what invalidate() is called with); shop_id is the id the
+        request used, which the HTML embeds in its analytics URLs, so it is part of the key
+        """
+        return (shop, str(product_id), shop_id, theme, limit, version)
+    
+    def _drop_locked(self, key):
+        html, _ = self._entries.pop(key)
+        self._bytes -= len(html)
+        keys = self._by_product.get(key[:2])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_product[key[:2]]
+    
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[1] > self.ttl:
+                if entry is not None:
+                    self._drop_locked(key)
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry[0]
+    
+    def put(self, key, html):
+        html = html.encode('utf-8') if isinstance(html, str) else html
+        if len(html) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop_locked(key)
+            self._entries[key] = (html, time.time())
+            self._by_product.setdefault(key[:2], set()).add(key)
+            self._bytes += len(html)
+            while self._bytes > self.max_bytes:
+                self._drop_locked(next(iter(self._entries)))
+                self.stats['evictions'] += 1
+    
+    def invalidate(self, shop, product_id):
+        """Drop every rendered variant of one product's widget"""
+        with self._lock:
+            for key in list(self._by_product.get((shop, str(product_id)), ())):
+                self._drop_locked(key)
+                self.stats['invalidations'] += 1
+    
+    def status(self):
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return dict(self.stats,
+                        entries=len(self._entries),
+                        bytes=self._bytes,
+                        max_bytes=self.max_bytes,
+                        hit_ratio=round(self.stats['hits'] / lookups, 4) if lookups else None)
+
 class SakuraWidgetSystem:
     """
     Superior widget system that crushes Loox
     """
     
     def __init__(self):
-        self.widget_cache = {}
+        self.widget_cache = RenderedWidgetCache(Config.WIDGET_CACHE_MAX_BYTES, Config.WIDGET_CACHE_TTL)
         self.payment_status = {}
         self.analytics = {}
     
@@ -3106,6 +6435,219 @@ class SakuraWidgetSystem:
 # Initialize widget system
 widget_system = SakuraWidgetSystem()
 
+class WidgetSnapshotPublisher:
+    """
+    Writes each product's widget HTML and page JSON to a static directory tree
+    <root>/<shop>/<product>/ holds content-hashed files (immutable, cache forever) and
+    a small manifest.json pointing at the current ones; every file is written to a temp
+    name and renamed into place, so a static server never sees a partial file
+    """
+    
+    def __init__(self, root_dir, base_url=''):
+        self.root_dir = root_dir
+        self.base_url = base_url.rstrip('/')
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='widget-snapshot')
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._publish_lock = threading.Lock()  # Worker and admin publishes share manifest/prune state
+        self.stats = {'published': 0, 'unpublished': 0, 'errors': 0}
+    
+    @property
+    def enabled(self):
+        return bool(self.root_dir)
+    
+    @staticmethod
+    def _safe(name):
+        safe = re.sub(r'[^A-Za-z0-9._-]', '_', str(name))
+        if safe in ('', '.', '..'):
+            raise ValueError(f"Invalid snapshot path component: {name!r}")
+        return safe
+    
+    def _relative_dir(self, shop, product_id):
+        return f"{self._safe(shop)}/{self._safe(product_id)}"
+    
+    @staticmethod
+    def _atomic_write(path, data):
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    
+    def _write_hashed(self, directory, stem, extension, data):
+        """Content-addressed file: identical content keeps its name, so unchanged pages stay cached"""
+        name = f"{stem}.{hashlib.sha256(data).hexdigest()[:16]}.{extension}"
+        path = os.path.join(directory, name)
+        if not os.path.exists(path):
+            self._atomic_write(path, data)
+        return name
+    
+    def schedule(self, shop, product_id):
+        """Queue a publish after reviews change; repeated changes to one product coalesce"""
+        if not self.enabled:
+            return
+        key = (shop, str(product_id))
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+        self._executor.submit(self._run, key)
+    
+    def _run(self, key):
+        with self._lock:
+            self._pending.discard(key)  # Changes from here on queue another publish
+        try:
+            self.publish(*key)
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.error(f"Widget snapshot error for {key}: {str(e)}")
+    
+    def publish(self, shop, product_id):
+        """Write the product's current widget snapshot; returns its manifest (None if it has no reviews)"""
+        with self._publish_lock:
+            return self._publish_locked(shop, product_id)
+    
+    def _publish_locked(self, shop, product_id):
+        relative_dir = self._relative_dir(shop, product_id)
+        directory = os.path.join(self.root_dir, relative_dir)
+        manifest_path = os.path.join(directory, 'manifest.json')
+        
+        old = None
+        if os.path.exists(manifest_path):
+            try:
+                with open(manifest_path, encoding='utf-8') as f:
+                    old = json.load(f)
+            except (OSError, ValueError):
+                old = None
+        revision, updated_at = widget_read_model.get_revision(shop, product_id)
+        if old and old.get('revision') == revision:
+            return old  # Already published this version
+        
+        first = widget_read_model.get_page(shop, product_id, 1)
+        if not first:
+            # No reviews left: drop the manifest so the storefront falls back to widget_reviews
+            if os.path.exists(manifest_path):
+                os.remove(manifest_path)
+                self._prune(directory, set())
+                self.stats['unpublished'] += 1
+            return None
+        
+        os.makedirs(directory, exist_ok=True)
+        with app.test_request_context():
+            # Served from the snapshot host, so API calls need the app's absolute URL
+            html = render_template('widget.html',
+                                   shop_id=shop,
+                                   product_id=product_id,
+                                   reviews=first['reviews'],
+                                   summary=first['summary'],
+                                   theme='default',
+                                   version=None,
+                                   api_base=Config.WIDGET_BASE_URL)
+        html_name = self._write_hashed(directory, 'widget', 'html', html.encode('utf-8'))
+        
+        page_names = []
+        for page in range(1, first['pages'] + 1):
+            data = first if page == 1 else widget_read_model.get_page(shop, product_id, page)
+            if not data:
+                break
+            body = json.dumps({
+                'success': True,
+                'reviews': data['reviews'],
+                'total': data['summary']['count'],
+                'summary': data['summary'],
+                'page': page,
+                'pages': data['pages'],
+                'shop_id': shop,
+                'product_id': str(product_id)
+            }, sort_keys=True)
+            page_names.append(self._write_hashed(directory, f"page-{page}", 'json', body.encode('utf-8')))
+        
+        base = f"{self.base_url}/{relative_dir}" if self.base_url else relative_dir
+        manifest = {
+            'revision': revision,
+            'updated_at': updated_at,
+            'published_at': datetime.now().isoformat(),
+            'html': f"{base}/{html_name}",
+            'pages': [f"{base}/{name}" for name in page_names],
+            'summary': first['summary']
+        }
+        
+        # Keep the previous generation too: clients may still hold the old manifest
+        previous = {url.rsplit('/', 1)[-1] for url in [old.get('html', '')] + old.get('pages', [])} if old else set()
+        self._atomic_write(manifest_path, json.dumps(manifest).encode('utf-8'))
+        self._prune(directory, previous | {html_name} | set(page_names))
+        self.stats['published'] += 1
+        return manifest
+    
+    def _prune(self, directory, keep):
+        """Remove hashed files that no live or previous manifest references"""
+        if not os.path.isdir(directory):
+            return
+        for name in os.listdir(directory):
+            if name != 'manifest.json' and not name.endswith('.tmp') and name not in keep:
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
+    
+    def status(self):
+        with self._lock:
+            pending = len(self._pending)
+        return dict(self.stats, enabled=self.enabled, root_dir=self.root_dir, pending=pending)
+
+# Initialize snapshot publisher
+widget_snapshots = WidgetSnapshotPublisher(Config.WIDGET_SNAPSHOT_DIR, Config.WIDGET_SNAPSHOT_BASE_URL)
+
+def template_fingerprint(names):
+    """Digest of the given templates' source (missing templates are skipped)"""
+    digest = hashlib.blake2b(digest_size=4)
+    for name in names:
+        try:
+            digest.update(app.jinja_loader.get_source(app.jinja_env, name)[0].encode('utf-8'))
+        except TemplateNotFound:
+            pass
+    return digest.hexdigest()
+
+# Part of every widget ETag: a deploy that changes the app or the widget markup changes them all
+WIDGET_BUILD_VERSION = f"{Config.API_VERSION}-{template_fingerprint(WIDGET_TEMPLATES)}"
+
+def widget_validators(shop_id, product_id):
+    """
+    Weak ETag and Last-Modified for a widget response
+    The ETag combines the build version, the product's review revision and the
+    content-affecting query params (signature/timestamp excluded), so it changes exactly
+    when the output does. Products not in the read model yet (revision 0) get no
+    validators: their fallback output changes without a revision bump
+    """
+    revision, updated_at = widget_read_model.get_revision(shop_key(shop_id), product_id)
+    if not revision:
+        return None, None
+    variant = sorted((k, v) for k, v in request.args.items(multi=True) if k not in ('s', 't'))
+    digest = hashlib.blake2b(repr((WIDGET_BUILD_VERSION, shop_id, str(product_id), variant)).encode(),
+                             digest_size=8).hexdigest()
+    last_modified = datetime.fromisoformat(updated_at).astimezone(timezone.utc) if updated_at else None
+    return f"r{revision}-{digest}", last_modified
+
+def widget_not_modified(etag, last_modified, cache_control):
+    """304 response if the client already holds this version, else None"""
+    if etag is None:
+        return None
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    response = app.response_class(status=304)
+    return with_widget_cache_headers(response, etag, last_modified, cache_control)
+
+def with_widget_cache_headers(response, etag, last_modified, cache_control):
+    if etag is None:
+        response.headers['Cache-Control'] = 'no-store'  # Unversioned fallback output
+        return response
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = cache_control
+    return response
+
 @app.route('/widget/<shop_id>/reviews/<product_id>')
 def widget_reviews(shop_id, product_id):
     """
@@ -3116,29 +6658,129 @@ def widget_reviews(shop_id, product_id):
     timestamp = request.args.get('t')
     version = request.args.get('v')
     theme = request.args.get('theme', 'default')
-    limit = int(request.args.get('limit', 20))
+    limit = min(max(1, request.args.get('limit', 20, type=int)), Config.WIDGET_MAX_LIMIT)
     
-    # Check payment status (for now, always allow)
+    # Check payment status (cached entitlement)
     if not check_payment_status(shop_id):
         return render_template('widget_payment_required.html', 
                              shop_id=shop_id, 
                              upgrade_url=f"{Config.WIDGET_BASE_URL}/billing")
     
-    # Get reviews for this product (for now, use sample data)
-    reviews = get_product_reviews(product_id, limit)
+    # Repeat visits revalidate with If-None-Match and get an empty 304
+    etag, last_modified = widget_validators(shop_id, product_id)
+    not_modified = widget_not_modified(etag, last_modified, Config.WIDGET_CACHE_CONTROL)
+    if not_modified:
+        return not_modified
+    
+    # Long lists stream: the header and first reviews go out while later reviews are still being read
+    stream = request.args.get('stream')
+    if stream == '1' or (stream != '0' and limit >= Config.WIDGET_STREAM_MIN_LIMIT):
+        response = stream_widget(shop_id, product_id, theme, limit, version)
+        if response is not None:
+            return with_widget_cache_headers(response, etag, last_modified, Config.WIDGET_CACHE_CONTROL)
+    
+    # Popular products are served from the rendered-HTML cache (no template render)
+    cache_key = widget_system.widget_cache.make_key(shop_key(shop_id), product_id, shop_id, theme, limit, version)
+    html = widget_system.widget_cache.get(cache_key)
+    if html is None:
+        # Get reviews + summary for this product (one keyed read of a precomputed page)
+        review_data = get_product_review_data(product_id, limit, shop=shop_id)
+        
+        # Render widget
+        html = render_template('widget.html', 
+                             shop_id=shop_id,
+                             product_id=product_id,
+                             reviews=review_data['reviews'],
+                             summary=review_data['summary'],
+                             theme=theme,
+                             version=version)
+        widget_system.widget_cache.put(cache_key, html)
+    return with_widget_cache_headers(app.make_response(html), etag, last_modified, Config.WIDGET_CACHE_CONTROL)
+
+def iter_widget_reviews(shop, product_id, limit, chunk_size):
+    """Reviews in quality order, read from the read model one chunk at a time"""
+    after = None
+    while limit > 0:
+        size = min(chunk_size, limit)
+        rows = widget_read_model.get_reviews(shop, product_id, 'quality', after, size)
+        for _, review_json in rows:
+            yield json.loads(review_json)
+        if len(rows) < size:
+            return
+        limit -= size
+        after = rows[-1][0]
+
+def coalesce_chunks(pieces, chunk_bytes):
+    """Join Jinja's many small output events into socket-sized UTF-8 chunks"""
+    buffer, size = [], 0
+    for piece in pieces:
+        data = piece.encode('utf-8')
+        buffer.append(data)
+        size += len(data)
+        if size >= chunk_bytes:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+def stream_widget(shop_id, product_id, theme, limit, version):
+    """
+    Streaming render of widget.html (never holds the whole page or review list)
+    Returns None for products not in the read model; those render normally
+    Streamed pages bypass the rendered-HTML cache, which is sized for regular widgets
+    """
+    shop = shop_key(shop_id)
+    summary = widget_read_model.get_summary(shop, product_id)
+    if not summary or not summary['count']:
+        return None
     
-    # Render widget
-    return render_template('widget.html', 
-                         shop_id=shop_id,
-                         product_id=product_id,
-                         reviews=reviews,
-                         theme=theme,
-                         version=version)
+    context = {
+        'shop_id': shop_id,
+        'product_id': product_id,
+        'reviews': iter_widget_reviews(shop, product_id, limit, Config.WIDGET_PAGE_SIZE),
+        'summary': summary,
+        'theme': theme,
+        'version': version
+    }
+    app.update_template_context(context)
+    pieces = app.jinja_env.get_template('widget.html').generate(context)
+    response = Response(stream_with_context(coalesce_chunks(pieces, Config.WIDGET_STREAM_CHUNK_BYTES)),
+                        mimetype='text/html')
+    response.headers['X-Accel-Buffering'] = 'no'  # Let nginx pass chunks straight through
+    return response
+
+WIDGET_REVIEW_FIELDS = ('id', 'rating', 'text', 'author', 'date', 'verified', 'images', 'ai_score')
+
+def encode_widget_cursor(sort, key):
+    return base64.urlsafe_b64encode(json.dumps({'s': sort, 'k': key}, separators=(',', ':')).encode()).decode().rstrip('=')
+
+def decode_widget_cursor(cursor, sort):
+    """Sort key to continue after; raises ValueError for malformed or mismatched cursors"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        key = data['k']
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if data.get('s') != sort:
+        raise ValueError('Cursor belongs to a different sort order')
+    if not isinstance(key, list) or len(key) != len(WidgetReadModel.SORT_KEYS[sort]):
+        raise ValueError('Invalid cursor')
+    return key
+
+def project_review(review, fields):
+    return {k: review.get(k) for k in fields} if fields else review
 
 @app.route('/widget/<shop_id>/reviews/<product_id>/api')
 def widget_api(shop_id, product_id):
     """
     API endpoint for widget data
+    
+    Query params:
+    - sort: quality (default), newest or photos
+    - limit: Reviews per page (default WIDGET_PAGE_SIZE, max WIDGET_API_MAX_LIMIT)
+    - cursor: next_cursor from the previous response
+    - fields: Comma-separated review fields to return (id is always included)
+    - page: Legacy precomputed page number (WIDGET_PAGE_SIZE reviews each, quality order)
     """
     # Check payment status
     if not check_payment_status(shop_id):
@@ -3147,43 +6789,226 @@ def widget_api(shop_id, product_id):
             'upgrade_url': f"{Config.WIDGET_BASE_URL}/billing"
         }), 402
     
-    reviews = get_product_reviews(product_id)
+    sort = request.args.get('sort', 'quality')
+    if sort not in WidgetReadModel.SORT_ORDERS:
+        return jsonify({'success': False, 'error': f"sort must be one of: {', '.join(WidgetReadModel.SORT_ORDERS)}"}), 400
+    fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()]
+    unknown = [f for f in fields if f not in WIDGET_REVIEW_FIELDS]
+    if unknown:
+        return jsonify({'success': False, 'error': f"Unknown fields: {', '.join(unknown)}"}), 400
+    if fields and 'id' not in fields:
+        fields.insert(0, 'id')
+    limit = min(max(1, request.args.get('limit', Config.WIDGET_PAGE_SIZE, type=int)), Config.WIDGET_API_MAX_LIMIT)
+    cursor = request.args.get('cursor')
+    try:
+        after = decode_widget_cursor(cursor, sort) if cursor else None
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    etag, last_modified = widget_validators(shop_id, product_id)
+    not_modified = widget_not_modified(etag, last_modified, Config.WIDGET_API_CACHE_CONTROL)
+    if not_modified:
+        return not_modified
     
-    return jsonify({
+    shop = shop_key(shop_id)
+    revision, _ = widget_read_model.get_revision(shop, product_id)
+    if 'page' in request.args or not revision:
+        # Legacy page numbers, and products not in the read model yet
+        page = max(1, request.args.get('page', 1, type=int))
+        review_data = get_product_review_data(product_id, limit=Config.WIDGET_PAGE_SIZE, shop=shop_id, page=page)
+        reviews = review_data['reviews']
+        summary = review_data['summary']
+        payload = {
+            'success': True,
+            'reviews': [project_review(r, fields) for r in reviews],
+            'total': summary['count'] if summary else len(reviews),
+            'summary': summary,
+            'page': review_data.get('page', page),
+            'pages': review_data.get('pages', 1),
+            'next_cursor': None,
+            'shop_id': shop_id,
+            'product_id': product_id
+        }
+    else:
+        # Cursor page: one seek + range scan on the sort's index, one extra row to detect more
+        rows = widget_read_model.get_reviews(shop, product_id, sort, after, limit + 1)
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        summary = widget_read_model.get_summaries(shop, [product_id]).get(str(product_id), (None, 0))[0] if not cursor else None
+        payload = {
+            'success': True,
+            'reviews': [project_review(json.loads(review_json), fields) for _, review_json in rows],
+            'sort': sort,
+            'next_cursor': encode_widget_cursor(sort, rows[-1][0]) if has_more else None,
+            'shop_id': shop_id,
+            'product_id': product_id
+        }
+        if summary:  # First page only; later pages stay small
+            payload['summary'] = summary
+            payload['total'] = summary['count']
+    
+    response = jsonify(payload)
+    return with_widget_cache_headers(response, etag, last_modified, Config.WIDGET_API_CACHE_CONTROL)
+
+# Where the ScriptTag loader mounts the inline widget (first match wins, then <body>)
+SCRIPTTAG_INJECTION_SELECTORS = (
+    '#MainContent',
+    '.product-single__description',
+    '.product-description',
+    '.product-content',
+    '.product-details',
+    '.product-info',
+    'main',
+    '.main-content'
+)
+
+@app.route('/widget/<shop_id>/bootstrap/<product_id>')
+def widget_bootstrap(shop_id, product_id):
+    """
+    Everything the ScriptTag loader needs to render inline, in one request:
+    injection config, summary stats and the first page of reviews
+    Products not in the read model yet get a 404 (the loader falls back to the iframe
+    widget) while their reviews are backfilled from Shopify
+    
+    Query params:
+    - limit: Reviews in the first page (default WIDGET_PAGE_SIZE, max WIDGET_API_MAX_LIMIT)
+    - theme: Widget theme (default: default)
+    """
+    if not check_payment_status(shop_id):
+        return jsonify({
+            'error': 'Payment required',
+            'upgrade_url': f"{Config.WIDGET_BASE_URL}/billing"
+        }), 402
+    
+    limit = min(max(1, request.args.get('limit', Config.WIDGET_PAGE_SIZE, type=int)), Config.WIDGET_API_MAX_LIMIT)
+    theme = request.args.get('theme', 'default')
+    
+    shop = shop_key(shop_id)
+    if not widget_read_model.get_revision(shop, product_id)[0]:
+        if shopify_client_for(shop_id).is_configured():
+            widget_backfill.schedule(shop, product_id)
+        response = jsonify({'success': False, 'error': 'Reviews not available inline yet',
+                            'widget_url': widget_system.generate_widget_url(shop_id, product_id, theme, limit)})
+        return with_widget_cache_headers(response, None, None, None), 404
+    
+    etag, last_modified = widget_validators(shop_id, product_id)
+    not_modified = widget_not_modified(etag, last_modified, Config.WIDGET_API_CACHE_CONTROL)
+    if not_modified:
+        return not_modified
+    
+    summary = widget_read_model.get_summary(shop, product_id)
+    rows = widget_read_model.get_reviews(shop, product_id, 'quality', None, limit + 1) if summary else []
+    response = jsonify({
         'success': True,
-        'reviews': reviews,
-        'total': len(reviews),
-        'shop_id': shop_id,
-        'product_id': product_id
+        'config': {
+            'theme': theme,
+            'title': 'Customer Reviews',
+            'limit': limit,
+            'selectors': SCRIPTTAG_INJECTION_SELECTORS,
+            'api_url': f"{Config.WIDGET_BASE_URL}/widget/{shop_id}/reviews/{product_id}/api",
+            'widget_url': widget_system.generate_widget_url(shop_id, product_id, theme, limit)
+        },
+        'summary': {key: summary[key] for key in ('count', 'average', 'histogram', 'photo_count')} if summary else None,
+        'reviews': [json.loads(review_json) for _, review_json in rows[:limit]],
+        'next_cursor': encode_widget_cursor('quality', rows[limit - 1][0]) if len(rows) > limit else None
     })
+    return with_widget_cache_headers(response, etag, last_modified, Config.WIDGET_API_CACHE_CONTROL)
+
+@app.route('/widget/<shop_id>/summaries')
+def widget_summaries(shop_id):
+    """
+    Star-rating summaries for many products at once (collection / search pages)
+    
+    Query params:
+    - product_ids: Comma-separated product IDs (up to WIDGET_SUMMARY_MAX_PRODUCTS)
+    """
+    if not check_payment_status(shop_id):
+        return jsonify({
+            'error': 'Payment required',
+            'upgrade_url': f"{Config.WIDGET_BASE_URL}/billing"
+        }), 402
+    
+    product_ids = list(dict.fromkeys(pid.strip() for pid in request.args.get('product_ids', '').split(',') if pid.strip()))
+    if not product_ids:
+        return jsonify({'success': False, 'error': 'product_ids required'}), 400
+    if len(product_ids) > Config.WIDGET_SUMMARY_MAX_PRODUCTS:
+        return jsonify({'success': False, 'error': f'At most {Config.WIDGET_SUMMARY_MAX_PRODUCTS} product_ids per request'}), 400
+    
+    stored = widget_read_model.get_summaries(shop_key(shop_id), product_ids)
+    empty_histogram = {str(star): 0 for star in range(1, 6)}
+    summaries = {}
+    for product_id in product_ids:
+        summary, _ = stored.get(product_id, (None, 0))
+        summaries[product_id] = {
+            'count': summary['count'],
+            'average': summary['average'],
+            'histogram': summary['histogram'],
+            'photo_count': summary.get('photo_count', 0)
+        } if summary else {'count': 0, 'average': 0, 'histogram': empty_histogram, 'photo_count': 0}
+    
+    # Versioned by every requested product's revision
+    revisions = [(pid, stored.get(pid, (None, 0))[1]) for pid in product_ids]
+    etag = hashlib.blake2b(repr((WIDGET_BUILD_VERSION, revisions)).encode(), digest_size=8).hexdigest()
+    not_modified = widget_not_modified(etag, None, Config.WIDGET_API_CACHE_CONTROL)
+    if not_modified:
+        return not_modified
+    
+    response = jsonify({'success': True, 'shop_id': shop_id, 'summaries': summaries})
+    return with_widget_cache_headers(response, etag, None, Config.WIDGET_API_CACHE_CONTROL)
 
 def check_payment_status(shop_id):
     """
     Check if shop has active subscription
+    Answered in-process by the entitlement cache (never a Shopify Billing round trip);
+    always True when BILLING_REQUIRED is off
+    """
+    if not Config.BILLING_REQUIRED:
+        return True
+    return entitlements.is_entitled(shop_key(shop_id))
+
+def get_product_review_data(product_id, limit=20, shop=None, page=1):
     """
-    # For now, always return True for testing
-    # In production, check against Shopify billing API
-    return True
+    Get reviews and summary for a specific product
+    Served from the widget read model (one keyed lookup of a precomputed page).
+    Products missing from it are filled from their Shopify review document in the
+    background; the request itself never calls the Admin API
+    """
+    stored = widget_read_model.get_page(shop_key(shop), product_id, page)
+    if stored:
+        reviews = stored['reviews'][:limit]
+        if page == 1 and len(reviews) < limit and stored['pages'] > 1:
+            # Longer than one precomputed page: same cursor read the streamed widget uses
+            reviews = list(iter_widget_reviews(shop_key(shop), product_id, limit, Config.WIDGET_PAGE_SIZE))
+        return {'reviews': reviews, 'summary': stored['summary'],
+                'page': stored['page'], 'pages': stored['pages']}
+    
+    if shopify_client_for(shop).is_configured():
+        widget_backfill.schedule(shop_key(shop), product_id)
+        return {'reviews': [], 'summary': None, 'pending': True}
+    
+    # Shopify not configured (local demo): sample data
+    return {
+        'reviews': [
+            {
+                'id': f'review_{i}',
+                'rating': random.randint(3, 5),
+                'text': f'This is a sample review {i} for testing the widget system. The product is amazing!',
+                'author': f'Customer {i}',
+                'date': datetime.now().strftime('%Y-%m-%d'),
+                'verified': random.choice([True, False]),
+                'images': [],
+                'ai_score': round(random.uniform(6.0, 10.0), 1)
+            }
+            for i in range(1, min(limit + 1, 21))
+        ],
+        'summary': None
+    }
 
 def get_product_reviews(product_id, limit=20):
     """
     Get reviews for a specific product
     """
-    # For now, return sample data
-    # In production, fetch from your database
-    return [
-        {
-            'id': f'review_{i}',
-            'rating': random.randint(3, 5),
-            'text': f'This is a sample review {i} for testing the widget system. The product is amazing!',
-            'author': f'Customer {i}',
-            'date': datetime.now().strftime('%Y-%m-%d'),
-            'verified': random.choice([True, False]),
-            'images': [],
-            'ai_score': round(random.uniform(6.0, 10.0), 1)
-        }
-        for i in range(1, min(limit + 1, 21))
-    ]
+    return get_product_review_data(product_id, limit)['reviews']
 
 # Shopify App Block Integration
 @app.route('/app-blocks')
@@ -3251,6 +7076,12 @@ def sakura_reviews_block():
     
     widget_url = widget_system.generate_widget_url(shop_id, product_id, theme, limit)
     
+    # Star line in the block header straight from the stored aggregates
+    summary = widget_read_model.get_summary(shop_key(shop_id), product_id)
+    rating_line = (f'<p class="sakura-reviews-rating">{"★" * round(summary["average"])} '
+                   f'{summary["average"]:.1f} from {summary["count"]} reviews</p>'
+                   if summary and summary['count'] else '')
+    
     # Create unique IDs for the widget (like Loox)
     section_id = f"sakura-reviews-section-{shop_id}-{product_id}"
     widget_id = f"sakuraReviews-{shop_id}-{product_id}"
@@ -3262,6 +7093,7 @@ def sakura_reviews_block():
     <section id="{section_id}" class="sakura-reviews-widget sakura-theme-{theme}">
         <div class="sakura-reviews-header">
             <h2 class="sakura-reviews-title">{title}</h2>
+            {rating_line}
         </div>
         
         <div id="{widget_id}" class="sakura-reviews-container" data-limit="{limit}" data-product-id="{product_id}">
@@ -3304,6 +7136,11 @@ def sakura_reviews_block():
         margin: 0;
     }}
     
+    .sakura-reviews-rating {{
+        margin: 8px 0 0;
+        font-size: 16px;
+    }}
+    
     .sakura-reviews-container {{
         position: relative;
         background: white;
@@ -3891,7 +7728,8 @@ def sakura_reviews_js():
         shopId: window.Shopify?.shop || 'demo-shop',
         productId: window.ShopifyAnalytics?.meta?.product?.id || null,
         theme: 'default',
-        limit: 20
+        limit: 20,
+        selectors: __INJECTION_SELECTORS__
     };
     
     // Check if we're on a product page
@@ -3989,25 +7827,109 @@ def sakura_reviews_js():
         `;
     }
     
-    // Find the best place to inject reviews
-    function findInjectionPoint() {
-        // Try to find #MainContent first (most themes)
-        let target = document.querySelector('#MainContent');
-        if (target) return target;
-        
-        // Try common product content selectors
-        const selectors = [
-            '.product-single__description',
-            '.product-description',
-            '.product-content',
-            '.product-details',
-            '.product-info',
-            'main',
-            '.main-content'
-        ];
+    function escapeHtml(value) {
+        return String(value ?? '').replace(/[&<>"']/g, c => ({
+            '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+        })[c]);
+    }
+    
+    // One request for config, summary and the first page (no iframe round trip)
+    async function fetchBootstrap() {
+        const params = new URLSearchParams({ theme: SAKURA_CONFIG.theme, limit: SAKURA_CONFIG.limit });
+        const response = await fetch(
+            `${SAKURA_CONFIG.apiUrl}/widget/${encodeURIComponent(SAKURA_CONFIG.shopId)}/bootstrap/${encodeURIComponent(SAKURA_CONFIG.productId)}?${params}`
+        );
+        if (response.status === 402) return null;  // No active plan: render nothing
+        // 404: reviews not indexed yet; like any other failure the caller uses the iframe widget
+        if (!response.ok) throw new Error(`Bootstrap failed: ${response.status}`);
+        return response.json();
+    }
+    
+    function renderReviewCards(reviews) {
+        return reviews.map(review => `
+            <div class="sakura-review-card">
+                <div class="sakura-review-header">
+                    <span class="sakura-review-author">${escapeHtml(review.author || 'Anonymous')}</span>
+                    <span class="sakura-review-stars">${'★'.repeat(review.rating || 0)}</span>
+                    <span class="sakura-review-date">${escapeHtml(review.date)}</span>
+                </div>
+                <p class="sakura-review-text">${escapeHtml(review.text)}</p>
+                ${review.verified ? '<span class="sakura-review-badge">✓ Verified</span>' : ''}
+            </div>
+        `).join('');
+    }
+    
+    // Inline review section built from the bootstrap document
+    function createInlineSection(data) {
+        const sectionId = `sakura-reviews-${SAKURA_CONFIG.shopId}-${SAKURA_CONFIG.productId}`;
+        const summary = data.summary;
+        const stats = summary && summary.count
+            ? `<p class="sakura-reviews-rating">${'★'.repeat(Math.round(summary.average))} ${summary.average.toFixed(1)} from ${summary.count} reviews</p>`
+            : '';
         
+        return `
+            <section id="${sectionId}" class="sakura-reviews-widget sakura-auto-injected sakura-theme-${escapeHtml(data.config.theme)}">
+                <div class="sakura-reviews-header">
+                    <h2 class="sakura-reviews-title">${escapeHtml(data.config.title)}</h2>
+                    ${stats}
+                </div>
+                <div class="sakura-reviews-container" data-product-id="${SAKURA_CONFIG.productId}">
+                    <div class="sakura-review-list">
+                        ${data.reviews.length ? renderReviewCards(data.reviews) : '<p class="sakura-review-empty">No reviews yet</p>'}
+                    </div>
+                    ${data.next_cursor ? '<button type="button" class="sakura-load-more">Show more reviews</button>' : ''}
+                </div>
+            </section>
+            
+            <style>
+            .sakura-reviews-widget { margin: 40px 0; border-radius: 12px; overflow: hidden; box-shadow: 0 4px 20px rgba(0,0,0,0.1); background: white; }
+            .sakura-reviews-header { background: linear-gradient(135deg, #ff69b4, #8b4a8b); color: white; padding: 20px; text-align: center; }
+            .sakura-reviews-title { font-size: 24px; font-weight: 700; margin: 0; }
+            .sakura-reviews-rating { margin: 8px 0 0; font-size: 16px; }
+            .sakura-reviews-container { position: relative; background: white; margin: 0px auto; max-width: 1080px; padding: 10px 20px 20px; }
+            .sakura-review-card { border-bottom: 1px solid #f0e0ea; padding: 16px 0; }
+            .sakura-review-header { display: flex; gap: 12px; align-items: baseline; flex-wrap: wrap; }
+            .sakura-review-author { font-weight: 600; }
+            .sakura-review-stars { color: #ff69b4; }
+            .sakura-review-date { color: #888; font-size: 13px; }
+            .sakura-review-text { margin: 8px 0; line-height: 1.5; }
+            .sakura-review-badge { font-size: 12px; color: #2e7d32; }
+            .sakura-load-more { display: block; margin: 16px auto 0; padding: 10px 24px; border: 1px solid #ff69b4; border-radius: 20px; background: white; color: #8b4a8b; cursor: pointer; }
+            </style>
+        `;
+    }
+    
+    // Later pages come from the cursor API
+    function bindLoadMore(wrapper, data) {
+        const button = wrapper.querySelector('.sakura-load-more');
+        if (!button) return;
+        
+        let cursor = data.next_cursor;
+        button.addEventListener('click', async function() {
+            button.disabled = true;
+            try {
+                const params = new URLSearchParams({ cursor: cursor, limit: data.config.limit });
+                const response = await fetch(`${data.config.api_url}?${params}`);
+                if (response.status === 402) {  // Plan lapsed since the page loaded: stop offering more
+                    button.remove();
+                    return;
+                }
+                if (!response.ok) throw new Error(`Load more failed: ${response.status}`);
+                const page = await response.json();
+                wrapper.querySelector('.sakura-review-list').insertAdjacentHTML('beforeend', renderReviewCards(page.reviews || []));
+                cursor = page.next_cursor;
+            } catch (error) {
+                console.warn('🌸 Sakura Reviews: Could not load more reviews', error);
+            }
+            button.disabled = false;
+            if (!cursor) button.remove();
+        });
+    }
+    
+    // Find the best place to inject reviews
+    function findInjectionPoint(selectors) {
         for (const selector of selectors) {
-            target = document.querySelector(selector);
+            const target = document.querySelector(selector);
             if (target) return target;
         }
         
@@ -4016,7 +7938,7 @@ def sakura_reviews_js():
     }
     
     // Inject review section
-    function injectReviews() {
+    async function injectReviews() {
         if (!isProductPage()) return;
         
         // Check if already injected
@@ -4025,18 +7947,30 @@ def sakura_reviews_js():
             return;
         }
         
-        const injectionPoint = findInjectionPoint();
+        const reviewSection = document.createElement('div');
+        let data = null;
+        try {
+            data = await fetchBootstrap();
+            if (!data) return;
+            reviewSection.innerHTML = createInlineSection(data);
+        } catch (error) {
+            // Bootstrap unavailable: fall back to the iframe widget
+            console.warn('🌸 Sakura Reviews: inline render failed, using iframe', error);
+            reviewSection.innerHTML = createReviewSection();
+        }
+        
+        // Another call may have finished while this one was waiting on the network
+        if (document.querySelector('.sakura-auto-injected')) return;
+        
+        const injectionPoint = findInjectionPoint(data ? data.config.selectors : SAKURA_CONFIG.selectors);
         if (!injectionPoint) {
             console.warn('🌸 Sakura Reviews: Could not find injection point');
             return;
         }
         
-        // Create and inject the review section
-        const reviewSection = document.createElement('div');
-        reviewSection.innerHTML = createReviewSection();
-        
         // Insert after the main content
         injectionPoint.appendChild(reviewSection);
+        if (data) bindLoadMore(reviewSection, data);
         
         console.log('🌸 Sakura Reviews injected successfully via ScriptTag');
     }
@@ -4055,7 +7989,8 @@ def sakura_reviews_js():
 """
     
     # Replace placeholder with actual base URL
-    formatted_js = js_code.replace('__WIDGET_BASE_URL__', Config.WIDGET_BASE_URL)
+    formatted_js = (js_code.replace('__WIDGET_BASE_URL__', Config.WIDGET_BASE_URL)
+                    .replace('__INJECTION_SELECTORS__', json.dumps(SCRIPTTAG_INJECTION_SELECTORS)))
     
     return formatted_js, 200, {'Content-Type': 'application/javascript'}
 
@@ -4074,7 +8009,7 @@ def create_scripttag():
             return jsonify({'error': 'Missing shop_domain or access_token'}), 400
         
         # Create ScriptTag via Shopify API
-        scripttag_url = f"https://{shop_domain}/admin/api/2025-10/script_tags.json"
+        scripttag_url = f"{shopify_admin_url(shop_domain, Config.SHOPIFY_API_VERSION)}/script_tags.json"
         headers = {
             'X-Shopify-Access-Token': access_token,
             'Content-Type': 'application/json'
@@ -4088,10 +8023,11 @@ def create_scripttag():
         }
         
         # Make request to Shopify API
-        import requests
-        response = requests.post(scripttag_url, headers=headers, json=scripttag_data)
+        response = shopify_transport.request(shop_domain, 'POST', scripttag_url, headers=headers, json=scripttag_data)
         
         if response.status_code == 201:
+            # Installed: later API calls for this shop resolve through the client registry
+            shopify_clients.register(shop_domain, access_token)
             return jsonify({
                 'success': True,
                 'message': 'ScriptTag created successfully',
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Benchmark near-duplicate review detection (MinHash/LSH)
+Generates a synthetic seller-wide harvest with templated/copy-pasted texts
+and reports timings for signatures, bucketing and the full stage.
+
+Usage: python benchmark_near_duplicates.py [count] [threshold]
+"""
+
+import random
+import sys
+import time
+
+from app_enhanced import NearDuplicateDetector
+
+WORDS = ("good great quality fast shipping item product price seller recommend color size "
+         "fits perfect love nice cheap material soft strong delivery package arrived "
+         "described photo works fine happy buy again daughter gift box small large").split()
+
+TEMPLATES = [
+    "Great quality! Fast shipping and exactly as described. Very happy with this purchase.",
+    "The item arrived well packaged, matches the photos, good value for the price.",
+    "Everything is fine, the seller is responsible and delivery was quick. Recommend!",
+    "Perfect size and color, my daughter loves it, will buy again from this store.",
+]
+
+
+def make_reviews(count, duplicate_ratio=0.3, seed=42):
+    """Synthetic reviews: unique random texts plus lightly edited template copies"""
+    rng = random.Random(seed)
+    reviews = []
+    for i in range(count):
+        if rng.random() < duplicate_ratio:
+            words = rng.choice(TEMPLATES).split()
+            if rng.random() < 0.5:
+                words[rng.randrange(len(words))] = rng.choice(WORDS)
+            text = ' '.join(words)
+        else:
+            text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 40)))
+        reviews.append({'id': str(i), 'text': text})
+    return reviews
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    threshold = float(sys.argv[2]) if len(sys.argv) > 2 else 0.8
+
+    detector = NearDuplicateDetector(threshold=threshold)
+    reviews = make_reviews(count)
+    texts = [r['text'] for r in reviews]
+
+    print("=" * 60)
+    print(f"Near-duplicate detection benchmark: {count} reviews")
+    print(f"Threshold: {threshold}  Bands x rows: {detector.bands} x {detector.rows}")
+    print("=" * 60)
+
+    started = time.time()
+    for text in texts:
+        detector.signature(text)
+    signature_time = time.time() - started
+
+    started = time.time()
+    groups = detector.find_groups(texts)
+    groups_time = time.time() - started
+
+    started = time.time()
+    _, flagged = detector.process([dict(r) for r in reviews], mode='collapse')
+    process_time = time.time() - started
+
+    print(f"Signatures only:        {signature_time:.2f}s ({count / signature_time:,.0f} reviews/s)")
+    print(f"Signatures + LSH:       {groups_time:.2f}s")
+    print(f"Full stage (collapse):  {process_time:.2f}s")
+    print(f"Near-duplicates found:  {len(groups)} ({flagged} collapsed)")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
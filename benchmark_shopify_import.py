@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Load-test the Shopify paths against the local Admin API simulator
+Starts shopify_simulator.py in-process, points the app at it and reports
+catalog sync, product search, bulk product lookup and bulk import throughput
+together with the rate-limit behaviour seen on both sides.
+
+Usage: python benchmark_shopify_import.py [products] [reviews_per_product] [import_products] [latency_ms]
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+from shopify_simulator import create_simulator
+
+
+def main():
+    products = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    reviews_per_product = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    import_products = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    latency_ms = float(sys.argv[4]) if len(sys.argv) > 4 else 80
+
+    simulator = make_server('127.0.0.1', 0, create_simulator(products, latency_ms, latency_ms / 3), threaded=True)
+    threading.Thread(target=simulator.serve_forever, daemon=True).start()
+
+    # Configure the app before importing it
+    db_dir = tempfile.mkdtemp(prefix='reviewking-bench-')
+    os.environ.update({
+        'SHOPIFY_API_BASE_URL': f"http://127.0.0.1:{simulator.server_port}",
+        'SHOPIFY_SHOP_DOMAIN': 'sim.myshopify.com',
+        'SHOPIFY_ACCESS_TOKEN': 'sim-token',
+        'REVIEWKING_DB_PATH': os.path.join(db_dir, 'bench.db')
+    })
+    import app_enhanced as app
+
+    helper = app.shopify_helper
+    print("=" * 60)
+    print(f"Shopify simulator benchmark: {products} products, {latency_ms:.0f}ms latency")
+    print("=" * 60)
+
+    started = time.time()
+    status = helper.sync_catalog()
+    print(f"Catalog sync:           {time.time() - started:.2f}s ({status['product_count']} products)")
+
+    queries = ['red', 'silk dress', 'vin', 'globex lamp', 'SKU-42-0', 'premium leather chair']
+    started = time.time()
+    for query in queries:
+        helper.search_products(query)
+    print(f"Search (index):         {(time.time() - started) * 1000 / len(queries):.2f}ms per query")
+
+    ids = list(range(1, min(products, 100) + 1))
+    started = time.time()
+    result = helper.get_products(ids)
+    print(f"get_products({len(ids)}):      {time.time() - started:.2f}s ({len(result['products'])} resolved)")
+
+    total = reviews_per_product * import_products
+    started = time.time()
+    job_ids = []
+    for product_id in range(1, import_products + 1):
+        reviews = [{
+            'id': f"{product_id}-{i}",
+            'rating': 5,
+            'text': f"Benchmark review {i} for product {product_id}, great quality and fast shipping.",
+            'reviewer_name': f"Customer {i}",
+            'country': 'US',
+            'quality_score': 8
+        } for i in range(reviews_per_product)]
+        job_ids.append(app.import_jobs.create_job(helper.shop_domain, str(product_id), None, reviews))
+
+    while True:
+        jobs = [app.import_jobs.get_progress(job_id) for job_id in job_ids]
+        if all(job['status'] not in ('queued', 'running') for job in jobs):
+            break
+        time.sleep(0.2)
+    elapsed = time.time() - started
+    imported = sum(job['imported'] for job in jobs)
+    failed = sum(job['failed'] for job in jobs)
+    print(f"Bulk import:            {elapsed:.2f}s ({imported}/{total} imported, {failed} failed, "
+          f"{imported / elapsed:,.0f} reviews/s)")
+
+    summary = helper.get_review_page(1)['summary']
+    print(f"Product 1 summary:      {summary['count']} reviews on {summary['pages']} pages")
+
+    metrics = app.shopify_rate_limiter.metrics(helper.shop_domain).get(helper.shop_domain, {})
+    print(f"Client limiter:         { {k: v for k, v in metrics.items() if k not in ('rest', 'graphql')} }")
+    sim_stats = simulator.app.test_client().get('/_simulator/stats').get_json()
+    print(f"Simulator:              {next(iter(sim_stats.values()))}")
+    print("=" * 60)
+    simulator.shutdown()
+
+
+if __name__ == "__main__":
+    main()
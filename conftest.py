@@ -0,0 +1,48 @@
+"""
+Shared setup for the in-process test modules (python -m pytest)
+The app is imported against a temporary database with Shopify Billing checks off,
+and every Shopify call fails fast, so no test ever reaches the network
+"""
+
+import os
+import tempfile
+
+import pytest
+import requests
+
+os.environ.setdefault('REVIEWKING_DB_PATH', os.path.join(tempfile.mkdtemp(prefix='reviewking-test-'), 'test.db'))
+os.environ.setdefault('BILLING_REQUIRED', 'false')
+os.environ.setdefault('ENTITLEMENT_RECONCILE_INTERVAL', '0')
+
+import app_enhanced as app
+
+
+def build_reviews(count, prefix='r'):
+    """Scraped reviews as the extractor caches them (rating in percent)"""
+    return [{
+        'id': f"{prefix}{i}",
+        'rating': 100 if i % 2 else 60,
+        'text': f"Review {i}",
+        'reviewer_name': f"Customer {i}",
+        'date': f"2026-01-{i % 28 + 1:02d}",
+        'country': 'US',
+        'images': ['photo.jpg'] if i % 3 == 0 else [],
+        'quality_score': i % 10
+    } for i in range(count)]
+
+
+def refuse_shopify_call(shop, method, url, **kwargs):
+    raise requests.ConnectionError(f"Tests never call Shopify ({method} {url})")
+
+
+@pytest.fixture(autouse=True, scope='session')
+def offline_shopify():
+    """Background workers (backfill, billing checks) included"""
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(app.shopify_transport, 'request', refuse_shopify_call)
+        yield
+
+
+@pytest.fixture
+def make_reviews():
+    return build_reviews
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Export every review written to Shopify (reviewking metafields) as JSONL
+Runs a Shopify bulk operation, waits for it, then streams and converts the
+result one line at a time, so memory stays flat regardless of shop size.
+
+Usage:
+  python export_reviews.py [--shop SHOP] [--output reviews.jsonl]
+  python export_reviews.py --from-file bulk-result.jsonl      # parse a downloaded result offline
+  python export_reviews.py --stub 20000                       # offline run on a generated result
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from app_enhanced import ShopifyAPIHelper, shopify_client_for
+
+
+def write_stub_result(path, products, reviews_per_product=120, page_size=50, seed=42):
+    """Bulk JSONL in Shopify's format: product rows, then metafield rows with __parentId"""
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as f:
+        for p in range(1, products + 1):
+            gid = f"gid://shopify/Product/{p}"
+            f.write(json.dumps({'id': gid}) + '\n')
+            reviews = [{
+                'id': f"{p}-{i}",
+                'rating': rng.randint(1, 5),
+                'title': '',
+                'text': ' '.join(rng.choice(('great', 'fast', 'shipping', 'quality', 'love', 'size')) for _ in range(20)),
+                'reviewer_name': f"Customer {i}",
+                'date': '2026-01-01',
+                'country': rng.choice(('US', 'GB', 'DE')),
+                'verified': True,
+                'images': [],
+                'quality_score': rng.randint(1, 10),
+                'ai_recommended': False,
+                'platform': 'aliexpress'
+            } for i in range(reviews_per_product)]
+            pages = [reviews[i:i + page_size] for i in range(0, len(reviews), page_size)]
+            for n, page in enumerate(pages, 1):
+                f.write(json.dumps({'key': f"reviews_page_{n}", 'value': json.dumps({'page': n, 'reviews': page}),
+                                    '__parentId': gid}) + '\n')
+            f.write(json.dumps({'key': 'summary', 'value': json.dumps({'count': len(reviews), 'pages': len(pages)}),
+                                '__parentId': gid}) + '\n')
+
+
+def iter_result_file(path):
+    """Rows of a bulk result saved on disk (--from-file / --stub), one at a time"""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def run_bulk_operation(client, poll_interval=2.0):
+    """Start the export and wait for Shopify to finish it; returns the result url (or None)"""
+    started = client.start_review_export()
+    if not started['success']:
+        sys.exit(f"Export failed to start: {started['error']}")
+    operation_id = started['operation']['id']
+    print(f"Bulk operation {operation_id} started", file=sys.stderr)
+
+    while True:
+        result = client.get_bulk_operation(operation_id)
+        if not result['success']:
+            sys.exit(f"Export status failed: {result['error']}")
+        operation = result['operation']
+        if operation['status'] in ('COMPLETED', 'FAILED', 'CANCELED', 'EXPIRED'):
+            break
+        print(f"  {operation['status']} ({operation.get('objectCount', 0)} objects)", file=sys.stderr)
+        time.sleep(poll_interval)
+
+    if operation['status'] != 'COMPLETED':
+        sys.exit(f"Export {operation['status']}: {operation.get('errorCode')}")
+    return operation.get('url')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export imported reviews from Shopify as JSONL")
+    parser.add_argument('--shop', help="Shop domain (default: configured shop)")
+    parser.add_argument('--output', default='-', help="Output file (default: stdout)")
+    parser.add_argument('--from-file', help="Parse an already downloaded bulk result")
+    parser.add_argument('--stub', type=int, metavar='PRODUCTS', help="Generate and parse a local stub result")
+    args = parser.parse_args()
+
+    stub_path = None
+    if args.stub:
+        fd, stub_path = tempfile.mkstemp(suffix='.jsonl')
+        os.close(fd)
+        write_stub_result(stub_path, args.stub)
+        lines = iter_result_file(stub_path)
+    elif args.from_file:
+        lines = iter_result_file(args.from_file)
+    else:
+        client = shopify_client_for(args.shop)
+        if not client.is_configured():
+            sys.exit("Shopify API not configured")
+        url = run_bulk_operation(client)
+        lines = ShopifyAPIHelper.iter_bulk_lines(url) if url else []
+
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    tracemalloc.start()
+    started = time.time()
+    count = 0
+    try:
+        for review in ShopifyAPIHelper.iter_exported_reviews(lines):
+            output.write(json.dumps(review) + '\n')
+            count += 1
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        if stub_path:
+            os.remove(stub_path)
+
+    _, peak = tracemalloc.get_traced_memory()
+    print(f"Exported {count} reviews in {time.time() - started:.2f}s (peak parser memory {peak / 1024 / 1024:.1f} MB)",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
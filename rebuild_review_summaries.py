@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Recount per-product rating summaries from the stored reviews
+Summaries are maintained incrementally on every import and removal; this
+repairs any that drifted (e.g. after editing the database by hand).
+
+Usage:
+  python rebuild_review_summaries.py                   # every shop and product
+  python rebuild_review_summaries.py --shop SHOP [--product PRODUCT_ID]
+"""
+
+import argparse
+import time
+
+from app_enhanced import widget_read_model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild per-product review summaries")
+    parser.add_argument('--shop', help="Shop key to check (default: all shops)")
+    parser.add_argument('--product', help="Product ID to check (requires --shop)")
+    args = parser.parse_args()
+    if args.product and not args.shop:
+        parser.error("--product requires --shop")
+
+    started = time.time()
+    drifted = widget_read_model.rebuild_summaries(args.shop, args.product)
+    for shop, product_id in drifted:
+        print(f"Repaired {shop} / {product_id}: {widget_read_model.get_summary(shop, product_id)}")
+    print(f"{len(drifted)} summaries repaired in {time.time() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
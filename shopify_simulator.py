@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""
+Local Shopify Admin API stand-in for performance testing
+Serves the REST and GraphQL calls ReviewKing makes (products, metafields,
+script tags, webhooks, bulk operations) with Shopify-like rate limits,
+call-limit headers and configurable latency, so import and search paths
+can be load-tested without a real store.
+
+Usage:
+  python shopify_simulator.py [--port 8765] [--products 5000] [--latency-ms 80] [--jitter-ms 30]
+
+Point the app at it:
+  SHOPIFY_API_BASE_URL=http://127.0.0.1:8765 SHOPIFY_SHOP_DOMAIN=sim.myshopify.com \\
+  SHOPIFY_ACCESS_TOKEN=sim-token python app_enhanced.py
+"""
+
+import argparse
+import base64
+import bisect
+import hashlib
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from flask import Flask, Response, jsonify, request
+
+WORDS = ("red blue black white silk cotton wool linen summer winter dress shirt ring "
+         "necklace lamp table chair mug phone case charger women men kids vintage "
+         "classic premium organic leather").split()
+
+
+def now_iso():
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+
+class LeakyBucket:
+    """Shopify-style bucket: capacity units, drained at rate per second"""
+
+    def __init__(self, capacity, rate):
+        self.capacity = capacity
+        self.rate = rate
+        self.level = 0.0
+        self.updated = time.time()
+
+    def _drain(self):
+        now = time.time()
+        self.level = max(0.0, self.level - (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, amount=1):
+        """Reserve amount units; returns False (and reserves nothing) if the bucket would overflow"""
+        self._drain()
+        if self.level + amount > self.capacity:
+            return False
+        self.level += amount
+        return True
+
+    @property
+    def available(self):
+        self._drain()
+        return self.capacity - self.level
+
+
+class SimulatedShop:
+    """Per-shop state: catalog, metafields, script tags, webhooks and rate-limit buckets"""
+
+    def __init__(self, products=1000, rest_capacity=40, rest_rate=2.0,
+                 graphql_capacity=1000, graphql_rate=50.0, seed=42):
+        rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.products = {}
+        for pid in range(1, products + 1):
+            title = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))) + f" {pid}"
+            self.products[pid] = {
+                'id': pid,
+                'title': title.title(),
+                'handle': re.sub(r'[^a-z0-9]+', '-', title.lower()).strip('-'),
+                'vendor': rng.choice(('Acme', 'Globex', 'Initech', 'Umbrella')),
+                'updated_at': now_iso(),
+                'image': {'src': f"https://cdn.example.com/p/{pid}.jpg"},
+                'images': [{'src': f"https://cdn.example.com/p/{pid}-{i}.jpg"} for i in range(4)],
+                'variants': [{'id': pid * 10 + v, 'sku': f"SKU-{pid}-{v}"} for v in range(rng.randint(1, 3))]
+            }
+        self.metafields = {}  # product id -> {key: {'value', 'digest', 'type'}}
+        self.script_tags = []
+        self.webhooks = []
+        self.rest_bucket = LeakyBucket(rest_capacity, rest_rate)
+        self.graphql_bucket = LeakyBucket(graphql_capacity, graphql_rate)
+        self.stats = {'rest_calls': 0, 'graphql_calls': 0, 'rest_429': 0, 'graphql_throttled': 0,
+                      'metafields_written': 0}
+
+
+def create_simulator(products=1000, latency_ms=0, jitter_ms=0, rest_capacity=40, rest_rate=2.0,
+                     graphql_capacity=1000, graphql_rate=50.0):
+    """Build the simulator Flask app; every access token gets its own simulated shop"""
+    app = Flask(__name__)
+    shops = {}
+    shops_lock = threading.Lock()
+    bulk_dir = tempfile.mkdtemp(prefix='shopify-sim-bulk-')
+    bulk_operations = {}
+
+    def shop_for_request():
+        token = request.headers.get('X-Shopify-Access-Token')
+        if not token:
+            return None
+        with shops_lock:
+            if token not in shops:
+                shops[token] = SimulatedShop(products, rest_capacity, rest_rate, graphql_capacity, graphql_rate)
+            return shops[token]
+
+    @app.before_request
+    def simulate_latency():
+        if latency_ms or jitter_ms:
+            time.sleep(max(0.0, random.gauss(latency_ms, jitter_ms)) / 1000)
+
+    def rest_call(handler):
+        """Auth + REST leaky bucket + X-Shopify-Shop-Api-Call-Limit header around a handler"""
+        shop = shop_for_request()
+        if shop is None:
+            return jsonify({'errors': '[API] Invalid API key or access token'}), 401
+        with shop.lock:
+            shop.stats['rest_calls'] += 1
+            if not shop.rest_bucket.take():
+                shop.stats['rest_429'] += 1
+                response = jsonify({'errors': 'Exceeded 2 calls per second for api client. Reduce request rates to resume uninterrupted service.'})
+                response.status_code = 429
+                response.headers['Retry-After'] = '1.0'
+                return response
+            result = handler(shop)
+            level = int(round(shop.rest_bucket.level))
+        response = result if isinstance(result, Response) else app.make_response(result)
+        response.headers['X-Shopify-Shop-Api-Call-Limit'] = f"{level}/{shop.rest_bucket.capacity}"
+        return response
+
+    def slim_fields(product, fields):
+        return {k: v for k, v in product.items() if k in fields} if fields else product
+
+    def product_etag(product):
+        return 'W/"' + hashlib.md5(f"{product['id']}:{product['updated_at']}".encode()).hexdigest() + '"'
+
+    # ---------------- REST ----------------
+
+    @app.route('/admin/api/<version>/products.json', methods=['GET'])
+    def list_products(version):
+        def handler(shop):
+            limit = min(int(request.args.get('limit', 50)), 250)
+            fields = set(filter(None, request.args.get('fields', '').split(',')))
+            ids = sorted(shop.products)
+            handle = request.args.get('handle')
+            if handle:
+                ids = [pid for pid in ids if shop.products[pid]['handle'] == handle]
+            page_info = request.args.get('page_info')
+            after = int(base64.urlsafe_b64decode(page_info).decode()) if page_info else 0
+            start = bisect.bisect_right(ids, after)
+            page = ids[start:start + limit]
+            response = jsonify({'products': [slim_fields(shop.products[pid], fields) for pid in page]})
+            if page and page[-1] != ids[-1]:
+                cursor = base64.urlsafe_b64encode(str(page[-1]).encode()).decode()
+                params = f"limit={limit}&page_info={cursor}"
+                if fields:
+                    params += f"&fields={','.join(sorted(fields))}"
+                response.headers['Link'] = f'<{request.base_url}?{params}>; rel="next"'
+            return response
+        return rest_call(handler)
+
+    @app.route('/admin/api/<version>/products/<int:product_id>.json', methods=['GET', 'PUT', 'DELETE'])
+    def product_resource(version, product_id):
+        def handler(shop):
+            product = shop.products.get(product_id)
+            if product is None:
+                return jsonify({'errors': 'Not Found'}), 404
+            if request.method == 'DELETE':
+                del shop.products[product_id]
+                shop.metafields.pop(product_id, None)
+                return jsonify({})
+            if request.method == 'PUT':
+                product.update({k: v for k, v in (request.get_json(silent=True) or {}).get('product', {}).items()
+                                if k in ('title', 'handle', 'vendor')})
+                product['updated_at'] = now_iso()
+            etag = product_etag(product)
+            if request.method == 'GET' and request.headers.get('If-None-Match') == etag:
+                return Response(status=304, headers={'ETag': etag})
+            fields = set(filter(None, request.args.get('fields', '').split(',')))
+            response = jsonify({'product': slim_fields(product, fields)})
+            response.headers['ETag'] = etag
+            return response
+        return rest_call(handler)
+
+    @app.route('/admin/api/<version>/products/<int:product_id>/metafields.json', methods=['GET'])
+    def product_metafields(version, product_id):
+        def handler(shop):
+            fields = shop.metafields.get(product_id, {})
+            return jsonify({'metafields': [
+                {'namespace': 'reviewking', 'key': key, 'value': mf['value'], 'type': mf['type'],
+                 'owner_id': product_id, 'owner_resource': 'product'}
+                for key, mf in fields.items()
+            ]})
+        return rest_call(handler)
+
+    @app.route('/admin/api/<version>/script_tags.json', methods=['GET', 'POST'])
+    def script_tags(version):
+        def handler(shop):
+            if request.method == 'GET':
+                return jsonify({'script_tags': shop.script_tags})
+            tag = dict((request.get_json(silent=True) or {}).get('script_tag', {}),
+                       id=len(shop.script_tags) + 1, created_at=now_iso())
+            shop.script_tags.append(tag)
+            return jsonify({'script_tag': tag}), 201
+        return rest_call(handler)
+
+    @app.route('/admin/api/<version>/webhooks.json', methods=['GET', 'POST'])
+    def webhooks(version):
+        def handler(shop):
+            if request.method == 'GET':
+                return jsonify({'webhooks': shop.webhooks})
+            webhook = (request.get_json(silent=True) or {}).get('webhook', {})
+            if any(w['topic'] == webhook.get('topic') and w['address'] == webhook.get('address') for w in shop.webhooks):
+                return jsonify({'errors': {'address': ['for this topic has already been taken']}}), 422
+            webhook = dict(webhook, id=len(shop.webhooks) + 1)
+            shop.webhooks.append(webhook)
+            return jsonify({'webhook': webhook}), 201
+        return rest_call(handler)
+
+    # ---------------- GraphQL ----------------
+
+    def gid_id(gid):
+        return int(gid.rsplit('/', 1)[-1])
+
+    def metafield_node(shop, product_id, key):
+        mf = shop.metafields.get(product_id, {}).get(key)
+        return {'value': mf['value'], 'compareDigest': mf['digest']} if mf else None
+
+    def op_review_document(shop, variables):
+        product_id = gid_id(variables['id'])
+        if product_id not in shop.products:
+            return {'product': None}
+        return {'product': {
+            'summary': metafield_node(shop, product_id, 'summary'),
+            'page': metafield_node(shop, product_id, variables['pageKey'])
+        }}
+
+    def op_metafields_set(shop, variables):
+        metafields = variables.get('metafields') or []
+        errors = []
+        if len(metafields) > 25:
+            errors.append({'field': ['metafields'], 'message': 'Exceeded the maximum metafields input limit of 25.',
+                           'code': 'LESS_THAN_OR_EQUAL_TO'})
+        for i, mf in enumerate(metafields):
+            product_id = gid_id(mf['ownerId'])
+            if product_id not in shop.products:
+                errors.append({'field': ['metafields', str(i), 'ownerId'], 'message': 'Owner does not exist.',
+                               'code': 'INVALID'})
+                continue
+            if 'compareDigest' in mf:
+                current = shop.metafields.get(product_id, {}).get(mf['key'])
+                if (current['digest'] if current else None) != mf['compareDigest']:
+                    errors.append({'field': ['metafields', str(i)], 'code': 'STALE_OBJECT',
+                                   'message': 'The resource has been updated since it was loaded.'})
+            if len(mf.get('value', '')) > 2 * 1024 * 1024:
+                errors.append({'field': ['metafields', str(i), 'value'], 'code': 'INVALID',
+                               'message': 'Value is too big.'})
+        if errors:  # metafieldsSet is atomic
+            return {'metafieldsSet': {'metafields': None, 'userErrors': errors}}
+        written = []
+        for mf in metafields:
+            product_id = gid_id(mf['ownerId'])
+            shop.metafields.setdefault(product_id, {})[mf['key']] = {
+                'value': mf['value'],
+                'type': mf.get('type', 'json'),
+                'digest': hashlib.sha256(f"{mf['key']}:{mf['value']}".encode()).hexdigest()
+            }
+            written.append({'id': f"gid://shopify/Metafield/{uuid.uuid4().int >> 80}",
+                            'namespace': mf['namespace'], 'key': mf['key']})
+        shop.stats['metafields_written'] += len(written)
+        return {'metafieldsSet': {'metafields': written, 'userErrors': []}}
+
+    def op_product_updated_at(shop, variables):
+        product = shop.products.get(gid_id(variables['id']))
+        return {'product': {'updatedAt': product['updated_at']} if product else None}
+
+    def op_products_by_id(shop, variables):
+        nodes = []
+        for gid in variables['ids']:
+            product = shop.products.get(gid_id(gid))
+            nodes.append({
+                'id': gid, 'title': product['title'], 'handle': product['handle'],
+                'vendor': product['vendor'], 'updatedAt': product['updated_at'],
+                'featuredImage': {'url': product['image']['src']},
+                'variants': {'nodes': [{'sku': v['sku']} for v in product['variants'][:10]]}
+            } if product else None)
+        return {'nodes': nodes}
+
+    def products_by_id_actual_cost(shop, variables):
+        """Shopify refunds the unused part of connection costs (variants(first: 10))"""
+        return sum(1 + 2 + min(len(shop.products[gid_id(gid)]['variants']), 10)
+                   for gid in variables['ids'] if gid_id(gid) in shop.products) or 1
+
+    def op_bulk_run(shop, variables):
+        operation_id = f"gid://shopify/BulkOperation/{len(bulk_operations) + 1}"
+        path = os.path.join(bulk_dir, f"{gid_id(operation_id)}.jsonl")
+        count = 0
+        with open(path, 'w', encoding='utf-8') as f:
+            for product_id in sorted(shop.products):
+                gid = f"gid://shopify/Product/{product_id}"
+                f.write(json.dumps({'id': gid}) + '\n')
+                count += 1
+                for key, mf in shop.metafields.get(product_id, {}).items():
+                    f.write(json.dumps({'key': key, 'value': mf['value'], '__parentId': gid}) + '\n')
+                    count += 1
+        bulk_operations[operation_id] = {
+            'id': operation_id, 'status': 'COMPLETED', 'errorCode': None, 'objectCount': str(count),
+            'url': f"{request.host_url}_simulator/bulk/{gid_id(operation_id)}.jsonl",
+            'createdAt': now_iso(), 'completedAt': now_iso()
+        }
+        return {'bulkOperationRunQuery': {'bulkOperation': {'id': operation_id, 'status': 'CREATED'},
+                                          'userErrors': []}}
+
+    def op_bulk_status(shop, variables):
+        return {'node': bulk_operations.get(variables['id'])}
+
+    # operation name -> (handler, requested cost from variables, actual cost or None if equal)
+    operations = {
+        'reviewDocument': (op_review_document, lambda v: 3, None),
+        'metafieldsSet': (op_metafields_set, lambda v: 10, None),
+        'productUpdatedAt': (op_product_updated_at, lambda v: 1, None),
+        'productsById': (op_products_by_id, lambda v: len(v.get('ids') or []) * 13, products_by_id_actual_cost),
+        'bulkOperationRunQuery': (op_bulk_run, lambda v: 10, None),
+        'bulkOperationStatus': (op_bulk_status, lambda v: 1, None),
+    }
+
+    @app.route('/admin/api/<version>/graphql.json', methods=['POST'])
+    def graphql(version):
+        shop = shop_for_request()
+        if shop is None:
+            return jsonify({'errors': '[API] Invalid API key or access token'}), 401
+
+        body = request.get_json(silent=True) or {}
+        match = re.match(r'\s*(?:query|mutation)\s+(\w+)', body.get('query', ''))
+        operation = operations.get(match.group(1)) if match else None
+        if operation is None:
+            return jsonify({'errors': [{'message': 'Operation not supported by the simulator'}]}), 200
+        handler, cost_of, actual_cost_of = operation
+        variables = body.get('variables') or {}
+
+        def throttle_status():
+            return {
+                'maximumAvailable': float(shop.graphql_bucket.capacity),
+                'currentlyAvailable': int(shop.graphql_bucket.available),
+                'restoreRate': shop.graphql_bucket.rate
+            }
+
+        with shop.lock:
+            shop.stats['graphql_calls'] += 1
+            cost = cost_of(variables)
+            if cost > shop.graphql_bucket.capacity:
+                return jsonify({'errors': [{'message': f"Query cost is {cost}, which exceeds the single query max cost limit (1000).",
+                                            'extensions': {'code': 'MAX_COST_EXCEEDED', 'cost': cost}}]})
+            if not shop.graphql_bucket.take(cost):
+                shop.stats['graphql_throttled'] += 1
+                return jsonify({'errors': [{'message': 'Throttled', 'extensions': {'code': 'THROTTLED'}}],
+                                'extensions': {'cost': {'requestedQueryCost': cost, 'actualQueryCost': None,
+                                                        'throttleStatus': throttle_status()}}})
+            actual = actual_cost_of(shop, variables) if actual_cost_of else cost
+            shop.graphql_bucket.level = max(0.0, shop.graphql_bucket.level - (cost - actual))
+            data = handler(shop, variables)
+            return jsonify({'data': data, 'extensions': {'cost': {
+                'requestedQueryCost': cost, 'actualQueryCost': actual, 'throttleStatus': throttle_status()
+            }}})
+
+    # ---------------- Simulator endpoints ----------------
+
+    @app.route('/_simulator/bulk/<int:operation>.jsonl', methods=['GET'])
+    def bulk_result(operation):
+        path = os.path.join(bulk_dir, f"{operation}.jsonl")
+        if not os.path.exists(path):
+            return jsonify({'error': 'Not Found'}), 404
+
+        def stream():
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(65536), b''):
+                    yield chunk
+        return Response(stream(), mimetype='application/jsonl')
+
+    @app.route('/_simulator/stats', methods=['GET'])
+    def simulator_stats():
+        with shops_lock:
+            return jsonify({token[:8]: dict(shop.stats, products=len(shop.products),
+                                            products_with_reviews=len(shop.metafields))
+                            for token, shop in shops.items()})
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Shopify Admin API simulator")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--products', type=int, default=int(os.environ.get('SIM_PRODUCTS', 1000)))
+    parser.add_argument('--latency-ms', type=float, default=float(os.environ.get('SIM_LATENCY_MS', 80)))
+    parser.add_argument('--jitter-ms', type=float, default=float(os.environ.get('SIM_JITTER_MS', 30)))
+    parser.add_argument('--rest-bucket', type=int, default=40)
+    parser.add_argument('--rest-rate', type=float, default=2.0)
+    parser.add_argument('--graphql-bucket', type=int, default=1000)
+    parser.add_argument('--graphql-rate', type=float, default=50.0)
+    args = parser.parse_args()
+
+    app = create_simulator(args.products, args.latency_ms, args.jitter_ms, args.rest_bucket, args.rest_rate,
+                           args.graphql_bucket, args.graphql_rate)
+    print(f"Shopify simulator on http://{args.host}:{args.port} ({args.products} products, "
+          f"{args.latency_ms:.0f}±{args.jitter_ms:.0f}ms latency)")
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
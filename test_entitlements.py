@@ -0,0 +1,55 @@
+"""
+Checks for billing entitlements (development stores, BILLING_REQUIRED override)
+Run with: python -m pytest test_entitlements.py
+"""
+
+import app_enhanced as app
+
+
+class FakeBillingClient:
+    def __init__(self, shop_domain, subscriptions, development=False):
+        self.shop_domain = shop_domain
+        self.result = {'success': True, 'subscriptions': subscriptions, 'development': development}
+
+    def is_configured(self):
+        return True
+
+    def get_app_subscriptions(self):
+        return self.result
+
+
+def refresh_with(client, db_path, monkeypatch):
+    cache = app.EntitlementCache(str(db_path), reconcile_interval=0)
+    monkeypatch.setattr(app, 'shopify_client_for', lambda shop=None: client)
+    return cache.refresh(client.shop_domain)
+
+
+def test_shop_without_subscription_is_not_entitled(tmp_path, monkeypatch):
+    client = FakeBillingClient('unpaid.myshopify.com', [])
+    assert not refresh_with(client, tmp_path / 'billing.db', monkeypatch)['active']
+
+
+def test_partner_development_store_is_entitled(tmp_path, monkeypatch):
+    client = FakeBillingClient('dev.myshopify.com', [], development=True)
+    entry = refresh_with(client, tmp_path / 'billing.db', monkeypatch)
+    assert entry['active'] and entry['plan'] == 'development'
+
+
+def test_billing_can_be_switched_off(monkeypatch):
+    monkeypatch.setattr(app.entitlements, 'is_entitled', lambda shop: False)
+    monkeypatch.setattr(app.Config, 'BILLING_REQUIRED', True)
+    assert not app.check_payment_status(app.shop_key())
+    monkeypatch.setattr(app.Config, 'BILLING_REQUIRED', False)
+    assert app.check_payment_status(app.shop_key())
+
+
+def test_failed_checks_survive_a_restart(tmp_path, monkeypatch):
+    client = FakeBillingClient('flaky.myshopify.com', [])
+    client.result = {'success': False, 'error': 'Billing API unavailable'}
+    entry = refresh_with(client, tmp_path / 'billing.db', monkeypatch)
+    assert entry['source'] == 'error' and entry['active']  # The default answer, retried soon
+
+    restarted = app.EntitlementCache(str(tmp_path / 'billing.db'), negative_ttl=300, reconcile_interval=0)
+    entry = restarted._entries['flaky.myshopify.com']
+    assert entry['source'] == 'error'
+    assert entry['expires_at'] - entry['checked_at'] == 300
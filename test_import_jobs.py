@@ -0,0 +1,128 @@
+"""
+Checks for background import jobs (leases, cancellation, empty imports)
+Run with: python -m pytest test_import_jobs.py
+"""
+
+import time
+
+import app_enhanced as app
+
+
+def new_manager(db_path, lease=60):
+    return app.ImportJobManager(str(db_path), workers=1, concurrency=1, lease=lease)
+
+
+def insert_job(manager, job_id, status, heartbeat_at):
+    with manager._lock:
+        manager._conn.execute(
+            "INSERT INTO import_jobs (job_id, shop, shopify_product_id, session_id, status, total, created_at, "
+            "updated_at, owner, heartbeat_at) VALUES (?, 'shop', '1', NULL, ?, 0, '', '', 'other-process', ?)",
+            (job_id, status, heartbeat_at)
+        )
+        manager._conn.commit()
+
+
+def wait_for(manager, job_id):
+    for _ in range(100):
+        job = manager.get_progress(job_id)
+        if job['status'] not in ('queued', 'running'):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_new_process_leaves_live_jobs_alone(tmp_path):
+    first = new_manager(tmp_path / 'jobs.db')
+    insert_job(first, 'live', 'running', time.time())
+    insert_job(first, 'orphaned', 'running', time.time() - 3600)
+
+    second = new_manager(tmp_path / 'jobs.db')
+    assert second.get_progress('live')['status'] == 'running'
+    assert second.get_progress('orphaned')['status'] == 'interrupted'
+
+
+def test_cancel_after_last_batch_is_forgotten(tmp_path):
+    manager = new_manager(tmp_path / 'jobs.db')
+    job_ids = []
+
+    def import_batch(job, batch, reviews):
+        manager.cancel(job_ids[0])  # Arrives while the only batch is in flight
+        return len(batch)
+    manager._import_batch = import_batch
+
+    job_ids.append(manager.create_job('shop', '1', None, [{'id': 'a'}]))
+    job = wait_for(manager, job_ids[0])
+    assert job['status'] == 'completed'
+    assert job_ids[0] not in manager._cancel_requested
+
+
+def test_batches_of_one_product_never_overlap(tmp_path):
+    manager = new_manager(tmp_path / 'jobs.db')
+    manager._write_slots = app.threading.BoundedSemaphore(4)
+    active, peak = [0], [0]
+
+    def import_batch(job, batch, reviews):
+        active[0] += 1
+        peak[0] = max(peak[0], active[0])
+        time.sleep(0.01)
+        active[0] -= 1
+        return len(batch)
+    manager._import_batch = import_batch
+
+    reviews = [{'id': str(i)} for i in range(app.ShopifyAPIHelper.REVIEW_BATCH_SIZE * 3)]
+    job = wait_for(manager, manager.create_job('shop', '1', None, reviews))
+    assert job['status'] == 'completed'
+    assert peak[0] == 1
+
+
+def test_job_reranks_the_product_once(tmp_path, monkeypatch):
+    class FakeClient:
+        def add_reviews_to_product(self, product_id, reviews):
+            return {'success': True, 'imported': [{'id': r['id']} for r in reviews], 'failed': []}
+
+    shop = app.shop_key()
+    monkeypatch.setattr(app, 'shopify_client_for', lambda shop=None: FakeClient())
+    manager = new_manager(tmp_path / 'jobs.db')
+    batch_size = app.ShopifyAPIHelper.REVIEW_BATCH_SIZE
+    reviews = [{'id': f"rank-{i}", 'rating': 100, 'quality_score': i % 10} for i in range(batch_size * 3)]
+    job = wait_for(manager, manager.create_job(shop, 'rank-product', None, reviews))
+    assert job['status'] == 'completed'
+    assert app.widget_read_model.get_revision(shop, 'rank-product')[0] == 1
+    assert app.widget_read_model.get_summary(shop, 'rank-product')['count'] == batch_size * 3
+    assert app.widget_read_model.get_page(shop, 'rank-product', 1)['pages'] > 1
+
+
+def test_bulk_import_of_already_imported_reviews_creates_no_job():
+    shop = app.shop_key()
+    app.extractor.result_cache.put('test:jobs:1:150', [{'id': 'done-1', 'rating': 100, 'quality_score': 9}])
+    app.extractor.result_cache.bind_session('jobs-session', 'test:jobs:1:150')
+    app.import_ledger.record(shop, 'jobs-product', ['done-1'])
+
+    response = app.app.test_client().post('/admin/reviews/import/bulk', json={
+        'review_ids': ['done-1'],
+        'shopify_product_id': 'jobs-product',
+        'session_id': 'jobs-session'
+    })
+    data = response.get_json()
+    assert response.status_code == 200, data
+    assert data['job_id'] is None
+    assert data['already_imported_count'] == 1
+
+
+def test_resumed_job_publishes_reviews_of_a_crashed_run(tmp_path, monkeypatch):
+    manager = new_manager(tmp_path / 'jobs.db')
+    published = []
+    monkeypatch.setattr(manager, '_publish', lambda job: published.append(job['job_id']))
+    insert_job(manager, 'crashed', 'running', time.time() - 3600)
+    with manager._lock:
+        manager._conn.execute(
+            "INSERT INTO import_job_items (job_id, position, review_id, review_json, status, updated_at) "
+            "VALUES ('crashed', 0, 'a', '{\"id\": \"a\"}', 'imported', '')"
+        )
+        manager._conn.commit()
+
+    manager.recover_orphaned()
+    manager.resume('crashed')
+    job = wait_for(manager, 'crashed')
+    assert job['status'] == 'completed'
+    assert published == ['crashed']
@@ -0,0 +1,99 @@
+"""
+Checks for Shopify webhook signatures and catalog syncs racing product webhooks
+Run with: python -m pytest test_product_webhooks.py
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+
+import app_enhanced as app
+
+SECRET = 'test-webhook-secret'
+
+
+def sign(body):
+    return base64.b64encode(hmac.new(SECRET.encode(), body, hashlib.sha256).digest()).decode()
+
+
+def product(product_id, title, updated_at):
+    return {'id': product_id, 'title': title, 'handle': f"item-{product_id}", 'vendor': 'Acme',
+            'variants': [], 'updated_at': updated_at}
+
+
+class CatalogPage:
+    def __init__(self, products, next_url=None):
+        self.products = products
+        self.links = {'next': {'url': next_url}} if next_url else {}
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {'products': self.products}
+
+
+def test_webhook_signature(monkeypatch):
+    monkeypatch.setattr(app.Config, 'SHOPIFY_API_SECRET', SECRET)
+    body = b'{"id": 1}'
+    assert app.verify_shopify_webhook(body, sign(body))
+    assert not app.verify_shopify_webhook(b'{"id": 2}', sign(body))
+    assert not app.verify_shopify_webhook(body, None)
+
+
+def test_webhook_routes_reject_bad_signatures(monkeypatch):
+    monkeypatch.setattr(app.Config, 'SHOPIFY_API_SECRET', SECRET)
+    client = app.app.test_client()
+    cases = (
+        ('/shopify/webhooks/products', 'products/update', json.dumps(product(901, 'Mug', '2026-01-01T00:00:00+00:00'))),
+        ('/shopify/webhooks/billing', 'app_subscriptions/update',
+         json.dumps({'app_subscription': {'status': 'ACTIVE', 'name': 'Pro'}}))
+    )
+    for url, topic, body in cases:
+        headers = {'X-Shopify-Topic': topic, 'X-Shopify-Shop-Domain': 'hooks.myshopify.com'}
+        if url.endswith('products'):
+            headers.pop('X-Shopify-Shop-Domain')  # The default shop
+        body = body.encode()
+
+        response = client.post(url, data=body, headers={**headers, 'X-Shopify-Hmac-Sha256': sign(body)})
+        assert response.status_code == 200, url
+        tampered = body.replace(b'"', b' "', 1)
+        response = client.post(url, data=tampered, headers={**headers, 'X-Shopify-Hmac-Sha256': sign(body)})
+        assert response.status_code == 401, url
+        assert client.post(url, data=body, headers=headers).status_code == 401, url
+
+
+def test_webhooks_during_a_sync_survive_the_swap():
+    helper = app.ShopifyAPIHelper('sync-shop.myshopify.com', 'token')
+    helper.apply_product_webhook('products/create', product(3, 'Gone soon', '2026-01-01T00:00:00+00:00'))
+    helper.apply_product_webhook('products/delete', {'id': 99})  # Before the sync: forgotten after it
+
+    pages = [
+        CatalogPage([product(1, 'Old title', '2026-01-01T00:00:00+00:00'),
+                     product(2, 'Kettle', '2026-01-01T00:00:00+00:00'),
+                     product(3, 'Gone soon', '2026-01-01T00:00:00+00:00')], next_url='page-2'),
+        CatalogPage([product(4, 'Teapot', '2026-01-01T00:00:00+00:00')])
+    ]
+    requested = []
+
+    def crawl(method, url, **kwargs):
+        requested.append(url)
+        if len(requested) == 2:  # Webhooks land after the first page was fetched
+            helper.apply_product_webhook('products/update', product(1, 'New title', '2026-02-01T00:00:00+00:00'))
+            helper.apply_product_webhook('products/delete', {'id': 3})
+            helper.apply_product_webhook('products/create', product(5, 'Late arrival', '2026-02-01T00:00:00+00:00'))
+        return pages[len(requested) - 1]
+
+    helper._request = crawl
+    assert helper.sync_catalog()['state'] == 'ready'
+
+    assert 'updated_at' in requested[0]
+    assert helper.catalog.products['1']['title'] == 'New title'
+    assert sorted(helper.catalog.products) == ['1', '2', '4', '5']
+    assert helper._deleted_products == {'3'}
+    assert set(helper._product_versions) == {'1', '2', '4', '5'}
+
+    # The crawl is the new baseline: late retries older than it are still ignored
+    stale = product(2, 'Stale retry', '2025-12-01T00:00:00+00:00')
+    assert helper.apply_product_webhook('products/update', stale) == 'ignored'
@@ -0,0 +1,106 @@
+"""
+Checks for the scored review cache, its facet index and import sessions
+Run with: python -m pytest test_review_cache.py
+"""
+
+import app_enhanced as app
+
+
+def test_session_bindings_are_bounded(make_reviews):
+    cache = app.ReviewResultCache(ttl=600, max_entries=10, max_sessions=3)
+    cache.put('k', make_reviews(4))
+    for n in range(5):
+        cache.bind_session(f"s{n}", 'k')
+    assert len(cache._sessions) == 3
+    assert cache.get_for_session('s0') is None
+    assert cache.get_for_session('s4')['key'] == 'k'
+
+
+def test_session_remembers_every_page(make_reviews):
+    cache = app.ReviewResultCache(ttl=600, max_entries=10)
+    cache.put('page1', make_reviews(4))
+    cache.put('page2', [{'id': 'p2-a', 'rating': 100}])
+    cache.bind_session('s', 'page1')
+    cache.bind_session('s', 'page2')
+    assert [entry['key'] for entry in cache.entries_for_session('s')] == ['page2', 'page1']
+    assert cache.get_for_session('s')['key'] == 'page2'
+
+
+def test_session_bindings_expire(make_reviews):
+    cache = app.ReviewResultCache(ttl=0, max_entries=10)
+    cache.put('k', make_reviews(4))
+    cache.bind_session('s', 'k')
+    assert cache.get_for_session('s') is None
+    assert 's' not in cache._sessions
+
+
+def test_star_filters(make_reviews):
+    index = app.ReviewFacetIndex(make_reviews(10))
+    assert len(index.query({'stars': '5'})[0]) == 5
+    assert len(index.query({'stars': '4-5stars'})[0]) == 5
+
+
+def test_invalid_filters_are_rejected():
+    for filters in ({'stars': 'lots'}, {'stars': '9'}, {'rating': 'high'}, {'min_quality_score': 'x'}):
+        try:
+            app.ReviewFacetIndex.validate_filters(filters)
+        except ValueError:
+            continue
+        raise AssertionError(f"accepted {filters}")
+    app.ReviewFacetIndex.validate_filters({'stars': '3', 'rating': '80', 'min_quality_score': '7.5'})
+
+
+def test_import_url_bad_stars_is_400():
+    client = app.app.test_client()
+    response = client.get('/admin/reviews/import/url?productId=1&stars=lots')
+    assert response.status_code == 400
+    assert 'stars' in response.get_json()['error']
+
+
+def test_bulk_import_resolves_across_pages_and_reports_unknown_ids(make_reviews, monkeypatch):
+    cache = app.extractor.result_cache
+    cache.put('test:1:1:150', make_reviews(4))
+    cache.put('test:1:2:150', [{'id': 'p2-a', 'rating': 100, 'quality_score': 9}])
+    cache.bind_session('bulk-session', 'test:1:1:150')
+    cache.bind_session('bulk-session', 'test:1:2:150')
+
+    queued = []
+    monkeypatch.setattr(app.import_jobs, 'create_job',
+                        lambda shop, product_id, session_id, reviews: queued.extend(reviews) or 'job')
+    response = app.app.test_client().post('/admin/reviews/import/bulk', json={
+        'review_ids': ['r1', 'p2-a', 'missing'],
+        'shopify_product_id': 'bulk-product-1',
+        'session_id': 'bulk-session'
+    })
+    data = response.get_json()
+    assert response.status_code == 202, data
+    assert [r['id'] for r in queued] == ['r1', 'p2-a']
+    assert data['unresolved_ids'] == ['missing']
+
+
+def test_near_duplicates_are_verified_against_every_group_in_a_bucket():
+    detector = app.NearDuplicateDetector(threshold=0.6, num_perm=4)
+    detector.bands, detector.rows = 2, 2
+    head, x, y = (app.array('Q', sig) for sig in ([1, 2, 7, 8], [1, 2, 3, 4], [1, 2, 3, 5]))
+    # One bucket holds all three; x and y match each other but not the bucket's first member
+    assert detector._group_signatures([head, x, y]) == {2: 1}
+
+
+def test_near_duplicates_of_earlier_pages_are_flagged(make_reviews):
+    extractor = app.EnhancedReviewExtractor()
+    text = 'Great quality, fast shipping and it looks exactly like the pictures. Would buy again!'
+    page1, page2 = make_reviews(3, prefix='p1-'), make_reviews(3, prefix='p2-')
+    for review, other in zip(page2, ('Runs small, order a size up', '', 'Colour faded after one wash')):
+        review['text'] = other
+    page1[0]['text'], page2[1]['text'] = text, text + ' Thanks'
+
+    history = extractor.result_cache.near_duplicate_history('aliexpress', '42')
+    page1, _ = extractor.near_duplicates.process(page1, 'flag', history)
+    extractor.result_cache.remember_signatures('aliexpress', '42', history)
+    history = extractor.result_cache.near_duplicate_history('aliexpress', '42')
+    page2, found = extractor.near_duplicates.process(page2, 'flag', history)
+    assert found == 1 and page2[1]['near_duplicate_of'] == 'p1-0'
+
+    # Re-scraping a page never matches its own reviews
+    page1, found = extractor.near_duplicates.process(page1, 'flag', history)
+    assert found == 0
@@ -0,0 +1,70 @@
+"""
+Checks that reviews written to Shopify read back through the bulk export parser
+Run with: python -m pytest test_review_export.py
+"""
+
+import json
+
+import app_enhanced as app
+import export_reviews
+
+
+class MetafieldStore:
+    """Answers the review document read and metafieldsSet the way the Admin API does"""
+
+    def __init__(self):
+        self.metafields = {}  # (product gid, key) -> value
+
+    def graphql(self, query, variables=None, cost=1):
+        if query == app.ShopifyAPIHelper.METAFIELDS_SET_MUTATION:
+            for mf in variables['metafields']:
+                self.metafields[(mf['ownerId'], mf['key'])] = mf['value']
+            return {'data': {'metafieldsSet': {'userErrors': []}}}
+
+        def node(key):
+            value = self.metafields.get((variables['id'], key))
+            return {'value': value, 'compareDigest': str(hash(value))} if value else None
+        return {'data': {'product': {'summary': node('summary'), 'page': node(variables['pageKey'])}}}
+
+    def bulk_lines(self):
+        """Rows as a bulk operation result lists them (parent first, then its metafields)"""
+        for gid in sorted({gid for gid, _ in self.metafields}):
+            yield {'id': gid}
+            for (owner, key), value in self.metafields.items():
+                if owner == gid:
+                    yield {'key': key, 'value': value, '__parentId': gid}
+
+
+def test_written_reviews_round_trip_through_the_export(make_reviews):
+    store = MetafieldStore()
+    helper = app.ShopifyAPIHelper('export-shop.myshopify.com', 'token')
+    helper.graphql = store.graphql
+    reviews = make_reviews(app.ShopifyAPIHelper.REVIEW_PAGE_SIZE + 5)  # Spills onto a second page
+    assert helper.add_reviews_to_product('77', reviews)['success']
+
+    exported = list(app.ShopifyAPIHelper.iter_exported_reviews(store.bulk_lines()))
+    assert [r['id'] for r in exported] == [r['id'] for r in reviews]
+    assert all(r['shopify_product_id'] == '77' for r in exported)
+
+
+def test_legacy_bare_list_pages_are_still_read():
+    rows = [{'key': 'reviews_page_1', 'value': json.dumps([{'id': 'old'}]), '__parentId': 'gid://shopify/Product/5'}]
+    assert [r['id'] for r in app.ShopifyAPIHelper.iter_exported_reviews(rows)] == ['old']
+
+
+def test_stub_result_parses(tmp_path):
+    path = str(tmp_path / 'bulk.jsonl')
+    export_reviews.write_stub_result(path, 3, reviews_per_product=60)
+    exported = list(app.ShopifyAPIHelper.iter_exported_reviews(export_reviews.iter_result_file(path)))
+    assert len(exported) == 180
+
+
+def test_bulk_results_are_only_downloaded_over_https(tmp_path):
+    path = tmp_path / 'bulk.jsonl'
+    path.write_text('{"id": "gid://shopify/Product/1"}\n')
+    for url in (str(path), f"file://{path}", 'http://storage.example.com/result.jsonl'):
+        try:
+            next(app.ShopifyAPIHelper.iter_bulk_lines(url))
+        except ValueError:
+            continue
+        raise AssertionError(f"read {url}")
@@ -0,0 +1,52 @@
+"""
+Checks for per-shop client resolution (tenant isolation) and the client registry
+Run with: python -m pytest test_shop_registry.py
+"""
+
+import app_enhanced as app
+
+
+def new_registry(db_path, max_clients=1):
+    return app.ShopifyClientRegistry(app.ShopCredentialStore(str(db_path)), max_clients=max_clients)
+
+
+def test_only_a_missing_shop_gets_the_default_client():
+    assert app.shopify_client_for(None) is app.shopify_helper
+    assert app.shopify_client_for('') is app.shopify_helper
+    assert app.shop_key() == (app.shopify_helper.shop_domain or 'default')
+
+
+def test_unknown_shop_is_rejected():
+    if not app.shopify_helper.is_configured():
+        return  # Local demo setup: every shop renders the sample widget
+    try:
+        app.shop_key('stranger.myshopify.com')
+    except app.UnknownShopError as e:
+        assert e.shop == 'stranger.myshopify.com'
+    else:
+        raise AssertionError("unknown shop resolved to another shop's key")
+
+
+def test_unknown_shop_widget_requests_are_404():
+    if not app.shopify_helper.is_configured():
+        return
+    app.widget_read_model.add_reviews(app.shop_key(), 'tenant-1', [{'id': 'secret', 'rating': 100}])
+    client = app.app.test_client()
+    for url in ('/widget/stranger.myshopify.com/reviews/tenant-1/api',
+                '/widget/stranger.myshopify.com/summaries?product_ids=tenant-1',
+                '/admin/reviews/summary?product_id=tenant-1&shop=stranger.myshopify.com'):
+        response = client.get(url)
+        assert response.status_code == 404, url
+        assert b'secret' not in response.data
+
+
+def test_evicted_shops_drop_their_rate_limit_state(tmp_path):
+    registry = new_registry(tmp_path / 'shops.db', max_clients=1)
+    registry.register('a.myshopify.com', 'token-a')
+    registry.register('b.myshopify.com', 'token-b')
+    registry.get('a.myshopify.com')
+    app.shopify_rate_limiter.acquire('a.myshopify.com')
+    assert 'a.myshopify.com' in app.shopify_rate_limiter.metrics()
+
+    registry.get('b.myshopify.com')  # Pushes a out of the LRU
+    assert 'a.myshopify.com' not in app.shopify_rate_limiter.metrics()
@@ -0,0 +1,193 @@
+"""
+Checks for the storefront widget read model and the routes served from it
+Run with: python -m pytest test_widget_read_model.py
+"""
+
+import os
+import threading
+import time
+
+import app_enhanced as app
+
+
+class FakeShopifyClient:
+    """Stands in for a configured shop whose reviews only exist in Shopify metafields"""
+
+    def __init__(self, shop_domain, reviews, page_size=2):
+        self.shop_domain = shop_domain
+        self.pages = [reviews[i:i + page_size] for i in range(0, len(reviews), page_size)]
+        self.calls = []
+
+    def is_configured(self):
+        return True
+
+    def get_review_page(self, product_id, page=1):
+        self.calls.append(threading.current_thread().name)
+        return {'success': True, 'summary': {'pages': len(self.pages)}, 'reviews': self.pages[page - 1]}
+
+
+def test_missing_products_are_backfilled_off_the_request_path(make_reviews, monkeypatch):
+    client = FakeShopifyClient('backfill-shop.myshopify.com', make_reviews(5))
+    monkeypatch.setattr(app, 'shopify_client_for', lambda shop=None: client)
+    data = app.get_product_review_data('bf-1', shop='backfill-shop.myshopify.com')
+    assert data['reviews'] == [] and data.get('pending')
+    for _ in range(100):
+        if app.widget_read_model.get_revision(client.shop_domain, 'bf-1')[0]:
+            break
+        time.sleep(0.02)
+    page = app.widget_read_model.get_page(client.shop_domain, 'bf-1', 1)
+    assert page['summary']['count'] == 5
+    assert client.calls and all(name.startswith('widget-backfill') for name in client.calls)
+
+
+def test_rendered_widget_cache_key_is_bounded(make_reviews):
+    shop = app.shop_key()
+    app.widget_read_model.add_reviews(shop, 'cache-1', make_reviews(3))
+    response = app.app.test_client().get(f"/widget/{shop}/reviews/cache-1?limit=1000000000&stream=0")
+    assert response.status_code == 200
+    keys = [key for key in app.widget_system.widget_cache._entries if key[1] == 'cache-1']
+    assert keys == [(shop, 'cache-1', shop, 'default', app.Config.WIDGET_MAX_LIMIT, None)]
+
+
+def test_widget_etags_follow_the_build_and_skip_fallbacks(make_reviews, monkeypatch):
+    shop = app.shop_key()
+    client = app.app.test_client()
+    app.widget_read_model.add_reviews(shop, 'etag-1', make_reviews(3))
+    url = f"/widget/{shop}/reviews/etag-1/api"
+    etag = client.get(url).headers['ETag']
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+    monkeypatch.setattr(app, 'WIDGET_BUILD_VERSION', app.WIDGET_BUILD_VERSION + '-next')
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 200
+
+    # Keep etag-missing out of the read model
+    monkeypatch.setattr(app.widget_backfill, 'schedule', lambda shop, product_id: None)
+    response = client.get(f"/widget/{shop}/reviews/etag-missing/api")
+    assert 'ETag' not in response.headers
+    assert response.headers['Cache-Control'] == 'no-store'
+
+
+def test_snapshots_use_absolute_urls_and_publish_one_at_a_time(make_reviews, tmp_path):
+    shop = app.shop_key()
+    app.widget_read_model.add_reviews(shop, 'snap-1', make_reviews(45))
+    publisher = app.WidgetSnapshotPublisher(str(tmp_path))
+    manifests = []
+    threads = [threading.Thread(target=lambda: manifests.append(publisher.publish(shop, 'snap-1')))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert publisher.stats['published'] == 1  # The rest found this revision already published
+    directory = os.path.join(publisher.root_dir, publisher._relative_dir(shop, 'snap-1'))
+    manifest = manifests[0]
+    for url in [manifest['html']] + manifest['pages']:
+        assert os.path.exists(os.path.join(directory, url.rsplit('/', 1)[-1]))
+    with open(os.path.join(directory, manifest['html'].rsplit('/', 1)[-1]), encoding='utf-8') as f:
+        html = f.read()
+    assert f"'{app.Config.WIDGET_BASE_URL}/widget/" in html
+
+
+def test_snapshot_paths_stay_inside_the_snapshot_dir(make_reviews, tmp_path):
+    shop = app.shop_key()
+    app.widget_read_model.add_reviews(shop, '..', make_reviews(3))
+    publisher = app.WidgetSnapshotPublisher(str(tmp_path / 'snapshots'))
+    for product_id in ('..', '.', ''):
+        try:
+            publisher.publish(shop, product_id)
+        except ValueError:
+            continue
+        raise AssertionError(f"published {product_id!r}")
+    assert publisher._relative_dir(shop, '../etc') == f"{publisher._safe(shop)}/.._etc"
+    assert not (tmp_path / 'snapshots' / 'manifest.json').exists()
+
+
+def test_cursor_pages_survive_imports_and_removals(make_reviews):
+    shop = app.shop_key()
+    client = app.app.test_client()
+    for sort in app.WidgetReadModel.SORT_KEYS:
+        product_id = f"cursor-{sort}"
+        app.widget_read_model.add_reviews(shop, product_id, make_reviews(12))
+        url = f"/widget/{shop}/reviews/{product_id}/api?limit=4&sort={sort}"
+        seen, cursor = [], None
+        for page_no in range(3):
+            page = client.get(url + (f"&cursor={cursor}" if cursor else '')).get_json()
+            seen.extend(r['id'] for r in page['reviews'])
+            cursor = page['next_cursor']
+            if page_no == 0:  # A review that sorts ahead of everything already served arrives
+                app.widget_read_model.add_reviews(shop, product_id, [{
+                    'id': 'top', 'rating': 100, 'quality_score': 99, 'date': '2099-01-01', 'images': ['p.jpg']}])
+            if page_no == 1:  # A review already served is taken down
+                app.widget_read_model.remove_reviews(shop, product_id, [seen[-1]])
+        assert cursor is None, sort
+        assert len(seen) == len(set(seen)) == 12, (sort, seen)
+        assert 'top' not in seen
+
+
+def test_foreign_cursors_are_rejected(make_reviews):
+    shop = app.shop_key()
+    app.widget_read_model.add_reviews(shop, 'cursor-2', make_reviews(3))
+    client = app.app.test_client()
+    cursor = app.encode_widget_cursor('newest', ['2026-01-01', 1.0, 'r1'])
+    for url in (f"/widget/{shop}/reviews/cursor-2/api?sort=quality&cursor={cursor}",
+                f"/widget/{shop}/reviews/cursor-2/api?cursor=not-a-cursor",
+                f"/widget/{shop}/reviews/cursor-2/api?cursor={app.encode_widget_cursor('quality', [1])}"):
+        assert client.get(url).status_code == 400, url
+
+
+def test_streamed_and_buffered_widgets_list_the_same_reviews(make_reviews):
+    shop = app.shop_key()
+    app.widget_read_model.add_reviews(shop, 'stream-1', make_reviews(70))
+    client = app.app.test_client()
+    for limit in (5, 45, 10 ** 6):
+        url = f"/widget/{shop}/reviews/stream-1?limit={limit}"
+        streamed = client.get(url + '&stream=1').get_data(as_text=True)
+        buffered = client.get(url + '&stream=0').get_data(as_text=True)
+        expected = min(limit, 70)
+        assert streamed.count('Review ') == buffered.count('Review ') == expected, limit
+        assert [line for line in streamed.splitlines() if 'Review ' in line] == \
+               [line for line in buffered.splitlines() if 'Review ' in line]
+
+
+def test_bootstrap_misses_send_the_loader_to_the_iframe(make_reviews, monkeypatch):
+    shop = app.shop_key()
+    scheduled = []
+    monkeypatch.setattr(app.widget_backfill, 'schedule', lambda shop, product_id: scheduled.append(product_id))
+    response = app.app.test_client().get(f"/widget/{shop}/bootstrap/boot-missing")
+    assert response.status_code == 404
+    assert response.headers['Cache-Control'] == 'no-store'
+    assert scheduled == ['boot-missing']
+
+    app.widget_read_model.add_reviews(shop, 'boot-1', make_reviews(3))
+    data = app.app.test_client().get(f"/widget/{shop}/bootstrap/boot-1").get_json()
+    assert data['summary']['count'] == 3 and len(data['reviews']) == 3
+
+
+def test_summary_deltas_match_a_full_recount(make_reviews, tmp_path):
+    model = app.WidgetReadModel(str(tmp_path / 'widget.db'))
+    reviews = make_reviews(30)
+    model.add_reviews('shop', 'p', reviews)
+    changed = [dict(r, rating=20, images=['new.jpg']) for r in reviews[:10]]  # Re-import with new ratings
+    model.add_reviews('shop', 'p', changed)
+    model.remove_reviews('shop', 'p', [r['id'] for r in reviews[5:15]])
+
+    summary = model.get_summary('shop', 'p')
+    assert summary['count'] == 20
+    assert summary['histogram']['1'] == 5
+    assert model.rebuild_summaries() == []
+
+
+def test_summary_rebuild_route_repairs_drift(make_reviews):
+    shop = app.shop_key()
+    app.widget_read_model.add_reviews(shop, 'drift-1', make_reviews(4))
+    with app.widget_read_model._lock:
+        app.widget_read_model._conn.execute(
+            "UPDATE review_summaries SET review_count = 99 WHERE shop = ? AND product_id = 'drift-1'", (shop,))
+        app.widget_read_model._conn.commit()
+
+    client = app.app.test_client()
+    response = client.post('/admin/reviews/summary/rebuild', json={'shopify_product_id': 'drift-1'})
+    assert response.get_json() == {'success': True, 'repaired': ['drift-1']}
+    assert app.widget_read_model.get_summary(shop, 'drift-1')['count'] == 4
+    assert client.post('/admin/reviews/summary/rebuild', json={}).get_json()['repaired'] == []